@@ -0,0 +1,461 @@
+"""
+Local columnar store of FAERS adverse-event reports from the OpenFDA bulk export,
+so the clinical agent can read real reaction profiles without the rate-limited API.
+
+    python -m agents.adverse_event_store load drug-event-0001-of-0029.json.zip drug-event-0002-of-0029.json.zip
+    python -m agents.adverse_event_store profile Metformin
+    python -m agents.adverse_event_store reaction "Lactic acidosis"
+
+Reports are counted once per suspect drug (resolved to its canonical ingredient),
+then aggregated per drug, drug x reaction, drug x indication and reaction x drug.
+Each table is a set of flat uint32 column files, grouped by drug (or reaction)
+with an offsets column and sorted by report count within each group, so a top-N
+query is one memory-mapped slice. `load` adds new export files to the current
+aggregates, skips files and report ids it has already seen, and swaps the new
+build in when it is complete.
+"""
+import io
+import os
+import re
+import sys
+import gzip
+import json
+import mmap
+import time
+import array
+import shutil
+import zipfile
+import argparse
+import tempfile
+import threading
+
+from agents.config import adverse_event_store_dir
+from agents.cache import normalize_key
+from agents.drug_names import canonical_name, drug_key
+
+CURRENT_FILE = "CURRENT"  # names the build directory readers use
+SUSPECT = "1"             # drugcharacterization of a suspect (not concomitant) drug
+READ_CHUNK = 1 << 20
+ID_BATCH = 1 << 18  # new report ids held in a set before they are merged into the sorted array
+_RESULTS_ARRAY = re.compile(r'"results"\s*:\s*\[')  # the top-level array, not meta.results {...}
+
+# table -> columns; grouped tables also have an "offsets" column (group id -> first row)
+_TABLES = {
+    "drug": ("reports", "serious", "deaths", "hospitalized"),
+    "drug_reaction": ("reaction", "reports", "serious"),
+    "drug_indication": ("indication", "reports", "serious"),
+    "reaction_drug": ("drug", "reports"),
+}
+
+
+def _open_text(path):
+    if path.endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        return io.TextIOWrapper(archive.open(archive.namelist()[0]), encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def iter_reports(path):
+    """
+    Streams the report objects of one OpenFDA drug/event export file (`.json`, `.json.gz`
+    or the published `.json.zip`) without loading the whole `results` array.
+    """
+    decoder = json.JSONDecoder()
+    with _open_text(path) as f:
+        # The array may start past the first chunk (a long `meta`), or straddle two
+        buf = ""
+        match = None
+        while match is None:
+            more = f.read(READ_CHUNK)
+            if not more:
+                return
+            buf = buf[-64:] + more
+            match = _RESULTS_ARRAY.search(buf)
+        buf = buf[match.end():]
+        pos = 0
+        eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                report, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                more = f.read(READ_CHUNK)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield report
+            pos = end
+
+
+def _report_id(report):
+    try:
+        return int(report.get("safetyreportid", ""))
+    except ValueError:
+        return None
+
+
+class _Aggregates:
+    """
+    In-memory counts for a load: the current build's tables plus the new files.
+    """
+
+    def __init__(self):
+        self.labels = {"drug": {}, "reaction": {}, "indication": {}}  # key -> display name
+        self.drug = {}               # drug key -> [reports, serious, deaths, hospitalized]
+        self.drug_reaction = {}      # (drug key, reaction key) -> [reports, serious]
+        self.drug_indication = {}    # (drug key, indication key) -> [reports, serious]
+        import numpy as np  # ids as sorted uint64 arrays: 8 bytes each, not a Python int in a set
+
+        self.known_ids = np.empty(0, dtype=np.uint64)   # sorted ids from the current build
+        self.report_ids = np.empty(0, dtype=np.uint64)  # sorted ids added by this load
+        self._pending = set()                           # recent ids, folded in every ID_BATCH
+        self.sources = []
+
+    @staticmethod
+    def _has(ids, rid):
+        i = ids.searchsorted(rid)
+        return i < len(ids) and ids[i] == rid
+
+    def _fold_pending(self):
+        import numpy as np
+
+        if self._pending:
+            pending = np.fromiter(self._pending, dtype=np.uint64, count=len(self._pending))
+            self.report_ids = np.union1d(self.report_ids, pending)
+            self._pending.clear()
+
+    def all_report_ids(self):
+        import numpy as np
+
+        self._fold_pending()
+        return np.union1d(self.known_ids, self.report_ids)
+
+    def _label(self, kind, name):
+        key = normalize_key(name)
+        if key:
+            self.labels[kind].setdefault(key, " ".join(name.split()))
+        return key
+
+    def add_report(self, report):
+        rid = _report_id(report)
+        if rid is not None:
+            if rid in self._pending or self._has(self.report_ids, rid) or self._has(self.known_ids, rid):
+                return False
+            self._pending.add(rid)
+            if len(self._pending) >= ID_BATCH:
+                self._fold_pending()
+        patient = report.get("patient") or {}
+        serious = report.get("serious") == "1"
+        flags = (1, int(serious), int(report.get("seriousnessdeath") == "1"),
+                 int(report.get("seriousnesshospitalization") == "1"))
+
+        drugs = {}  # drug key -> indication keys, so a drug listed twice counts once
+        for entry in patient.get("drug") or []:
+            if entry.get("drugcharacterization") != SUSPECT:
+                continue
+            generic = (entry.get("openfda") or {}).get("generic_name") or []
+            name = generic[0] if generic else entry.get("medicinalproduct") or ""
+            if not name.strip():
+                continue
+            key = drug_key(name)
+            self.labels["drug"].setdefault(key, canonical_name(name))
+            indications = drugs.setdefault(key, set())
+            if entry.get("drugindication"):
+                indications.add(self._label("indication", entry["drugindication"]))
+        reactions = {self._label("reaction", r["reactionmeddrapt"])
+                     for r in patient.get("reaction") or [] if r.get("reactionmeddrapt")}
+        reactions.discard("")
+
+        for key, indications in drugs.items():
+            totals = self.drug.setdefault(key, [0, 0, 0, 0])
+            for i, flag in enumerate(flags):
+                totals[i] += flag
+            for table, others in ((self.drug_reaction, reactions), (self.drug_indication, indications - {""})):
+                for other in others:
+                    counts = table.setdefault((key, other), [0, 0])
+                    counts[0] += 1
+                    counts[1] += flags[1]
+        return True
+
+    def write(self, target):
+        """
+        Writes the column files and meta.json for these aggregates into `target`.
+        """
+        drugs = sorted(self.drug)
+        reactions = sorted(self.labels["reaction"])
+        indications = sorted(self.labels["indication"])
+        drug_ids = {k: i for i, k in enumerate(drugs)}
+        reaction_ids = {k: i for i, k in enumerate(reactions)}
+        indication_ids = {k: i for i, k in enumerate(indications)}
+
+        columns = {f"drug.{c}": array.array("I", (self.drug[k][i] for k in drugs)) for i, c in enumerate(_TABLES["drug"])}
+        for table, counts, ids in (("drug_reaction", self.drug_reaction, reaction_ids),
+                                   ("drug_indication", self.drug_indication, indication_ids)):
+            rows = sorted(((drug_ids[d], -c[0], ids[o], c[0], c[1]) for (d, o), c in counts.items()))
+            columns.update(_grouped(table, len(drugs), [(r[0], r[2], r[3], r[4]) for r in rows]))
+        rows = sorted((reaction_ids[r], -c[0], drug_ids[d], c[0]) for (d, r), c in self.drug_reaction.items())
+        columns.update(_grouped("reaction_drug", len(reactions), [(r[0], r[2], r[3]) for r in rows]))
+        columns["report_ids"] = self.all_report_ids()
+
+        for name, values in columns.items():
+            with open(os.path.join(target, name), "wb") as f:
+                values.tofile(f)
+        with open(os.path.join(target, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "drugs": [self.labels["drug"][k] for k in drugs],
+                "reactions": [self.labels["reaction"][k] for k in reactions],
+                "indications": [self.labels["indication"][k] for k in indications],
+                "sources": self.sources,
+                "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }, f)
+
+    def read(self, store):
+        """
+        Loads an existing build's aggregates so new files add to them.
+        """
+        import numpy as np
+
+        state = store._state()
+        meta = state["meta"]
+        drug_keys = [drug_key(d) for d in meta["drugs"]]
+        reaction_keys = [self._label("reaction", r) for r in meta["reactions"]]
+        indication_keys = [self._label("indication", i) for i in meta["indications"]]
+        for key, display in zip(drug_keys, meta["drugs"]):
+            self.labels["drug"].setdefault(key, display)
+        cols = state["columns"]
+        for i, key in enumerate(drug_keys):
+            self.drug[key] = [cols[f"drug.{c}"][i] for c in _TABLES["drug"]]
+            for counts, name, keys in ((self.drug_reaction, "drug_reaction", reaction_keys),
+                                       (self.drug_indication, "drug_indication", indication_keys)):
+                other = cols[f"{name}.{_TABLES[name][0]}"]
+                for row in range(cols[f"{name}.offsets"][i], cols[f"{name}.offsets"][i + 1]):
+                    counts[(key, keys[other[row]])] = [cols[f"{name}.reports"][row], cols[f"{name}.serious"][row]]
+        self.known_ids = np.array(cols["report_ids"], dtype=np.uint64)
+        self.sources = list(meta["sources"])
+
+
+def _grouped(table, groups, rows):
+    """
+    Column arrays for `rows` (group id first, already sorted by group), plus group offsets.
+    """
+    names = _TABLES[table]
+    columns = {f"{table}.{name}": array.array("I") for name in names}
+    offsets = array.array("I", [0] * (groups + 1))
+    for row in rows:
+        offsets[row[0] + 1] += 1
+        for name, value in zip(names, row[1:]):
+            columns[f"{table}.{name}"].append(value)
+    for g in range(groups):
+        offsets[g + 1] += offsets[g]
+    columns[f"{table}.offsets"] = offsets
+    return columns
+
+
+def _map(path, typecode):
+    if os.path.getsize(path) == 0:
+        return array.array(typecode)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm).cast(typecode)  # keeps the map open for as long as it is referenced
+
+
+def _ratio(part, whole):
+    return round(part / whole, 3) if whole else 0.0
+
+
+class AdverseEventStore:
+    """
+    Reader for the current build. Safe to share between threads; picks up a
+    new build swapped in by another process on its next query.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._loaded = None
+
+    def _state(self):
+        pointer = os.path.join(self.directory, CURRENT_FILE)
+        with self._lock:
+            mtime = os.stat(pointer).st_mtime_ns
+            if self._loaded is None or mtime != self._mtime:
+                with open(pointer, encoding="utf-8") as f:
+                    build = os.path.join(self.directory, f.read().strip())
+                with open(os.path.join(build, "meta.json"), encoding="utf-8") as f:
+                    meta = json.load(f)
+                columns = {"report_ids": _map(os.path.join(build, "report_ids"), "Q")}
+                for table, names in _TABLES.items():
+                    for name in names + (() if table == "drug" else ("offsets",)):
+                        columns[f"{table}.{name}"] = _map(os.path.join(build, f"{table}.{name}"), "I")
+                self._loaded = {
+                    "meta": meta,
+                    "columns": columns,
+                    "drug_ids": {drug_key(d): i for i, d in enumerate(meta["drugs"])},
+                    "reaction_ids": {normalize_key(r): i for i, r in enumerate(meta["reactions"])},
+                }
+                self._mtime = mtime
+            return self._loaded
+
+    @property
+    def loaded_at(self):
+        return self._state()["meta"]["loaded_at"]
+
+    def profile(self, drug_name, top_n=10):
+        """
+        Report totals, seriousness ratio, the `top_n` most reported reactions and the
+        `top_n` most common indications for a drug, or None if it has no reports.
+        """
+        state = self._state()
+        i = state["drug_ids"].get(drug_key(drug_name))
+        if i is None:
+            return None
+        meta, cols = state["meta"], state["columns"]
+        reports = cols["drug.reports"][i]
+        serious = cols["drug.serious"][i]
+
+        lo, hi = cols["drug_reaction.offsets"][i], cols["drug_reaction.offsets"][i + 1]
+        reactions = [{"term": meta["reactions"][cols["drug_reaction.reaction"][r]],
+                      "count": cols["drug_reaction.reports"][r],
+                      "serious_ratio": _ratio(cols["drug_reaction.serious"][r], cols["drug_reaction.reports"][r])}
+                     for r in range(lo, min(hi, lo + top_n))]
+        lo, hi = cols["drug_indication.offsets"][i], cols["drug_indication.offsets"][i + 1]
+        indications = [{"indication": meta["indications"][cols["drug_indication.indication"][r]],
+                        "reports": cols["drug_indication.reports"][r],
+                        "serious_ratio": _ratio(cols["drug_indication.serious"][r], cols["drug_indication.reports"][r])}
+                       for r in range(lo, min(hi, lo + top_n))]
+        return {
+            "drug": meta["drugs"][i],
+            "reports": reports,
+            "serious_reports": serious,
+            "serious_ratio": _ratio(serious, reports),
+            "deaths": cols["drug.deaths"][i],
+            "hospitalizations": cols["drug.hospitalized"][i],
+            "top_reactions": reactions,
+            "indications": indications,
+        }
+
+    def drugs_with_reaction(self, term, top_n=10):
+        """
+        Drugs most often reported with a reaction term: [{"drug", "count"}], most reports first.
+        """
+        state = self._state()
+        j = state["reaction_ids"].get(normalize_key(term))
+        if j is None:
+            return []
+        meta, cols = state["meta"], state["columns"]
+        lo, hi = cols["reaction_drug.offsets"][j], cols["reaction_drug.offsets"][j + 1]
+        return [{"drug": meta["drugs"][cols["reaction_drug.drug"][r]], "count": cols["reaction_drug.reports"][r]}
+                for r in range(lo, min(hi, lo + top_n))]
+
+    def stats(self):
+        state = self._state()
+        meta, cols = state["meta"], state["columns"]
+        return {"drugs": len(meta["drugs"]), "reactions": len(meta["reactions"]),
+                "reports": len(cols["report_ids"]), "drug_reaction_rows": len(cols["drug_reaction.reports"]),
+                "source_files": len(meta["sources"]), "loaded_at": meta["loaded_at"]}
+
+
+def load_exports(paths, directory=None, log=None):
+    """
+    Adds OpenFDA drug/event export files to the store at `directory` (default
+    `adverse_event_store_dir()`) and swaps in the new build. Files loaded before are
+    skipped. Returns a summary dict.
+    """
+    directory = directory or adverse_event_store_dir()
+    os.makedirs(directory, exist_ok=True)
+    pointer = os.path.join(directory, CURRENT_FILE)
+    aggregates = _Aggregates()
+    previous = None
+    if os.path.exists(pointer):
+        aggregates.read(AdverseEventStore(directory))
+        with open(pointer, encoding="utf-8") as f:
+            previous = f.read().strip()
+
+    added = duplicates = 0
+    loaded = set(aggregates.sources)
+    new_files = [p for p in paths if os.path.basename(p) not in loaded]
+    for path in new_files:
+        for report in iter_reports(path):
+            if aggregates.add_report(report):
+                added += 1
+            else:
+                duplicates += 1
+        aggregates.sources.append(os.path.basename(path))
+        if log:
+            print(f"[adverse_event_store] {path}: {added} reports so far", file=log)
+    if not new_files and previous is not None:
+        return {"files": 0, "reports_added": 0, "duplicates": 0, "drugs": len(aggregates.drug)}
+
+    target = tempfile.mkdtemp(prefix="build-", dir=directory)
+    aggregates.write(target)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(os.path.basename(target))
+    os.replace(pointer + ".tmp", pointer)
+    # The build being replaced is kept until the next load, for readers still mapping it
+    for old in os.listdir(directory):
+        if old.startswith("build-") and old not in (os.path.basename(target), previous):
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return {"files": len(new_files), "reports_added": added, "duplicates": duplicates, "drugs": len(aggregates.drug)}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    The process-wide store in `adverse_event_store_dir()`, or None if nothing has been loaded there.
+    """
+    global _store
+    directory = adverse_event_store_dir()
+    with _store_lock:
+        if _store is not None and _store.directory != directory:
+            _store = None
+        if _store is None:
+            if not os.path.exists(os.path.join(directory, CURRENT_FILE)):
+                return None
+            _store = AdverseEventStore(directory)
+        return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the local FAERS adverse-event store.")
+    parser.add_argument("--store", default=None, help="Store directory (default: BIOFORGE_ADVERSE_EVENT_STORE)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("load", help="Add OpenFDA drug/event export files (.json, .json.gz, .json.zip)")
+    load.add_argument("files", nargs="+")
+    profile = commands.add_parser("profile", help="Reaction and indication profile of a drug")
+    profile.add_argument("drug")
+    profile.add_argument("-n", type=int, default=10)
+    reaction = commands.add_parser("reaction", help="Drugs most often reported with a reaction")
+    reaction.add_argument("term")
+    reaction.add_argument("-n", type=int, default=10)
+    commands.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    directory = args.store or adverse_event_store_dir()
+    if args.command == "load":
+        print(json.dumps(load_exports(args.files, directory, log=sys.stderr)))
+        return
+    if not os.path.exists(os.path.join(directory, CURRENT_FILE)):
+        parser.error(f"no adverse-event store in {directory}; run `load` first")
+    store = AdverseEventStore(directory)
+    if args.command == "profile":
+        print(json.dumps(store.profile(args.drug, args.n)))
+    elif args.command == "reaction":
+        print(json.dumps(store.drugs_with_reaction(args.term, args.n)))
+    else:
+        print(json.dumps(store.stats()))
+
+
+if __name__ == "__main__":
+    main()
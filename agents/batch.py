@@ -0,0 +1,339 @@
+"""
+Headless batch scoring: rank drug x therapeutic-area pairs from a CSV/Parquet file.
+
+    python -m agents.batch pairs.csv results.jsonl --workers 8
+
+Input needs a drug column (`drug` or `drug_name`) and an area column
+(`therapeutic_area` or `area`). Results are appended as they finish, so an
+interrupted job picks up where it stopped when re-run with the same output.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from agents.literature_agent import analyze_literature, prefetch_literature
+from agents.patent_agent import analyze_patents
+from agents.clinical_trial_agent import evaluate_clinical_trials
+from agents.decision_agent import make_decision, summarize_candidates, candidate_from_row, SUMMARY_BATCH_SIZE
+from agents.cache import SingleFlight, normalize_key
+from agents.drug_names import drug_key
+from agents import knowledge_graph
+
+DRUG_COLUMNS = ("drug", "drug_name")
+AREA_COLUMNS = ("therapeutic_area", "area")
+
+
+def _pick(row, names):
+    for name in names:
+        if row.get(name):
+            return str(row[name]).strip()
+    return ""
+
+
+def iter_pairs(path):
+    """
+    Streams (drug, therapeutic_area) pairs from a CSV or Parquet file without loading it whole.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=1024):
+            for row in batch.to_pylist():
+                drug, area = _pick(row, DRUG_COLUMNS), _pick(row, AREA_COLUMNS)
+                if drug and area:
+                    yield drug, area
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            drug, area = _pick(row, DRUG_COLUMNS), _pick(row, AREA_COLUMNS)
+            if drug and area:
+                yield drug, area
+
+
+def iter_blocks(pairs, size):
+    block = []
+    for pair in pairs:
+        block.append(pair)
+        if len(block) >= size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def pair_key(drug, area):
+    return f"{drug_key(drug)}|{normalize_key(area)}"
+
+
+class JsonlSink:
+    """
+    Appends one JSON object per line and flushes after each, so finished pairs survive a crash.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def completed_keys(self):
+        done = set()
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted run
+                    done.add(pair_key(row["drug"], row["therapeutic_area"]))
+        return done
+
+    def __enter__(self):
+        self._f = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def write(self, row):
+        self._f.write(json.dumps(row) + "\n")
+        self._f.flush()
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+
+class ParquetSink:
+    """
+    Writes results as numbered part files in a directory, one part per `chunk_size` rows.
+    """
+
+    def __init__(self, path, chunk_size=500):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._rows = []
+
+    def _parts(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(p for p in os.listdir(self.path) if p.endswith(".parquet"))
+
+    def completed_keys(self):
+        import pyarrow.parquet as pq
+        done = set()
+        for part in self._parts():
+            table = pq.read_table(os.path.join(self.path, part), columns=["drug", "therapeutic_area"])
+            for drug, area in zip(table.column("drug").to_pylist(), table.column("therapeutic_area").to_pylist()):
+                done.add(pair_key(drug, area))
+        return done
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._next_part = len(self._parts())
+        return self
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        part = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+        pq.write_table(pa.Table.from_pylist(self._rows), part + ".tmp")
+        os.replace(part + ".tmp", part)  # only complete parts count on resume
+        self._next_part += 1
+        self._rows = []
+
+    def __exit__(self, *exc):
+        self._flush()
+
+
+def open_sink(path):
+    if path.endswith(".jsonl"):
+        return JsonlSink(path)
+    return ParquetSink(path)
+
+
+class DrugMemo:
+    """
+    Computes drug-only work (e.g. the patent landscape) once per drug for the whole job.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self._values = {}
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+
+    def __call__(self, drug):
+        key = drug_key(drug)
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+
+        def load():
+            value = self.fn(drug)
+            with self._lock:
+                self._values[key] = value
+            return value
+
+        return self._flights.do(key, load)
+
+
+def score_pair(drug, area, patents, update_graph=True):
+    """
+    Runs the agent pipeline for one pair and flattens it into an output row, with the
+    heuristic narrative. OpenFDA totals are already cached per drug inside the clinical
+    agent. `key_insights` is for batched LLM summaries and is not written out.
+    """
+    lit = analyze_literature(drug, area)
+    pat = patents(drug)
+    clin = evaluate_clinical_trials(drug, area)
+    decision = make_decision(lit["data"], pat["data"], clin["data"], use_llm=False)
+    if update_graph:
+        knowledge_graph.record_swarm(drug, area, {"lit": lit, "pat": pat, "clin": clin, "decision": decision})
+    return {
+        "drug": drug,
+        "therapeutic_area": area,
+        "relevance_score": lit["data"]["relevance_score"],
+        "publication_count": lit["data"]["publication_count"],
+        "patent_risk": pat["data"]["patent_risk"],
+        "primary_expiry": pat["data"]["primary_expiry"],
+        "clinical_risk_score": clin["data"]["clinical_risk_score"],
+        "safety_profile_score": clin["data"]["safety_profile_score"],
+        "final_confidence_score": decision["final_confidence_score"],
+        "recommendation": decision["recommendation"],
+        "summary": decision["summary"],
+        "rationale": decision["rationale"],
+        "narrative_source": decision["narrative_source"],
+        "literature_status": lit["status"],
+        "clinical_status": clin["status"],
+        "key_insights": lit["data"].get("key_insights", []),
+    }
+
+
+def narrate_rows(rows, api_key=None):
+    """
+    Replaces the heuristic narrative of scored rows with Gemini summaries, packing
+    SUMMARY_BATCH_SIZE rows into each request. Rows Gemini cannot answer keep theirs.
+    """
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key or not rows:
+        return rows
+    narratives = summarize_candidates([candidate_from_row(row, str(i)) for i, row in enumerate(rows)], api_key)
+    for i, row in enumerate(rows):
+        if str(i) in narratives:
+            row["summary"], row["rationale"] = narratives[str(i)]
+            row["narrative_source"] = "llm"
+    return rows
+
+
+def run_batch(input_path, output_path, workers=8, use_llm=False, bulk_literature=True,
+              block_size=200, progress_every=100, log=sys.stderr, update_graph=True):
+    """
+    Scores every pair in `input_path` that is not already in `output_path`.
+    At most `workers` pairs are in flight at once. With `bulk_literature`, each
+    block of `block_size` pairs is first resolved against PubMed in a few
+    combined history-server requests instead of two requests per pair.
+    With `use_llm`, finished rows get Gemini narratives SUMMARY_BATCH_SIZE at a time.
+    With `update_graph`, every scored pair is also added to the knowledge graph.
+    Returns a summary dict.
+    """
+    sink = open_sink(output_path)
+    done = sink.completed_keys()
+    patents = DrugMemo(analyze_patents)
+
+    started = time.monotonic()
+    scored = skipped = failed = 0
+
+    def report(final=False):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        rate = scored / elapsed * 60
+        label = "done" if final else "progress"
+        print(f"[batch] {label}: {scored} scored, {skipped} skipped, {failed} failed, {rate:.1f} pairs/min", file=log)
+        return rate
+
+    with sink, ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        to_narrate = []
+
+        def emit(rows):
+            for row in narrate_rows(rows) if use_llm else rows:
+                row.pop("key_insights", None)
+                sink.write(row)
+
+        def drain(return_when):
+            nonlocal scored, failed
+            finished, _ = wait(in_flight, return_when=return_when)
+            for fut in finished:
+                drug, area = in_flight.pop(fut)
+                try:
+                    row = fut.result()
+                    if use_llm:
+                        to_narrate.append(row)
+                        if len(to_narrate) >= SUMMARY_BATCH_SIZE:
+                            emit(to_narrate)
+                            to_narrate.clear()
+                    else:
+                        emit([row])
+                    scored += 1
+                    if progress_every and scored % progress_every == 0:
+                        report()
+                except Exception as e:
+                    failed += 1
+                    print(f"[batch] {drug} / {area} failed: {e}", file=log)
+
+        for block in iter_blocks(iter_pairs(input_path), block_size):
+            fresh = []
+            for drug, area in block:
+                key = pair_key(drug, area)
+                if key in done:
+                    skipped += 1
+                    continue
+                done.add(key)  # also dedupes repeats within the input
+                fresh.append((drug, area))
+
+            if bulk_literature and fresh:
+                try:
+                    prefetch_literature(fresh)
+                except Exception as e:
+                    # Pairs fall back to the per-pair PubMed path
+                    print(f"[batch] bulk literature prefetch failed: {e}", file=log)
+
+            for drug, area in fresh:
+                in_flight[pool.submit(score_pair, drug, area, patents, update_graph)] = (drug, area)
+                if len(in_flight) >= workers * 2:
+                    drain(FIRST_COMPLETED)
+
+        while in_flight:
+            drain(FIRST_COMPLETED)
+        emit(to_narrate)
+
+    rate = report(final=True)
+    return {"scored": scored, "skipped": skipped, "failed": failed, "pairs_per_minute": round(rate, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score drug x therapeutic-area pairs in bulk.")
+    parser.add_argument("input", help="CSV or Parquet file with drug and therapeutic_area columns")
+    parser.add_argument("output", help="Results: a .jsonl file, or a directory of Parquet parts")
+    parser.add_argument("--workers", type=int, default=8, help="Pairs scored concurrently")
+    parser.add_argument("--llm", action="store_true",
+                        help=f"Ask Gemini for narratives, {SUMMARY_BATCH_SIZE} pairs per request")
+    parser.add_argument("--no-bulk-literature", action="store_true",
+                        help="Query PubMed once per pair instead of in combined history-server batches")
+    parser.add_argument("--no-graph", action="store_true", help="Do not add scored pairs to the knowledge graph")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    summary = run_batch(args.input, args.output, workers=args.workers, use_llm=args.llm,
+                        bulk_literature=not args.no_bulk_literature, update_graph=not args.no_graph)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import time
+import contextvars
+from contextlib import contextmanager
+
+# End-to-end latency budgets. A swarm run sets an absolute deadline in a context
+# variable; outbound HTTP calls, Gemini calls and cache locks read what is left of it
+# and shorten their own timeouts to fit. Code running with no budget set keeps its
+# usual timeouts.
+
+_until = contextvars.ContextVar("bioforge_budget_until", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised instead of starting (or waiting any longer for) a call once the budget is used up.
+    """
+
+
+def _tighter(until):
+    current = _until.get()
+    return until if current is None else min(current, until)
+
+
+@contextmanager
+def limit(seconds):
+    """
+    Runs a block with at most `seconds` left (never more than an enclosing budget allows).
+    """
+    token = _until.set(_tighter(time.monotonic() + seconds))
+    try:
+        yield
+    finally:
+        _until.reset(token)
+
+
+def within(until, fn):
+    """
+    Wraps `fn` to run with the absolute `time.monotonic()` deadline `until`, e.g.
+    `executor.submit(telemetry.run_in_context(budget.within(until, fn)), *args)`.
+    """
+    def run(*args, **kwargs):
+        token = _until.set(_tighter(until))
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _until.reset(token)
+    return run
+
+
+def remaining():
+    """
+    Seconds left in the current budget, or None when no budget is set.
+    """
+    until = _until.get()
+    return None if until is None else max(0.0, until - time.monotonic())
+
+
+def clamp(timeout):
+    """
+    `timeout` (seconds, or None for no limit) shortened to what is left of the budget.
+    Raises DeadlineExceeded when nothing is left.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("latency budget used up")
+    return left if timeout is None else min(timeout, left)
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from agents.config import cache_backend_settings
+from agents import budget
+
+# Every agent cache (and the swarm result store) is opened through `open_cache`, so
+# one setting moves them all from this process to a Redis server shared by every
+# worker. All backends have the same get/set/delete/clear/lock interface.
+
+
+def normalize_key(text):
+    """
+    Case- and whitespace-insensitive cache key for a query string.
+    """
+    return " ".join(str(text).lower().split())
+
+
+class DiskCache:
+    """
+    Small SQLite-backed key/value cache with per-entry TTL and an LRU size bound.
+    Values are stored as JSON. Safe to share between threads.
+    """
+
+    def __init__(self, path, ttl=86400, max_entries=5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    def get(self, key, allow_stale=False):
+        """
+        Returns (value, age_seconds) for a live entry, or None on a miss.
+        With `allow_stale`, expired entries count as hits.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created, expires FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created, expires = row
+            if expires <= now and not allow_stale:
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value), now - created
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), now, now + ttl, now),
+            )
+            # Evict least recently used entries beyond the size bound
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def lock(self, key):
+        # Process-local backend: SingleFlight already coalesces callers, no worker lock needed
+        return contextlib.nullcontext()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-entry expiry.
+    Expired entries are kept (until evicted) so callers can fall back to stale data.
+    With `max_bytes`, entries are also evicted once their JSON-encoded size adds up past it.
+    """
+
+    def __init__(self, ttl=3600, max_entries=10000, max_bytes=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, created, expires)
+        self._sizes = {}
+        self._bytes = 0
+
+    def get(self, key, allow_stale=False):
+        """
+        Returns (value, age_seconds) or None. With `allow_stale`, expired entries count as hits.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created, expires = entry
+            if expires <= now and not allow_stale:
+                return None
+            self._entries.move_to_end(key)
+        return value, now - created
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        size = len(json.dumps(value, default=str)) if self.max_bytes else 0
+        with self._lock:
+            self._bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self._entries[key] = (value, now, now + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1
+            ):
+                old_key, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key, 0)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._bytes -= self._sizes.pop(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def lock(self, key):
+        return contextlib.nullcontext()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+# Compare-and-act on a lock key in one step, so a worker never extends or deletes a
+# lock that has since passed to someone else.
+_EXTEND_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCache:
+    """
+    One cache namespace in Redis (or a server speaking its protocol), shared by every
+    worker process. Entries are kept `stale_for` seconds past their TTL so `allow_stale`
+    reads still work during an upstream outage; Redis' maxmemory policy bounds the size.
+    Values are stored as JSON.
+    """
+
+    def __init__(self, client, namespace, ttl=3600, stale_for=None, lock_timeout=60):
+        self.client = client
+        self.ttl = ttl
+        self.stale_for = ttl if stale_for is None else stale_for
+        self.lock_timeout = lock_timeout
+        self._entry_prefix = f"{namespace}:e:"
+        self._lock_prefix = f"{namespace}:l:"
+
+    def get(self, key, allow_stale=False):
+        raw = self.client.get(self._entry_prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        now = time.time()
+        if entry["expires"] <= now and not allow_stale:
+            return None
+        return entry["value"], now - entry["created"]
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        entry = json.dumps({"value": value, "created": now, "expires": now + ttl}, default=str)
+        self.client.set(self._entry_prefix + key, entry, px=max(1, int((ttl + self.stale_for) * 1000)))
+
+    def delete(self, key):
+        self.client.delete(self._entry_prefix + key)
+
+    def _keys(self):
+        return self.client.scan_iter(match=self._entry_prefix + "*", count=500)
+
+    def clear(self):
+        batch = []
+        for key in self._keys():
+            batch.append(key)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+    def __len__(self):
+        return sum(1 for _ in self._keys())
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """
+        Cross-worker mutex for `key` (SET NX with an expiry of `lock_timeout`). The holder
+        renews the expiry while it runs, so the lock only lapses `lock_timeout` after a
+        worker dies holding it; until then everyone else waits. Inside a latency budget,
+        raises `budget.DeadlineExceeded` if the budget runs out first.
+        """
+        name = self._lock_prefix + key
+        token = uuid.uuid4().hex
+        ttl_ms = max(1, int(self.lock_timeout * 1000))
+        while not self.client.set(name, token, nx=True, px=ttl_ms):
+            left = budget.remaining()
+            if left is not None and left <= 0:
+                raise budget.DeadlineExceeded(f"latency budget used up waiting for lock {key!r}")
+            time.sleep(0.02 if left is None else min(0.02, left))
+        released = threading.Event()
+
+        def renew():
+            while not released.wait(self.lock_timeout / 3):
+                if not self.client.eval(_EXTEND_SCRIPT, 1, name, token, ttl_ms):
+                    return  # lost it (e.g. a stall longer than lock_timeout): nothing left to renew
+
+        threading.Thread(target=renew, daemon=True, name="bioforge-lock-renew").start()
+        try:
+            yield
+        finally:
+            released.set()
+            self.client.eval(_RELEASE_SCRIPT, 1, name, token)
+
+
+_redis_clients = {}
+_redis_lock = threading.Lock()
+
+
+def _redis_client(url):
+    with _redis_lock:
+        if url not in _redis_clients:
+            import redis  # optional dependency, only needed for the shared backend
+            _redis_clients[url] = redis.Redis.from_url(url, decode_responses=True)
+        return _redis_clients[url]
+
+
+def open_cache(namespace, ttl=3600, max_entries=10000, max_bytes=None, path=None):
+    """
+    The cache for `namespace` on the configured backend (`cache_backend_settings()`):
+    a Redis namespace shared by every worker, or in this process (a SQLite file at
+    `path` when given, so it survives restarts; memory otherwise). `max_entries` and
+    `max_bytes` only apply to the local backends.
+    """
+    settings = cache_backend_settings()
+    if settings["backend"] == "redis":
+        return RedisCache(_redis_client(settings["url"]), settings["prefix"] + namespace, ttl=ttl,
+                          lock_timeout=settings["lock_timeout"])
+    if path:
+        return DiskCache(path, ttl=ttl, max_entries=max_entries)
+    return TTLCache(ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs `fn`,
+    everyone else arriving while it is in flight waits for and shares its result.
+    With a shared `cache`, the first caller also holds that cache's lock for the key,
+    so callers in other workers wait for it too (`fn` should re-check the cache first).
+    Waiting callers give up with `budget.DeadlineExceeded` when their latency budget runs out.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            try:
+                return future.result(timeout=budget.remaining())
+            except FutureTimeout:
+                if future.done():  # the leader's own timeout error
+                    raise
+                raise budget.DeadlineExceeded(f"latency budget used up waiting for {key!r}") from None
+
+        try:
+            with self.cache.lock(key) if self.cache is not None else contextlib.nullcontext():
+                future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result()
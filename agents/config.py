@@ -0,0 +1,255 @@
+import os
+import time
+import functools
+
+from agents import telemetry
+
+# Shared settings for the agents package. Values are read from the environment
+# at call time because app.py loads .env after the agents are imported.
+
+
+def simulated_latency_scale():
+    """
+    Multiplier for the agents' artificial "thinking" delays.
+    0 (default) disables them for production; 1 restores the demo pacing.
+    """
+    try:
+        return max(0.0, float(os.getenv("BIOFORGE_SIMULATED_LATENCY", "0") or 0))
+    except ValueError:
+        return 0.0
+
+
+def simulate_latency(seconds):
+    """
+    Sleeps for `seconds` scaled by BIOFORGE_SIMULATED_LATENCY (no-op by default).
+    """
+    scale = simulated_latency_scale()
+    if scale > 0:
+        time.sleep(seconds * scale)
+
+
+# Agent result status -> span status
+_SPAN_STATUS = {"Success": "ok", "Simulated": "simulated", "Timeout": "timeout"}
+
+
+def track_runtime(func):
+    """
+    Decorator for agent entry points: adds `runtime_ms` (wall-clock time of the call)
+    to the returned result dict, and records the call as an "agent" telemetry span
+    labelled with the result's status and literature/OpenFDA cache hit or miss.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with telemetry.span("agent", agent=func.__name__) as s:
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            if isinstance(result, dict):
+                result["runtime_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                status = result.get("status")
+                data = result.get("data", {})
+                s.set(
+                    status=_SPAN_STATUS.get(status, status.lower()) if status else None,
+                    cache=("hit" if data.get("cached") else "miss") if "cached" in data else None,
+                )
+        return result
+    return wrapper
+
+
+def _env_number(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+def cache_dir():
+    """
+    Directory for the agents' on-disk caches.
+    """
+    return os.getenv("BIOFORGE_CACHE_DIR", ".bioforge_cache")
+
+
+def patent_index_path():
+    """
+    SQLite file holding the Orange Book patent/exclusivity index (built with
+    `python -m agents.patent_index load`).
+    """
+    return os.getenv("BIOFORGE_PATENT_INDEX") or os.path.join(cache_dir(), "patents.sqlite3")
+
+
+def knowledge_graph_settings():
+    """
+    Where the knowledge graph is persisted, and how many logged updates are replayed
+    on load before the snapshot is rewritten.
+    """
+    return {
+        "dir": os.getenv("BIOFORGE_GRAPH_DIR") or os.path.join(cache_dir(), "graph"),
+        "compact_after": int(_env_number("BIOFORGE_GRAPH_COMPACT_AFTER", 50000)),
+    }
+
+
+def literature_index_dir():
+    """
+    Directory of the local PubMed full-text index (built with `python -m agents.literature_index add`).
+    """
+    return os.getenv("BIOFORGE_LITERATURE_INDEX") or os.path.join(cache_dir(), "literature_index")
+
+
+def adverse_event_store_dir():
+    """
+    Directory of the local FAERS adverse-event store (built with `python -m agents.adverse_event_store load`).
+    """
+    return os.getenv("BIOFORGE_ADVERSE_EVENT_STORE") or os.path.join(cache_dir(), "adverse_events")
+
+
+def evidence_matrix_dir():
+    """
+    Directory of the precomputed drug x therapeutic-area evidence matrix (built with
+    `python -m agents.evidence_matrix build`).
+    """
+    return os.getenv("BIOFORGE_EVIDENCE_MATRIX") or os.path.join(cache_dir(), "evidence_matrix")
+
+
+def cache_backend_settings():
+    """
+    Where the agent caches and swarm results live: "memory" (default; this process,
+    with PubMed results also on local disk) or "redis" (shared by every worker, at
+    BIOFORGE_REDIS_URL, keys under BIOFORGE_REDIS_PREFIX). `lock_timeout` is how long
+    a single-flight lock outlives a worker that died holding it.
+    """
+    return {
+        "backend": (os.getenv("BIOFORGE_CACHE_BACKEND") or "memory").strip().lower(),
+        "url": os.getenv("BIOFORGE_REDIS_URL", "redis://localhost:6379/0"),
+        "prefix": os.getenv("BIOFORGE_REDIS_PREFIX", "bioforge:"),
+        "lock_timeout": _env_number("BIOFORGE_CACHE_LOCK_TIMEOUT", 60),
+    }
+
+
+def pubmed_cache_settings():
+    """
+    TTL (seconds), negative TTL for zero-hit queries, and LRU bound for the PubMed cache.
+    """
+    return {
+        "ttl": _env_number("BIOFORGE_PUBMED_CACHE_TTL", 86400),
+        "negative_ttl": _env_number("BIOFORGE_PUBMED_NEGATIVE_TTL", 3600),
+        "max_entries": int(_env_number("BIOFORGE_PUBMED_CACHE_MAX_ENTRIES", 5000)),
+    }
+
+
+def pubmed_fetch_limit():
+    """
+    How many of the most relevant PubMed records the literature agent parses per query.
+    """
+    return int(_env_number("BIOFORGE_PUBMED_FETCH_LIMIT", 200))
+
+
+def openfda_cache_settings():
+    """
+    TTL (seconds) and size bound for the in-memory OpenFDA adverse-event totals cache.
+    """
+    return {
+        "ttl": _env_number("BIOFORGE_OPENFDA_CACHE_TTL", 21600),
+        "max_entries": int(_env_number("BIOFORGE_OPENFDA_CACHE_MAX_ENTRIES", 10000)),
+    }
+
+
+def ncbi_eutils_url():
+    """
+    Base URL for NCBI E-utilities (override to point at a local stub server).
+    """
+    return os.getenv("NCBI_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils").rstrip("/")
+
+
+def openfda_url():
+    """
+    Base URL for the OpenFDA API (override to point at a local stub server).
+    """
+    return os.getenv("OPENFDA_URL", "https://api.fda.gov").rstrip("/")
+
+
+def ncbi_api_key():
+    return os.getenv("NCBI_API_KEY") or None
+
+
+def http_settings():
+    """
+    Connection pool size, default timeout (seconds) and retry budget for outbound agent calls.
+    Idempotent calls still unanswered after the host's recent `hedge_quantile` latency
+    (once `hedge_min_samples` calls are recorded, and at least `hedge_min_delay` seconds)
+    get a second, hedged request; a quantile of 0 turns hedging off.
+    """
+    return {
+        "pool_size": int(_env_number("BIOFORGE_HTTP_POOL_SIZE", 20)),
+        "timeout": _env_number("BIOFORGE_HTTP_TIMEOUT", 10),
+        "max_retries": int(_env_number("BIOFORGE_HTTP_MAX_RETRIES", 3)),
+        "backoff": _env_number("BIOFORGE_HTTP_BACKOFF", 0.5),
+        "hedge_quantile": _env_number("BIOFORGE_HTTP_HEDGE_QUANTILE", 0.95),
+        "hedge_min_samples": int(_env_number("BIOFORGE_HTTP_HEDGE_MIN_SAMPLES", 20)),
+        "hedge_min_delay": _env_number("BIOFORGE_HTTP_HEDGE_MIN_DELAY", 0.05),
+    }
+
+
+def host_rate_limits():
+    """
+    Requests per second allowed per upstream host. NCBI allows 3/s, or 10/s with an API key
+    (BIOFORGE_NCBI_RPS overrides this, e.g. for a local stub).
+    """
+    from urllib.parse import urlsplit
+    return {
+        urlsplit(ncbi_eutils_url()).netloc: _env_number("BIOFORGE_NCBI_RPS", 10.0 if ncbi_api_key() else 3.0),
+        urlsplit(openfda_url()).netloc: _env_number("BIOFORGE_OPENFDA_RPS", 4),
+    }
+
+
+def llm_cache_settings():
+    """
+    TTL (seconds) and LRU bound for cached Gemini completions.
+    """
+    return {
+        "ttl": _env_number("BIOFORGE_LLM_CACHE_TTL", 86400),
+        "max_entries": int(_env_number("BIOFORGE_LLM_CACHE_MAX_ENTRIES", 2000)),
+    }
+
+
+def llm_timeout():
+    """
+    Seconds one Gemini call may take (further shortened by a swarm's latency budget).
+    """
+    return _env_number("BIOFORGE_LLM_TIMEOUT", 30)
+
+
+def swarm_deadline():
+    """
+    Default end-to-end latency budget (seconds) for one swarm run, agents plus decision.
+    """
+    return _env_number("BIOFORGE_SWARM_DEADLINE", 40)
+
+
+def result_store_settings():
+    """
+    TTL (seconds), entry bound and approximate memory bound (bytes) for cached swarm results.
+    """
+    return {
+        "ttl": _env_number("BIOFORGE_RESULT_TTL", 3600),
+        "max_entries": int(_env_number("BIOFORGE_RESULT_MAX_ENTRIES", 500)),
+        "max_bytes": int(_env_number("BIOFORGE_RESULT_MAX_BYTES", 50 * 1024 * 1024)),
+    }
+
+
+def worker_pool_settings():
+    """
+    Concurrency caps: swarm jobs running at once, and agent calls running at once
+    across all jobs (keep the latter at or below the HTTP pool size).
+    """
+    return {
+        "job_workers": int(_env_number("BIOFORGE_JOB_WORKERS", 4)),
+        "agent_workers": int(_env_number("BIOFORGE_AGENT_WORKERS", 12)),
+    }
+
+
+def metrics_port():
+    """
+    Port for the Prometheus /metrics endpoint, or None to leave it off.
+    """
+    port = int(_env_number("BIOFORGE_METRICS_PORT", 0))
+    return port or None
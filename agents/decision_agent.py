@@ -1,102 +1,447 @@
-import time
-import google.generativeai as genai
+import json
+import logging
 
-def make_decision(literature_data, patent_data, clinical_data, api_key=None):
+from agents.config import simulate_latency, track_runtime
+from agents import llm_client, telemetry, budget
+
+log = logging.getLogger(__name__)
+
+# Bump when scoring changes so cached swarm results are not reused
+AGENT_VERSION = "1.3"
+
+# Scoring rules shared by the single-candidate and vectorized paths
+PATENT_PENALTIES = {"High": 50, "Medium": 20}  # Severe penalty for EY demo ("Legal is a blocker")
+CLINICAL_PENALTIES = ((50, 30), (20, 10))      # (risk score above, penalty), checked in order
+GO_THRESHOLD = 80
+AMBER_THRESHOLD = 40
+
+SUMMARY_FALLBACKS = {
+    "GO": "Strong candidate for repurposing. High literature support and manageable risks.",
+    "AMBER": "Potential candidate. Requires further patent strategy or safety validation.",
+    "NO-GO": "Low feasibility. Significant patent or clinical barriers detected.",
+}
+
+
+def _heuristic_rationale(lit_score, pat_risk, clin_risk):
+    return [
+        f"Literature supports mechanism of action ({int(lit_score)}% relevance).",
+        f"Patent risk assessed as {pat_risk}.",
+        f"Clinical risk score is {clin_risk} (Lower is better)."
+    ]
+
+
+def _scan_json_string(buf, i):
+    """
+    Decodes the JSON string literal starting at buf[i] (a quote). Returns (text, end)
+    where end is the index after the closing quote, or (partial_text, None) if the
+    literal is still incomplete.
+    """
+    j = i + 1
+    while j < len(buf):
+        if buf[j] == "\\":
+            j += 2
+            continue
+        if buf[j] == '"':
+            return json.loads(buf[i:j + 1]), j + 1
+        j += 1
+    # Incomplete: drop a trailing partial escape sequence until it decodes
+    raw = buf[i + 1:]
+    for cut in range(0, min(len(raw), 6) + 1):
+        try:
+            return json.loads('"' + raw[:len(raw) - cut] + '"'), None
+        except ValueError:
+            continue
+    return "", None
+
+
+def _value_start(buf, key):
+    idx = buf.find(f'"{key}"')
+    if idx < 0:
+        return None
+    pos = idx + len(key) + 2
+    while pos < len(buf) and buf[pos] in " \t\r\n:":
+        pos += 1
+    return pos if pos < len(buf) else None
+
+
+class NarrativeStreamParser:
+    """
+    Incrementally pulls `summary` (partial text as it grows) and `rationale` (each item
+    once complete) out of a streamed {"summary": ..., "rationale": [...]} answer.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.summary = ""
+        self.rationale = []
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        pos = _value_start(self.buffer, "summary")
+        if pos is not None and self.buffer[pos] == '"':
+            self.summary = _scan_json_string(self.buffer, pos)[0]
+
+        pos = _value_start(self.buffer, "rationale")
+        if pos is not None and self.buffer[pos] == "[":
+            items = []
+            pos += 1
+            while pos < len(self.buffer):
+                if self.buffer[pos] in " \t\r\n,":
+                    pos += 1
+                    continue
+                if self.buffer[pos] != '"':
+                    break
+                text, end = _scan_json_string(self.buffer, pos)
+                if end is None:
+                    break
+                items.append(text)
+                pos = end
+            self.rationale = items
+        return self.summary, self.rationale
+
+    def result(self):
+        """
+        Full parse of the finished answer; raises ValueError if it is not valid JSON
+        or does not match NARRATIVE_SCHEMA.
+        """
+        parsed = json.loads(self.buffer)
+        if not _valid_narrative(parsed):
+            raise ValueError("narrative does not match the response schema")
+        return parsed["summary"], parsed["rationale"]
+
+
+# Gemini structured output: the model is constrained to these shapes, and answers are
+# still validated, since a truncated or empty answer can slip through.
+NARRATIVE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "summary": {"type": "STRING"},
+        "rationale": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["summary", "rationale"],
+}
+NARRATIVE_CONFIG = {"response_mime_type": "application/json", "response_schema": NARRATIVE_SCHEMA}
+
+BATCH_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "candidates": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"id": {"type": "STRING"}, **NARRATIVE_SCHEMA["properties"]},
+                "required": ["id", "summary", "rationale"],
+            },
+        },
+    },
+    "required": ["candidates"],
+}
+BATCH_CONFIG = {"response_mime_type": "application/json", "response_schema": BATCH_SCHEMA}
+
+NARRATIVE_ATTEMPTS = 2   # tries per candidate before keeping the heuristic text
+SUMMARY_BATCH_SIZE = 10  # candidates packed into one Gemini request
+
+
+def _valid_narrative(obj):
+    return (
+        isinstance(obj, dict)
+        and isinstance(obj.get("summary"), str) and bool(obj["summary"].strip())
+        and isinstance(obj.get("rationale"), list) and bool(obj["rationale"])
+        and all(isinstance(r, str) and r.strip() for r in obj["rationale"])
+    )
+
+
+def _candidate_facts(c):
+    name = c.get("drug_name") or "Unnamed candidate"
+    area = f" for {c['therapeutic_area']}" if c.get("therapeutic_area") else ""
+    gaps = f"\n    - Data Gaps (say so in the summary): {'; '.join(c['data_gaps'])}" if c.get("data_gaps") else ""
+    return f"""- Drug: {name}{area}
+    - Literature Relevance: {int(c['lit_score'])}% (Insights: {c.get('key_insights') or []})
+    - Patent Risk: {c['pat_risk']}
+    - Clinical Safety Score: {100-c['clin_risk']}/100
+    - Calculated Confidence: {round(c['confidence'], 1)}%
+    - Recommendation: {c['recommendation']}{gaps}"""
+
+
+def _narrative_prompt(candidate):
+    return f"""
+    Act as a Senior Pharmaceutical Executive. Summarize the following drug repurposing analysis for a "Go/No-Go" decision.
+
+    Data:
+    {_candidate_facts(candidate)}
+
+    Task:
+    1. Write a 2-sentence executive summary justifying the {candidate['recommendation']}.
+    2. Provide 3 bullet points of rationale (Business, Legal, Clinical).
+    """
+
+
+def _batch_prompt(candidates):
+    blocks = "\n\n".join(f"    Candidate id={c['id']}:\n    {_candidate_facts(c)}" for c in candidates)
+    return f"""
+    Act as a Senior Pharmaceutical Executive. Summarize each of the following drug repurposing
+    analyses for a "Go/No-Go" decision.
+
+{blocks}
+
+    Task, for every candidate (echo its id exactly):
+    1. Write a 2-sentence executive summary justifying its recommendation.
+    2. Provide 3 bullet points of rationale (Business, Legal, Clinical).
+    """
+
+
+def generate_narrative(candidate, api_key, on_update=None, attempts=NARRATIVE_ATTEMPTS):
+    """
+    Asks Gemini for an executive summary and rationale for one candidate (a dict with
+    drug_name, therapeutic_area, lit_score, pat_risk, clin_risk, confidence,
+    recommendation and key_insights). Returns (summary, rationale).
+    An answer that fails schema validation is dropped from the cache and asked again;
+    raises once `attempts` are used up, or on any API failure.
+    With `on_update(summary_so_far, rationale_so_far)`, the answer is streamed and the
+    callback fires as the summary grows and each rationale item completes.
+    """
+    prompt = _narrative_prompt(candidate)
+
+    for attempt in range(1, attempts + 1):
+        parser = NarrativeStreamParser()
+        if on_update is None:
+            parser.feed(llm_client.generate(prompt, api_key, generation_config=NARRATIVE_CONFIG))
+        else:
+            for chunk in llm_client.stream(prompt, api_key, generation_config=NARRATIVE_CONFIG):
+                on_update(*parser.feed(chunk))
+        try:
+            return parser.result()
+        except ValueError as e:
+            llm_client.forget(prompt, generation_config=NARRATIVE_CONFIG)  # don't keep serving it
+            log.warning("Gemini narrative rejected (attempt %d/%d): %s", attempt, attempts, e)
+            if attempt == attempts:
+                raise
+
+
+def summarize_candidates(candidates, api_key, batch_size=SUMMARY_BATCH_SIZE, attempts=NARRATIVE_ATTEMPTS):
+    """
+    Narratives for many candidates, `batch_size` per Gemini request. Each candidate
+    needs a unique `id` plus the fields `generate_narrative` takes. Answers are
+    validated per candidate; only the ones missing or invalid are sent again.
+    Returns {id: (summary, rationale)} for every candidate that got a valid answer.
+    """
+    results = {}
+    todo = list(candidates)
+    for attempt in range(1, attempts + 1):
+        failed = []
+        for i in range(0, len(todo), batch_size):
+            chunk = todo[i:i + batch_size]
+            prompt = _batch_prompt(chunk)
+            try:
+                answers = json.loads(llm_client.generate(prompt, api_key, generation_config=BATCH_CONFIG))
+                items = answers.get("candidates", []) if isinstance(answers, dict) else []
+            except Exception as e:
+                log.warning("Gemini batch summary failed (attempt %d/%d, %d candidates): %s",
+                            attempt, attempts, len(chunk), e)
+                items = []
+            valid = {str(item["id"]): item for item in items
+                     if isinstance(item, dict) and "id" in item and _valid_narrative(item)}
+            missing = [c for c in chunk if str(c["id"]) not in valid]
+            for c in chunk:
+                if str(c["id"]) in valid:
+                    results[c["id"]] = (valid[str(c["id"])]["summary"], valid[str(c["id"])]["rationale"])
+            if missing:
+                llm_client.forget(prompt, generation_config=BATCH_CONFIG)
+                failed.extend(missing)
+        if not failed:
+            break
+        todo = failed
+    telemetry.inc("bioforge_llm_summaries_total", len(results), result="ok")
+    telemetry.inc("bioforge_llm_summaries_total", len(candidates) - len(results), result="failed")
+    return results
+
+
+def degraded_inputs(literature_data, patent_data, clinical_data):
+    """
+    {"literature"/"patent"/"clinical": reason} for each input an agent marked `degraded`
+    (missed its budget, failed, or answered from an expired cache).
+    """
+    inputs = {"literature": literature_data, "patent": patent_data, "clinical": clinical_data}
+    return {name: data.get("degraded_reason") or "Input degraded."
+            for name, data in inputs.items() if data.get("degraded")}
+
+
+def _effective_key(api_key):
+    # Hackathon: Use key from args, then environment
+    import os
+    return api_key if api_key else os.getenv("GEMINI_API_KEY")
+
+
+@track_runtime
+def make_decision(literature_data, patent_data, clinical_data, api_key=None, use_llm=True, on_narrative=None,
+                  drug_name=None, therapeutic_area=None):
     """
     Aggregates insights from all agents to form a final recommendation.
-    Uses LLM (Gemini) if available for a professional summary.
+    Uses LLM (Gemini) if available for a professional summary; `use_llm=False` keeps it heuristic-only.
+    `on_narrative(summary_so_far, rationale_so_far)` streams the LLM summary as it is generated.
+    `narrative_source` in the result says whether the summary came from the LLM or the heuristic.
+    If any input is marked `degraded`, the result has `partial=True` and `degraded_inputs`
+    ({input: reason}), and its summary and rationale say which inputs are missing or stale.
+    Inside a latency budget the LLM gets what is left of it; when nothing is left the
+    heuristic summary is kept.
     """
-    time.sleep(1.0)
-    
+    simulate_latency(1.0)
+
     lit_score = literature_data['relevance_score'] * 100
     pat_risk = patent_data['patent_risk']
     clin_risk = clinical_data['clinical_risk_score']
-    
+
     # Base confidence starts with literature signal
     confidence = lit_score
-    
+
     # Penalize for Patent Risk
-    if pat_risk == "High":
-        confidence -= 50 # Severe penalty for EY demo ("Legal is a blocker")
-    elif pat_risk == "Medium":
-        confidence -= 20
-        
+    confidence -= PATENT_PENALTIES.get(pat_risk, 0)
+
     # Penalize for Clinical Risk
-    if clin_risk > 50: # Risk score > 30 is bad
-        confidence -= 30
-    elif clin_risk > 20:
-        confidence -= 10
-        
+    for threshold, penalty in CLINICAL_PENALTIES:
+        if clin_risk > threshold:
+            confidence -= penalty
+            break
+
     # Cap confidence
     confidence = max(0, min(100, confidence))
-    
-    if confidence > 80:
+
+    if confidence > GO_THRESHOLD:
         recommendation = "GO"
-        summary_fallback = "Strong candidate for repurposing. High literature support and manageable risks."
-    elif confidence > 40:
+    elif confidence > AMBER_THRESHOLD:
         recommendation = "AMBER"
-        summary_fallback = "Potential candidate. Requires further patent strategy or safety validation."
     else:
         recommendation = "NO-GO"
-        summary_fallback = "Low feasibility. Significant patent or clinical barriers detected."
+    summary_fallback = SUMMARY_FALLBACKS[recommendation]
+
+    gaps = degraded_inputs(literature_data, patent_data, clinical_data)
+    if gaps:
+        telemetry.inc("bioforge_partial_decisions_total")
 
     final_summary = summary_fallback
-    final_rationale = [
-        f"Literature supports mechanism of action ({int(lit_score)}% relevance).",
-        f"Patent risk assessed as {pat_risk}.",
-        f"Clinical risk score is {clin_risk} (Lower is better)."
-    ]
+    final_rationale = _heuristic_rationale(lit_score, pat_risk, clin_risk)
+    narrative_source = "heuristic"
 
     # --- GEMINI INTEGRATION ---
-    # Hackathon: Use hardcoded key if provided, else fall back to UI input
-    # Hackathon: Use key from args, then environment
-    import os
-    system_key = os.getenv("GEMINI_API_KEY")
-    effective_key = api_key if api_key else system_key
+    effective_key = _effective_key(api_key)
 
-
-    if effective_key:
+    if effective_key and use_llm:
         try:
-            genai.configure(api_key=effective_key)
-            # Using the explicit versioned model name to avoid alias issues
-            model = genai.GenerativeModel('gemini-1.5-flash-001')
-            
-            prompt = f"""
-            Act as a Senior Pharmaceutical Executive. Summarize the following drug repurposing analysis for a "Go/No-Go" decision.
-            
-            Data:
-            - Drug: Metformin (Example)
-            - Literature Relevance: {int(lit_score)}% (Insights: {literature_data.get('key_insights', [])})
-            - Patent Risk: {pat_risk}
-            - Clinical Safety Score: {100-clin_risk}/100
-            
-            Calculated Confidence: {round(confidence, 1)}%
-            Recommendation: {recommendation}
-            
-            Task:
-            1. Write a 2-sentence executive summary justifying the {recommendation}.
-            2. Provide 3 bullet points of rationale (Business, Legal, Clinical).
-            
-            Output strictly in JSON format: {{ "summary": "...", "rationale": ["...", "...", "..."] }}
-            """
-            
-            response = model.generate_content(prompt)
-            # Simple parsing (assuming model follows instructions, fallback if not)
-            import json
-            text = response.text.replace("```json", "").replace("```", "")
-            parsed = json.loads(text)
-            
-            final_summary = parsed.get("summary", summary_fallback)
-            final_rationale = parsed.get("rationale", final_rationale)
-            
+            candidate = {
+                "drug_name": drug_name, "therapeutic_area": therapeutic_area, "lit_score": lit_score,
+                "pat_risk": pat_risk, "clin_risk": clin_risk, "confidence": confidence,
+                "recommendation": recommendation, "key_insights": literature_data.get('key_insights', []),
+                "data_gaps": [f"{name}: {reason}" for name, reason in gaps.items()],
+            }
+            final_summary, final_rationale = generate_narrative(candidate, effective_key, on_update=on_narrative)
+            narrative_source = "llm"
+
         except Exception as e:
-            print(f"Gemini Error: {e}")
-            final_summary += " (LLM unavailable, running heuristic mode)"
+            log.warning("Gemini Error: %s", e)
+            if isinstance(e, budget.DeadlineExceeded) or budget.remaining() == 0:
+                final_summary += " (LLM skipped, latency budget used up)"
+            else:
+                final_summary += " (LLM unavailable, running heuristic mode)"
+
+    if gaps:
+        final_summary = f"Partial result ({', '.join(gaps)} input missing or stale). " + final_summary
+        final_rationale = list(final_rationale) + [f"Degraded {name} input: {reason}" for name, reason in gaps.items()]
 
     return {
         "agent_name": "Decision & Report Agent",
         "final_confidence_score": round(confidence, 1),
         "recommendation": recommendation,
         "summary": final_summary,
-        "rationale": final_rationale
+        "rationale": final_rationale,
+        "narrative_source": narrative_source,
+        "partial": bool(gaps),
+        "degraded_inputs": gaps
     }
+
+
+def score_arrays(relevance, patent_risk, clinical_risk):
+    """
+    Vectorized version of make_decision's scoring rules.
+    Takes equal-length array-likes of literature relevance (0-1), patent risk labels and
+    clinical risk scores; returns (confidence, recommendation) NumPy arrays in one pass.
+    """
+    import numpy as np  # only the batch path needs it; keeps the app's import light
+
+    relevance = np.asarray(relevance, dtype=float)
+    patent_risk = np.asarray(patent_risk, dtype=object)
+    clinical_risk = np.asarray(clinical_risk, dtype=float)
+
+    confidence = relevance * 100
+    for label, penalty in PATENT_PENALTIES.items():
+        confidence = confidence - np.where(patent_risk == label, penalty, 0)
+    confidence = confidence - np.select(
+        [clinical_risk > threshold for threshold, _ in CLINICAL_PENALTIES],
+        [penalty for _, penalty in CLINICAL_PENALTIES],
+        0,
+    )
+    confidence = np.clip(confidence, 0, 100)
+
+    recommendation = np.select(
+        [confidence > GO_THRESHOLD, confidence > AMBER_THRESHOLD], ["GO", "AMBER"], "NO-GO"
+    )
+    return np.round(confidence, 1), recommendation
+
+
+def score_candidates(candidates):
+    """
+    Scores a pandas DataFrame of candidates with `relevance_score`, `patent_risk` and
+    `clinical_risk_score` columns (e.g. batch output). Returns a copy with
+    `final_confidence_score` and `recommendation` added, sorted best first.
+    No LLM calls are made; see `narrate_top_k` for that.
+    """
+    confidence, recommendation = score_arrays(
+        candidates["relevance_score"].to_numpy(),
+        candidates["patent_risk"].to_numpy(),
+        candidates["clinical_risk_score"].to_numpy(),
+    )
+    scored = candidates.assign(final_confidence_score=confidence, recommendation=recommendation)
+    return scored.sort_values("final_confidence_score", ascending=False, kind="stable")
+
+
+def candidate_from_row(row, candidate_id=None):
+    """
+    Narrative input for one scored row (a namedtuple from `itertuples` or a dict).
+    """
+    get = row.get if isinstance(row, dict) else lambda name, default=None: getattr(row, name, default)
+    return {
+        "id": candidate_id,
+        "drug_name": get("drug"),
+        "therapeutic_area": get("therapeutic_area"),
+        "lit_score": get("relevance_score") * 100,
+        "pat_risk": get("patent_risk"),
+        "clin_risk": get("clinical_risk_score"),
+        "confidence": get("final_confidence_score"),
+        "recommendation": get("recommendation"),
+        "key_insights": get("key_insights") or [],
+    }
+
+
+def narrate_top_k(scored, k=10, api_key=None, batch_size=SUMMARY_BATCH_SIZE):
+    """
+    Optional LLM step for a ranked portfolio: takes `score_candidates` output and
+    returns its top `k` rows with `summary`, `rationale` and `narrative_source` columns.
+    Candidates are summarized `batch_size` per Gemini request. Rows where Gemini
+    fails (or no key is set) keep the heuristic text.
+    """
+    effective_key = _effective_key(api_key)
+    top = scored.head(k)
+    candidates = [candidate_from_row(row, str(i)) for i, row in enumerate(top.itertuples(index=False))]
+    narratives = summarize_candidates(candidates, effective_key, batch_size=batch_size) if effective_key else {}
+
+    summaries, rationales, sources = [], [], []
+    for c in candidates:
+        if c["id"] in narratives:
+            summary, rationale = narratives[c["id"]]
+            sources.append("llm")
+        else:
+            summary = SUMMARY_FALLBACKS[c["recommendation"]]
+            rationale = _heuristic_rationale(c["lit_score"], c["pat_risk"], c["clin_risk"])
+            sources.append("heuristic")
+        summaries.append(summary)
+        rationales.append(rationale)
+    return top.assign(summary=summaries, rationale=rationales, narrative_source=sources)
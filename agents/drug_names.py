@@ -0,0 +1,130 @@
+import os
+import csv
+import bisect
+import threading
+
+from agents.cache import normalize_key
+
+# Resolves free-text drug names ("metformin HCl", "Glucophage") to one canonical
+# ingredient, so every agent query and cache key for the same drug is identical.
+# The bundled vocabulary is extended by BIOFORGE_DRUG_VOCAB (same CSV layout:
+# `ingredient,synonyms` with synonyms separated by "|").
+
+DEFAULT_VOCABULARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "drug_vocabulary.csv")
+
+# Salt and hydrate suffixes dropped so "metformin hydrochloride" resolves like "metformin"
+SALT_WORDS = {
+    "hydrochloride", "hcl", "dihydrochloride", "hydrobromide", "sodium", "potassium", "calcium",
+    "magnesium", "mesylate", "maleate", "besylate", "tartrate", "bitartrate", "citrate", "succinate",
+    "sulfate", "phosphate", "acetate", "fumarate", "bromide", "tosylate", "hyclate", "monohydrate",
+    "dihydrate", "trihydrate", "anhydrous",
+}
+
+
+def strip_salt(key):
+    """
+    Drops trailing salt/hydrate words from a normalized name ("metformin hcl" -> "metformin").
+    """
+    words = key.split()
+    while len(words) > 1 and words[-1] in SALT_WORDS:
+        words.pop()
+    return " ".join(words)
+
+
+class DrugVocabulary:
+    """
+    Synonym/brand -> ingredient hash index, plus a sorted key list for prefix autocomplete.
+    """
+
+    def __init__(self):
+        self._canonical = {}  # normalized synonym -> canonical ingredient display name
+        self._keys = []       # sorted normalized synonyms, for bisect prefix search
+
+    def add(self, ingredient, synonyms=()):
+        ingredient = " ".join(ingredient.split())
+        for name in (ingredient, *synonyms):
+            key = strip_salt(normalize_key(name))
+            if key and key not in self._canonical:
+                self._canonical[key] = ingredient
+                bisect.insort(self._keys, key)
+
+    def load_csv(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                synonyms = [s for s in (row.get("synonyms") or "").split("|") if s.strip()]
+                if (row.get("ingredient") or "").strip():
+                    self.add(row["ingredient"], synonyms)
+        return self
+
+    def canonical(self, name):
+        """
+        Canonical ingredient for a name, or None if the vocabulary does not know it.
+        """
+        return self._canonical.get(strip_salt(normalize_key(name)))
+
+    def complete(self, prefix, limit=10):
+        """
+        Canonical ingredients whose name or synonym starts with `prefix`, in name order.
+        """
+        prefix = normalize_key(prefix)
+        if not prefix:
+            return []
+        found = []
+        for key in self._keys[bisect.bisect_left(self._keys, prefix):]:
+            if not key.startswith(prefix) or len(found) >= limit:
+                break
+            if self._canonical[key] not in found:
+                found.append(self._canonical[key])
+        return found
+
+    def ingredients(self):
+        """
+        Every canonical ingredient, sorted.
+        """
+        return sorted(set(self._canonical.values()))
+
+    def __len__(self):
+        return len(self._canonical)
+
+
+_vocabulary = None
+_vocabulary_lock = threading.Lock()
+
+
+def get_vocabulary():
+    """
+    Process-wide vocabulary, loaded on first use from the bundled file and BIOFORGE_DRUG_VOCAB.
+    """
+    global _vocabulary
+    with _vocabulary_lock:
+        if _vocabulary is None:
+            vocabulary = DrugVocabulary()
+            extra = os.getenv("BIOFORGE_DRUG_VOCAB")
+            if extra:
+                vocabulary.load_csv(extra)
+            _vocabulary = vocabulary.load_csv(DEFAULT_VOCABULARY)
+        return _vocabulary
+
+
+def canonical_name(name):
+    """
+    The ingredient name agents should query with. Unknown names are returned
+    trimmed, with whitespace collapsed and salt suffixes removed.
+    """
+    known = get_vocabulary().canonical(name)
+    if known is not None:
+        return known
+    words = " ".join(str(name).split())
+    key = strip_salt(normalize_key(words))
+    return words[:len(key)] if key and words.lower().startswith(key) else words
+
+
+def drug_key(name):
+    """
+    Cache key for a drug: the normalized canonical ingredient.
+    """
+    return normalize_key(canonical_name(name))
+
+
+def complete(prefix, limit=10):
+    return get_vocabulary().complete(prefix, limit)
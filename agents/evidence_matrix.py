@@ -0,0 +1,369 @@
+"""
+Precomputed drug x therapeutic-area evidence matrix for library-wide screens.
+
+    python -m agents.evidence_matrix build --drugs library.csv
+    python -m agents.evidence_matrix top-drugs "Cardiovascular" -n 20
+    python -m agents.evidence_matrix shortlist "Cardiovascular" "Infectious Diseases" -n 50 --output pairs.csv
+    python -m agents.batch pairs.csv results.jsonl
+
+The build job fills two sparse matrices with the same layout: co-occurring paper
+counts, and the heuristic confidence the decision agent would give each pair
+(literature relevance, OpenFDA adverse-event totals and patent risk). Pairs with
+no co-occurring papers are left out, which keeps the matrices sparse. Queries
+read one row or column, so ranking a whole library takes milliseconds and the
+agent swarm only has to run on the shortlist.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.config import evidence_matrix_dir
+from agents.cache import normalize_key
+from agents.drug_names import canonical_name, drug_key, get_vocabulary
+from agents import literature_index, patent_index
+
+# Areas offered in the app, and built by default
+THERAPEUTIC_AREAS = [
+    "Oncology - Solid Tumors", "Neurodegenerative Diseases", "Rare Genetic Disorders",
+    "Cardiovascular", "Infectious Diseases",
+]
+
+CURRENT_FILE = "CURRENT"         # names the build directory queries read from
+UNKNOWN_CLINICAL_RISK = 20       # the clinical agent's offline default, used when OpenFDA fails
+LITERATURE_BLOCK_SIZE = 200      # pairs per bulk PubMed lookup when there is no local index
+
+
+def _local_counts(index, drugs, areas):
+    """
+    (rows, cols, counts, drug_totals) from the local full-text index: each drug's and
+    each area's posting list is read once and intersected in memory.
+    """
+    import numpy as np
+
+    area_ids = [np.asarray(index.matching_ids(literature_index.tokenize(area)), dtype=np.uint32) for area in areas]
+    rows, cols, counts = [], [], []
+    drug_totals = []
+    for i, drug in enumerate(drugs):
+        terms = literature_index.tokenize(drug)
+        ids = np.asarray(index.matching_ids(terms), dtype=np.uint32) if terms else np.empty(0, dtype=np.uint32)
+        drug_totals.append(len(ids))
+        if not len(ids):
+            continue
+        for j, ids_j in enumerate(area_ids):
+            n = len(np.intersect1d(ids, ids_j, assume_unique=True))
+            if n:
+                rows.append(i)
+                cols.append(j)
+                counts.append(n)
+    return rows, cols, counts, drug_totals
+
+
+def _pubmed_counts(drugs, areas, log=None):
+    """
+    Same as `_local_counts` through the literature agent's bulk PubMed path (slow; cached).
+    Drug totals are unknown here, so relevance uses the paper count alone.
+    """
+    from agents.literature_agent import analyze_literature_bulk
+
+    pairs = [(i, j) for i in range(len(drugs)) for j in range(len(areas))]
+    rows, cols, counts = [], [], []
+    for start in range(0, len(pairs), LITERATURE_BLOCK_SIZE):
+        block = pairs[start:start + LITERATURE_BLOCK_SIZE]
+        results = analyze_literature_bulk([(drugs[i], areas[j]) for i, j in block])
+        for i, j in block:
+            result = results[(drugs[i], areas[j])]
+            count = result["data"]["publication_count"]
+            if result["status"] == "Success" and count:
+                rows.append(i)
+                cols.append(j)
+                counts.append(count)
+        if log:
+            print(f"[evidence_matrix] literature: {start + len(block)}/{len(pairs)} pairs", file=log)
+    return rows, cols, counts, [0] * len(drugs)
+
+
+def _adverse_event_totals(drugs, workers):
+    """
+    Adverse-event report totals per drug (local FAERS store, else OpenFDA through the clinical
+    agent's shared cache), -1 where the lookup failed.
+    """
+    from agents.clinical_trial_agent import adverse_event_total, local_profile
+
+    def total(drug):
+        try:
+            profile = local_profile(drug, top_n=0)
+            return profile["reports"] if profile is not None else adverse_event_total(drug)[0]
+        except Exception:
+            return -1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(total, drugs))
+
+
+def _patent_risks(drugs):
+    from agents.patent_agent import assess_patent_record
+
+    index = patent_index.get_index()
+    records = index.lookup_many(drugs) if index is not None else {}
+    return [assess_patent_record(records[d])["patent_risk"] if d in records else "Medium" for d in drugs]
+
+
+def build_matrix(drugs, areas, directory=None, workers=8, log=None):
+    """
+    Builds the matrix for every drug x area pair and swaps it in as the current build.
+    Drug names are resolved to canonical ingredients and de-duplicated. Returns a summary dict.
+    """
+    import numpy as np
+    from scipy import sparse
+    from agents.literature_agent import relevance_score
+    from agents.clinical_trial_agent import safety_score_for
+    from agents.decision_agent import score_arrays
+
+    started = time.monotonic()
+    directory = directory or evidence_matrix_dir()
+    drugs = list(dict.fromkeys(canonical_name(d) for d in drugs if str(d).strip()))
+    areas = list(dict.fromkeys(" ".join(a.split()) for a in areas if a.strip()))
+
+    index = literature_index.get_index()
+    if index is not None:
+        rows, cols, counts, drug_totals = _local_counts(index, drugs, areas)
+        source = "Local index"
+    else:
+        rows, cols, counts, drug_totals = _pubmed_counts(drugs, areas, log=log)
+        source = "PubMed"
+
+    ae_totals = _adverse_event_totals(drugs, workers)
+    clinical = [100 - safety_score_for(t) if t >= 0 else UNKNOWN_CLINICAL_RISK for t in ae_totals]
+    patents = _patent_risks(drugs)
+
+    confidence, _ = score_arrays(
+        [relevance_score(n, drug_totals[i]) for i, n in zip(rows, counts)],
+        [patents[i] for i in rows],
+        [clinical[i] for i in rows],
+    )
+    shape = (len(drugs), len(areas))
+    count_matrix = sparse.csr_matrix((np.asarray(counts, dtype=np.int32), (rows, cols)), shape=shape)
+    # Same sparsity as the counts; a zero confidence is stored explicitly so the layouts match
+    score_matrix = count_matrix.copy().astype(np.float32)
+    score_matrix.data = np.asarray(confidence, dtype=np.float32)[np.lexsort((cols, rows))]
+
+    os.makedirs(directory, exist_ok=True)
+    target = tempfile.mkdtemp(prefix="build-", dir=directory)
+    name = os.path.basename(target)
+    sparse.save_npz(os.path.join(target, "counts.npz"), count_matrix)
+    sparse.save_npz(os.path.join(target, "scores.npz"), score_matrix)
+    with open(os.path.join(target, "labels.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "drugs": drugs,
+            "areas": areas,
+            "adverse_event_totals": ae_totals,
+            "patent_risk": patents,
+            "literature_source": source,
+            "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }, f)
+
+    pointer = os.path.join(directory, CURRENT_FILE)
+    previous = None
+    if os.path.exists(pointer):
+        with open(pointer, encoding="utf-8") as f:
+            previous = f.read().strip()
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+    # The build being replaced is kept until the next one, for readers still loading it
+    for old in os.listdir(directory):
+        if old.startswith("build-") and old not in (name, previous):
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+    return {"drugs": len(drugs), "areas": len(areas), "pairs_with_evidence": int(count_matrix.nnz),
+            "literature_source": source, "seconds": round(time.monotonic() - started, 2)}
+
+
+class EvidenceMatrix:
+    """
+    Read-only view of the current build. Safe to share between threads; reloads
+    itself when a new build is swapped in.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._state = None
+
+    def _load(self):
+        pointer = os.path.join(self.directory, CURRENT_FILE)
+        mtime = os.stat(pointer).st_mtime_ns
+        if self._state is None or mtime != self._mtime:
+            from scipy import sparse
+
+            with open(pointer, encoding="utf-8") as f:
+                build = os.path.join(self.directory, f.read().strip())
+            with open(os.path.join(build, "labels.json"), encoding="utf-8") as f:
+                labels = json.load(f)
+            scores = sparse.load_npz(os.path.join(build, "scores.npz")).tocsr()
+            counts = sparse.load_npz(os.path.join(build, "counts.npz")).tocsr()
+            self._state = {
+                "labels": labels,
+                "rows": {drug_key(d): i for i, d in enumerate(labels["drugs"])},
+                "cols": {normalize_key(a): j for j, a in enumerate(labels["areas"])},
+                "scores": scores,
+                "counts": counts,
+                # Column copies, so an area query is a contiguous slice as well
+                "scores_csc": scores.tocsc(),
+                "counts_csc": counts.tocsc(),
+            }
+            self._mtime = mtime
+        return self._state
+
+    @staticmethod
+    def _top(indices, scores, counts, n):
+        import numpy as np
+
+        if len(scores) > n:
+            keep = np.argpartition(-scores, n - 1)[:n]
+        else:
+            keep = np.arange(len(scores))
+        order = keep[np.lexsort((-counts[keep], -scores[keep]))]  # ties go to the better-studied pair
+        return [(int(indices[k]), round(float(scores[k]), 1), int(counts[k])) for k in order]
+
+    def top_drugs(self, therapeutic_area, n=20):
+        """
+        Best-scoring drugs for an area: [{"drug", "score", "papers"}], best first.
+        Unknown areas return [].
+        """
+        with self._lock:
+            state = self._load()
+        j = state["cols"].get(normalize_key(therapeutic_area))
+        if j is None:
+            return []
+        scores, counts = state["scores_csc"], state["counts_csc"]
+        lo, hi = scores.indptr[j], scores.indptr[j + 1]
+        drugs = state["labels"]["drugs"]
+        return [{"drug": drugs[i], "score": s, "papers": c}
+                for i, s, c in self._top(scores.indices[lo:hi], scores.data[lo:hi], counts.data[lo:hi], n)]
+
+    def top_areas(self, drug_name, n=5):
+        """
+        Best-scoring areas for a drug: [{"therapeutic_area", "score", "papers"}], best first.
+        Drugs outside the build return [].
+        """
+        with self._lock:
+            state = self._load()
+        i = state["rows"].get(drug_key(drug_name))
+        if i is None:
+            return []
+        scores, counts = state["scores"], state["counts"]
+        lo, hi = scores.indptr[i], scores.indptr[i + 1]
+        areas = state["labels"]["areas"]
+        return [{"therapeutic_area": areas[j], "score": s, "papers": c}
+                for j, s, c in self._top(scores.indices[lo:hi], scores.data[lo:hi], counts.data[lo:hi], n)]
+
+    def shortlist(self, areas, n=20):
+        """
+        (drug, area) pairs for the top `n` drugs of each area, ready for `agents.batch`.
+        """
+        return [(row["drug"], area) for area in areas for row in self.top_drugs(area, n)]
+
+    def stats(self):
+        with self._lock:
+            state = self._load()
+        labels = state["labels"]
+        return {"drugs": len(labels["drugs"]), "areas": len(labels["areas"]),
+                "pairs_with_evidence": int(state["scores"].nnz), "literature_source": labels["literature_source"],
+                "built_at": labels["built_at"]}
+
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def get_matrix():
+    """
+    The process-wide matrix at `evidence_matrix_dir()`, or None if it has not been built.
+    """
+    global _matrix
+    directory = evidence_matrix_dir()
+    with _matrix_lock:
+        if _matrix is not None and _matrix.directory != directory:
+            _matrix = None
+        if _matrix is None:
+            if not os.path.exists(os.path.join(directory, CURRENT_FILE)):
+                return None
+            _matrix = EvidenceMatrix(directory)
+        return _matrix
+
+
+def _read_drugs(path):
+    """
+    Drug names from a CSV with a `drug`/`drug_name` column, or a plain list with one name per line.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        first = f.readline()
+        f.seek(0)
+        header = [h.strip() for h in first.split(",")]
+        if "drug" in header or "drug_name" in header:
+            from agents.batch import DRUG_COLUMNS, _pick
+            return [d for d in (_pick(row, DRUG_COLUMNS) for row in csv.DictReader(f)) if d]
+        return [line.strip() for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the drug x therapeutic-area evidence matrix.")
+    parser.add_argument("--matrix", default=None, help="Matrix directory (default: BIOFORGE_EVIDENCE_MATRIX)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Score every drug x area pair")
+    build.add_argument("--drugs", default=None, help="CSV or one-name-per-line file (default: the drug vocabulary)")
+    build.add_argument("--area", action="append", default=None, help="Therapeutic area (repeatable; default: app areas)")
+    build.add_argument("--workers", type=int, default=8, help="Concurrent OpenFDA lookups")
+    top_drugs = commands.add_parser("top-drugs", help="Best drugs for an area")
+    top_drugs.add_argument("area")
+    top_drugs.add_argument("-n", type=int, default=20)
+    top_areas = commands.add_parser("top-areas", help="Best areas for a drug")
+    top_areas.add_argument("drug")
+    top_areas.add_argument("-n", type=int, default=5)
+    shortlist = commands.add_parser("shortlist", help="Write the top pairs as a batch input CSV")
+    shortlist.add_argument("areas", nargs="+")
+    shortlist.add_argument("-n", type=int, default=20, help="Drugs per area")
+    shortlist.add_argument("--output", default="-", help="CSV path (default: stdout)")
+    commands.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    directory = args.matrix or evidence_matrix_dir()
+    if args.command == "build":
+        drugs = _read_drugs(args.drugs) if args.drugs else get_vocabulary().ingredients()
+        summary = build_matrix(drugs, args.area or THERAPEUTIC_AREAS, directory, workers=args.workers, log=sys.stderr)
+        print(json.dumps(summary))
+        return
+
+    if not os.path.exists(os.path.join(directory, CURRENT_FILE)):
+        parser.error(f"no evidence matrix in {directory}; run `build` first")
+    matrix = EvidenceMatrix(directory)
+    if args.command == "top-drugs":
+        for row in matrix.top_drugs(args.area, args.n):
+            print(json.dumps(row))
+    elif args.command == "top-areas":
+        for row in matrix.top_areas(args.drug, args.n):
+            print(json.dumps(row))
+    elif args.command == "stats":
+        print(json.dumps(matrix.stats()))
+    else:
+        out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+        try:
+            writer = csv.writer(out)
+            writer.writerow(["drug", "therapeutic_area"])
+            writer.writerows(matrix.shortlist(args.areas, args.n))
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+
+if __name__ == "__main__":
+    main()
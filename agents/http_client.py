@@ -0,0 +1,258 @@
+import time
+import random
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from agents.config import http_settings, host_rate_limits
+from agents import telemetry, budget
+
+# Shared HTTP layer for every outbound agent call: one keep-alive connection pool
+# per process, per-host rate limiting, bounded retries with jittered backoff and
+# hedged requests for slow idempotent calls. Timeouts and retries are cut short
+# to fit the caller's latency budget (see `agents.budget`).
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+LATENCY_WINDOW = 200  # recent answered attempts per host that hedging delays are taken from
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = http_settings()["pool_size"]
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = "BioForge-AI/1.0"
+            _session = session
+        return _session
+
+
+class RateLimiter:
+    """
+    Spaces calls to one host at least 1/rate seconds apart (shared across threads).
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter_for(host):
+    with _limiters_lock:
+        if host not in _limiters:
+            rate = host_rate_limits().get(host)
+            _limiters[host] = RateLimiter(rate) if rate else None
+        return _limiters[host]
+
+
+_stats = {}
+_latencies = {}  # host -> recent attempt latencies (seconds)
+_stats_lock = threading.Lock()
+
+
+def _host_stats(host):
+    return _stats.setdefault(host, {"calls": 0, "errors": 0, "retries": 0, "hedges": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+
+def _record(host, elapsed_ms, retries, failed):
+    with _stats_lock:
+        s = _host_stats(host)
+        s["calls"] += 1
+        s["retries"] += retries
+        s["errors"] += 1 if failed else 0
+        s["total_ms"] += elapsed_ms
+        s["max_ms"] = max(s["max_ms"], elapsed_ms)
+
+
+def _observe_attempt(host, seconds):
+    with _stats_lock:
+        _latencies.setdefault(host, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def _hedge_delay(host, settings):
+    """
+    Seconds to wait before hedging a call to `host`: its recent `hedge_quantile`
+    attempt latency, or None while hedging is off or too few calls are recorded.
+    """
+    if settings["hedge_quantile"] <= 0:
+        return None
+    with _stats_lock:
+        samples = sorted(_latencies.get(host, ()))
+    if len(samples) < max(1, settings["hedge_min_samples"]):
+        return None
+    quantile = samples[min(len(samples) - 1, int(len(samples) * settings["hedge_quantile"]))]
+    return max(quantile, settings["hedge_min_delay"])
+
+
+def timing_stats():
+    """
+    Per-host counters: calls, errors, retries, hedged attempts, total/avg/max latency in ms.
+    """
+    with _stats_lock:
+        out = {}
+        for host, s in _stats.items():
+            out[host] = dict(s, avg_ms=round(s["total_ms"] / s["calls"], 1) if s["calls"] else 0.0)
+        return out
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+        _latencies.clear()
+
+
+def _backoff_delay(attempt, base, response=None):
+    # Honour Retry-After when the server sends one, otherwise exponential backoff with full jitter
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return min(float(response.headers["Retry-After"]), 10.0)
+    return random.uniform(0, base * (2 ** attempt))
+
+
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def _hedge_pool():
+    # Hedged calls run both attempts off the calling thread, so the first answer can be returned
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=2 * http_settings()["pool_size"],
+                                                 thread_name_prefix="http-hedge")
+        return _hedge_executor
+
+
+def _attempt(session, method, url, timeout, host, **kwargs):
+    started = time.perf_counter()
+    response = session.request(method, url, timeout=timeout, **kwargs)
+    if response.status_code < 500:
+        _observe_attempt(host, time.perf_counter() - started)
+    return response
+
+
+def _discard(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _send(session, method, url, timeout, host, limiter, hedge_after, **kwargs):
+    """
+    One attempt. With `hedge_after`, a second identical request goes out if the first
+    has not answered within that many seconds (and the budget leaves room for it);
+    the first response to arrive is returned and the other is closed when it lands.
+    """
+    left = budget.remaining()
+    if hedge_after is None or (left is not None and hedge_after >= left):
+        return _attempt(session, method, url, timeout, host, **kwargs)
+
+    pool = _hedge_pool()
+    first = pool.submit(_attempt, session, method, url, timeout, host, **kwargs)
+    if wait([first], timeout=hedge_after).done:
+        return first.result()
+
+    if limiter:
+        limiter.acquire()
+    telemetry.inc("bioforge_http_hedges_total", host=host)
+    with _stats_lock:
+        _host_stats(host)["hedges"] += 1
+    second = pool.submit(_attempt, session, method, url, timeout, host, **kwargs)
+    pending = {first, second}
+    while True:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winner = next((f for f in done if f.exception() is None), None)
+        if winner is not None:
+            (second if winner is first else first).add_done_callback(_discard)
+            return winner.result()
+        if not pending:
+            raise next(iter(done)).exception()
+
+
+def request(method, url, timeout=None, max_retries=None, service=None, hedge=None, **kwargs):
+    """
+    Sends a request through the pooled session. Connection errors, timeouts and
+    429/5xx responses are retried up to `max_retries` times. The final response
+    is returned as-is (callers decide what a non-2xx status means); the final
+    exception is re-raised if every attempt failed to connect.
+    `hedge` (default: GET only) marks the call as safe to send twice; see `http_settings`.
+    Inside a latency budget, each attempt's timeout is cut to the time left, and a
+    retry that would not fit raises `budget.DeadlineExceeded` (or returns the last response).
+    Each call is an "http" telemetry span labelled with `service` (default: the host).
+    """
+    with telemetry.span("http", service=service or urlsplit(url).netloc) as s:
+        response = _request(method, url, timeout, max_retries, method == "GET" if hedge is None else hedge, **kwargs)
+        if response.status_code >= 500 or response.status_code == 429:
+            s.set(status="error")
+        return response
+
+
+def _request(method, url, timeout, max_retries, hedge, **kwargs):
+    settings = http_settings()
+    timeout = settings["timeout"] if timeout is None else timeout
+    max_retries = settings["max_retries"] if max_retries is None else max_retries
+    host = urlsplit(url).netloc
+    limiter = _limiter_for(host)
+    session = get_session()
+
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.acquire()
+        response = None
+        attempt_timeout = budget.clamp(timeout)
+        hedge_after = _hedge_delay(host, settings) if hedge else None
+        try:
+            response = _send(session, method, url, attempt_timeout, host, limiter, hedge_after, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt >= max_retries:
+                failed = response.status_code >= 500 or response.status_code == 429
+                _record(host, (time.perf_counter() - started) * 1000, attempt, failed)
+                return response
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= max_retries:
+                _record(host, (time.perf_counter() - started) * 1000, attempt, True)
+                raise
+            error = e
+        delay = _backoff_delay(attempt, settings["backoff"], response)
+        left = budget.remaining()
+        if left is not None and delay >= left:
+            # No time for another attempt
+            _record(host, (time.perf_counter() - started) * 1000, attempt, True)
+            if response is not None:
+                return response
+            raise budget.DeadlineExceeded(f"{host}: latency budget used up after {attempt + 1} attempts") from error
+        if response is not None:
+            response.close()  # hand the connection back to the pool before retrying
+        telemetry.inc("bioforge_http_retries_total", host=host)
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
@@ -0,0 +1,117 @@
+import os
+import copy
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.config import worker_pool_settings
+from agents.orchestrator import run_swarm
+from agents import result_store, telemetry
+
+log = logging.getLogger(__name__)
+
+# Background executor that owns swarm runs, so they survive Streamlit reruns and
+# never block a session's script thread. The UI submits a job, keeps its id in
+# session state and polls `get_job` to draw progress.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED_JOB_TTL = 3600  # seconds a finished job stays pollable
+
+_executor = ThreadPoolExecutor(max_workers=worker_pool_settings()["job_workers"], thread_name_prefix="swarm-job")
+_jobs = {}
+_inflight = {}  # dedupe key -> job id of a queued/running job
+_lock = threading.Lock()
+
+
+def _new_job(drug_name, therapeutic_area):
+    return {
+        "id": uuid.uuid4().hex,
+        "drug": drug_name,
+        "area": therapeutic_area,
+        "state": QUEUED,
+        "agents": {},                                   # "lit"/"pat"/"clin" -> result, as each finishes
+        "narrative": {"summary": "", "rationale": []},  # streamed decision summary
+        "result": None,
+        "error": None,
+        "submitted_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+
+
+def _update(job_id, **fields):
+    with _lock:
+        _jobs[job_id].update(fields)
+
+
+def _run(job_id, dedupe_key, drug_name, therapeutic_area, api_key, force_refresh, deadline):
+    _update(job_id, state=RUNNING, started_at=time.time())
+
+    def on_agent_done(key, result):
+        with _lock:
+            _jobs[job_id]["agents"][key] = result
+
+    def on_narrative(summary, rationale):
+        _update(job_id, narrative={"summary": summary, "rationale": list(rationale)})
+
+    try:
+        with telemetry.span("swarm") as s:
+            result = run_swarm(drug_name, therapeutic_area, api_key=api_key, on_agent_done=on_agent_done,
+                               on_narrative=on_narrative, force_refresh=force_refresh, deadline=deadline)
+            s.set(cache="hit" if result.get("from_cache") else "miss")
+        telemetry.observe("bioforge_job_queue_seconds", _jobs[job_id]["started_at"] - _jobs[job_id]["submitted_at"])
+        _update(job_id, state=DONE, result=result, finished_at=time.time())
+    except Exception as e:
+        log.warning("Swarm Job Error (%s / %s): %s", drug_name, therapeutic_area, e)
+        _update(job_id, state=FAILED, error=str(e), finished_at=time.time())
+    finally:
+        with _lock:
+            if _inflight.get(dedupe_key) == job_id:
+                del _inflight[dedupe_key]
+
+
+def _prune(now):
+    for job_id in [j for j, job in _jobs.items()
+                   if job["finished_at"] and now - job["finished_at"] > FINISHED_JOB_TTL]:
+        del _jobs[job_id]
+
+
+def submit(drug_name, therapeutic_area, api_key=None, force_refresh=False, deadline=None):
+    """
+    Queues a swarm run and returns its job id. If an identical run (same drug, area,
+    Gemini key, `force_refresh` and `deadline`) is already queued or running, that job's
+    id is returned instead, so a forced refresh never attaches to an ordinary run and
+    nobody's run is charged to another user's key.
+    `deadline` is the run's latency budget in seconds (see `run_swarm`); it starts
+    when the job does, not while it is queued.
+    """
+    llm_key = api_key or os.getenv("GEMINI_API_KEY") or ""
+    result_key = result_store.result_key(drug_name, therapeutic_area, bool(llm_key))
+    dedupe_key = (result_key, hashlib.sha256(llm_key.encode()).hexdigest(), bool(force_refresh), deadline)
+    with _lock:
+        _prune(time.time())
+        existing = _inflight.get(dedupe_key)
+        if existing is not None:
+            return existing
+        job = _new_job(drug_name, therapeutic_area)
+        _jobs[job["id"]] = job
+        _inflight[dedupe_key] = job["id"]
+
+    _executor.submit(_run, job["id"], dedupe_key, drug_name, therapeutic_area, api_key, force_refresh, deadline)
+    return job["id"]
+
+
+def get_job(job_id):
+    """
+    Snapshot of a job's state (a copy, safe to read while the job runs), or None.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        return copy.deepcopy(job) if job is not None else None
+
+
+def is_finished(job):
+    return job["state"] in (DONE, FAILED)
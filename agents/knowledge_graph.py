@@ -0,0 +1,375 @@
+import os
+import gzip
+import json
+import heapq
+import logging
+import threading
+import contextlib
+
+from agents.config import knowledge_graph_settings
+from agents.cache import normalize_key
+from agents.drug_names import canonical_name, drug_key
+
+log = logging.getLogger(__name__)
+
+# Drug - disease - paper - journal - adverse-event graph that grows with every
+# analysis. Updates are appended to a JSON-lines log; the log is folded into a
+# gzipped JSON snapshot once it gets long, so a save never rewrites the whole graph.
+# Each snapshot has a generation number and the log starts with the generation it
+# extends, so a log left over from an interrupted compaction is not replayed twice.
+# Worker processes share the files: appends and compactions take a file lock, and
+# each process replays the others' entries before it writes or answers a query.
+
+DRUG, DISEASE, PAPER, JOURNAL, ADVERSE_EVENT = "drug", "disease", "paper", "journal", "adverse_event"
+NODE_TYPES = (DRUG, DISEASE, PAPER, JOURNAL, ADVERSE_EVENT)
+
+SNAPSHOT_FILE = "graph.json.gz"
+LOG_FILE = "graph.log.jsonl"
+LOCK_FILE = "graph.lock"
+
+
+def node_id(node_type, key):
+    if node_type == DRUG:
+        key = drug_key(key)
+    elif node_type != PAPER:
+        key = normalize_key(key)
+    return f"{node_type}:{key}"
+
+
+class KnowledgeGraph:
+    """
+    networkx DiGraph with a per-type node index and an append-only on-disk log.
+    Safe to share between threads, and between processes using the same `directory`.
+    `directory=None` keeps it in memory only.
+    """
+
+    def __init__(self, directory=None, compact_after=50000):
+        import networkx as nx  # heavy import, paid only once the graph is used
+
+        self.directory = directory
+        self.compact_after = compact_after
+        self._graph = nx.DiGraph()
+        self._by_type = {t: set() for t in NODE_TYPES}
+        self._lock = threading.RLock()
+        self._logged = 0
+        self._generation = 0
+        self._log_id = None  # (inode, device) of the log file read so far
+        self._offset = 0     # bytes of it already applied
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            with self._file_lock():
+                self._load()
+
+    # --- persistence -----------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """
+        Cross-process lock on the graph directory, held while the log is read, appended
+        to or compacted. Not re-entrant: take it once, at the outermost call.
+        """
+        with open(os.path.join(self.directory, LOCK_FILE), "a+b") as f:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK gives up after ~10 s; keep waiting
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        self._graph.clear()
+        self._by_type = {t: set() for t in NODE_TYPES}
+        self._generation = 0
+        self._log_id, self._offset, self._logged = None, 0, 0
+        snapshot = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot):
+            with gzip.open(snapshot, "rt", encoding="utf-8") as f:
+                state = json.load(f)
+            self._generation = state["generation"]
+            nodes = state["nodes"]
+            for node, attrs in nodes:
+                self._apply(["n", node, attrs])
+            for u, v, attrs in state["edges"]:
+                self._graph.add_edge(nodes[u][0], nodes[v][0], **attrs)
+        self._catch_up()
+
+    def _log_changed(self, st):
+        return (st.st_ino, st.st_dev) != self._log_id or st.st_size != self._offset
+
+    def _catch_up(self):
+        """
+        Applies whatever other processes appended to the log since this one last read it
+        (caller holds the file lock). After another process compacted, the log is a new
+        file and the graph is reloaded from its snapshot.
+        """
+        log_path = os.path.join(self.directory, LOG_FILE)
+        try:
+            st = os.stat(log_path)
+        except FileNotFoundError:
+            self._start_log()
+            return
+        if self._log_id is not None and (st.st_ino, st.st_dev) != self._log_id:
+            self._load()
+            return
+        if not self._log_changed(st):
+            return
+        ops, good = [], self._offset
+        with open(log_path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated line")
+                    ops.append(json.loads(line))
+                except ValueError:
+                    break  # torn last line from a writer that died mid-append
+                good += len(line)
+        if good < st.st_size:
+            # Cut the fragment off, so later appends start on a clean line
+            log.warning("Knowledge graph log: dropping a torn entry at byte %d", good)
+            with open(log_path, "r+b") as f:
+                f.truncate(good)
+
+        if self._offset == 0:
+            # A log without a header predates generations and extends the empty graph
+            generation = ops[0][1] if ops and ops[0][0] == "g" else 0
+            if generation != self._generation:
+                # Left over from a compaction that crashed after writing the snapshot
+                self._start_log()
+                return
+        for op in ops:
+            if op[0] != "g":
+                self._apply(op)
+                self._logged += 1
+        self._log_id, self._offset = (st.st_ino, st.st_dev), good
+
+    def _refresh(self):
+        """
+        Picks up other processes' updates before a query; a stat when there are none.
+        """
+        if not self.directory:
+            return
+        try:
+            if not self._log_changed(os.stat(os.path.join(self.directory, LOG_FILE))):
+                return
+        except FileNotFoundError:
+            pass
+        with self._file_lock():
+            self._catch_up()
+
+    def _start_log(self):
+        # A new file (not truncated in place), so other processes see the log was replaced
+        log_path = os.path.join(self.directory, LOG_FILE)
+        header = (json.dumps(["g", self._generation]) + "\n").encode("utf-8")
+        with open(log_path + ".tmp", "wb") as f:
+            f.write(header)
+        os.replace(log_path + ".tmp", log_path)
+        st = os.stat(log_path)
+        self._log_id, self._offset, self._logged = (st.st_ino, st.st_dev), len(header), 0
+
+    def _apply(self, op):
+        if op[0] == "n":
+            _, node, attrs = op
+            self._graph.add_node(node, **attrs)
+            self._by_type.setdefault(attrs["type"], set()).add(node)
+        else:
+            _, u, v, attrs = op
+            data = self._graph.get_edge_data(u, v)
+            if data is None:
+                self._graph.add_edge(u, v, count=1, **attrs)
+            else:
+                data.update(attrs)
+                data["count"] = data.get("count", 1) + 1
+
+    def _commit(self, ops):
+        with self._lock:
+            if not self.directory:
+                for op in ops:
+                    self._apply(op)
+                return
+            with self._file_lock():
+                self._catch_up()
+                for op in ops:
+                    self._apply(op)
+                with open(os.path.join(self.directory, LOG_FILE), "ab") as f:
+                    f.write("".join(json.dumps(op, default=str) + "\n" for op in ops).encode("utf-8"))
+                    self._offset = f.tell()
+                self._logged += len(ops)
+                if self._logged >= self.compact_after:
+                    self._compact()
+
+    def compact(self):
+        """
+        Writes the whole graph as one snapshot (nodes once, edges as index pairs) under the
+        next generation number, then starts a new log for that generation.
+        """
+        with self._lock:
+            if not self.directory:
+                return
+            with self._file_lock():
+                self._catch_up()
+                self._compact()
+
+    def _compact(self):
+        index = {}
+        nodes = []
+        for node, attrs in self._graph.nodes(data=True):
+            index[node] = len(nodes)
+            nodes.append((node, attrs))
+        edges = [(index[u], index[v], attrs) for u, v, attrs in self._graph.edges(data=True)]
+        generation = self._generation + 1
+        tmp = os.path.join(self.directory, SNAPSHOT_FILE + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump({"generation": generation, "nodes": nodes, "edges": edges}, f, default=str)
+        os.replace(tmp, os.path.join(self.directory, SNAPSHOT_FILE))
+        self._generation = generation
+        self._start_log()
+
+    # --- updates ---------------------------------------------------------------
+
+    def record_analysis(self, drug_name, therapeutic_area, lit=None, pat=None, clin=None, decision=None):
+        """
+        Folds one analysis (the agents' `data` dicts) into the graph as a single logged batch.
+        """
+        drug = node_id(DRUG, drug_name)
+        disease = node_id(DISEASE, therapeutic_area)
+        drug_attrs = {"type": DRUG, "label": canonical_name(drug_name)}
+        if pat:
+            drug_attrs.update(patent_risk=pat.get("patent_risk"), primary_expiry=pat.get("primary_expiry"))
+        if clin:
+            drug_attrs.update(safety_profile_score=clin.get("safety_profile_score"))
+        ops = [
+            ["n", drug, drug_attrs],
+            ["n", disease, {"type": DISEASE, "label": " ".join(therapeutic_area.split())}],
+        ]
+
+        link = {"relation": "investigated_for"}
+        if lit:
+            link.update(relevance_score=lit.get("relevance_score"), publication_count=lit.get("publication_count"))
+        if decision:
+            link.update(weight=decision.get("final_confidence_score"), recommendation=decision.get("recommendation"))
+        ops.append(["e", drug, disease, link])
+
+        for paper in (lit or {}).get("top_papers", []):
+            if not paper.get("pmid"):
+                continue
+            pid = node_id(PAPER, paper["pmid"])
+            ops.append(["n", pid, {"type": PAPER, "label": (paper.get("title") or paper["pmid"])[:120]}])
+            ops.append(["e", drug, pid, {"relation": "mentioned_in"}])
+            ops.append(["e", pid, disease, {"relation": "about"}])
+            if paper.get("journal"):
+                jid = node_id(JOURNAL, paper["journal"])
+                ops.append(["n", jid, {"type": JOURNAL, "label": paper["journal"]}])
+                ops.append(["e", pid, jid, {"relation": "published_in"}])
+
+        for event in (clin or {}).get("adverse_events", []):
+            aid = node_id(ADVERSE_EVENT, event["term"])
+            ops.append(["n", aid, {"type": ADVERSE_EVENT, "label": event["term"].title()}])
+            ops.append(["e", drug, aid, {"relation": "reported_with", "weight": event.get("count", 1)}])
+
+        self._commit(ops)
+
+    # --- queries ---------------------------------------------------------------
+
+    def nodes_of_type(self, node_type):
+        with self._lock:
+            self._refresh()
+            return set(self._by_type.get(node_type, ()))
+
+    def neighborhood(self, center, hops=2, max_nodes=100, per_node=20):
+        """
+        Bounded subgraph around `center` for rendering: breadth-first up to `hops`,
+        following at most `per_node` of each node's heaviest edges (either direction),
+        and stopping at `max_nodes`. Returns (nodes, edges) as
+        [(node_id, attrs)] and [(source, target, attrs)]; empty if `center` is unknown.
+        """
+        with self._lock:
+            self._refresh()
+            graph = self._graph
+            if center not in graph:
+                return [], []
+            seen = {center}
+            frontier = [center]
+            for _ in range(hops):
+                next_frontier = []
+                for u in frontier:
+                    ranked = heapq.nlargest(
+                        per_node,
+                        ((self._weight(u, v), v) for v in set(graph.successors(u)) | set(graph.predecessors(u))
+                         if v not in seen),
+                    )
+                    for _, v in ranked:
+                        if len(seen) >= max_nodes:
+                            break
+                        seen.add(v)
+                        next_frontier.append(v)
+                frontier = next_frontier
+                if not frontier or len(seen) >= max_nodes:
+                    break
+            sub = graph.subgraph(seen)
+            return ([(n, dict(a)) for n, a in sub.nodes(data=True)],
+                    [(u, v, dict(a)) for u, v, a in sub.edges(data=True)])
+
+    def _weight(self, u, v):
+        data = self._graph.get_edge_data(u, v) or self._graph.get_edge_data(v, u)
+        return (data.get("weight") or 0) + data.get("count", 1)
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                "nodes": self._graph.number_of_nodes(),
+                "edges": self._graph.number_of_edges(),
+                "by_type": {t: len(ids) for t, ids in self._by_type.items()},
+                "pending_log_entries": self._logged,
+            }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """
+    The process-wide graph, loaded from BIOFORGE_GRAPH_DIR on first use.
+    """
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            settings = knowledge_graph_settings()
+            _graph = KnowledgeGraph(settings["dir"], compact_after=settings["compact_after"])
+        return _graph
+
+
+def record_swarm(drug_name, therapeutic_area, results):
+    """
+    Adds a swarm run ({"lit", "pat", "clin"} agent results, plus "decision") to the shared
+    graph. Only agents that returned real, non-degraded data contribute, and the decision
+    only when it is not partial, so a placeholder score never becomes an edge weight.
+    Failures are logged, never raised, so a graph problem cannot fail the analysis itself.
+    """
+    data = {key: results[key]["data"] for key in ("lit", "pat", "clin")
+            if key in results and results[key].get("status") == "Success"
+            and not results[key]["data"].get("degraded")}
+    decision = results.get("decision")
+    if decision and decision.get("partial"):
+        decision = None
+    try:
+        get_graph().record_analysis(drug_name, therapeutic_area, decision=decision, **data)
+    except Exception as e:
+        log.warning("Knowledge graph update failed (%s / %s): %s", drug_name, therapeutic_area, e)
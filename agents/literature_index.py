@@ -0,0 +1,355 @@
+"""
+Local full-text index over bulk-loaded PubMed/MEDLINE records, for offline and
+low-latency literature scoring.
+
+    python -m agents.literature_index add pubmed24n0001.xml.gz pubmed24n0002.xml.gz
+    python -m agents.literature_index search Metformin "Oncology - Solid Tumors"
+    python -m agents.literature_index merge
+
+Each `add` turns new baseline/update files (PubMed XML, optionally gzipped, or
+MEDLINE text) into one segment: a flat file of sorted uint32 document ids per term,
+memory-mapped at query time, with term -> (offset, length) kept in SQLite next to
+the document store. Files already loaded are skipped, so `add` can be re-run on a
+growing baseline directory. A record whose PMID is loaded again replaces the old one.
+Queries AND the drug and disease terms (title and abstract words, not phrases).
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import mmap
+import array
+import bisect
+import sqlite3
+import argparse
+import threading
+
+from agents.config import literature_index_dir
+from agents.drug_names import canonical_name
+from agents.medline import iter_medline_records, iter_pubmed_xml
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+             "or", "that", "the", "to", "was", "were", "with"}
+
+MERGE_AFTER_SEGMENTS = 8  # `add` folds all segments into one once there are more than this
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, pmid TEXT NOT NULL UNIQUE, title TEXT,"
+    " journal TEXT, year INTEGER, mesh TEXT, abstract TEXT)",
+    "CREATE TABLE IF NOT EXISTS terms (term TEXT NOT NULL, segment INTEGER NOT NULL, offset INTEGER NOT NULL,"
+    " n INTEGER NOT NULL, PRIMARY KEY (term, segment)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY, path TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS deleted (id INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, records INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS garbage (path TEXT PRIMARY KEY)",  # merged-away segment files not yet removed
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+
+
+def tokenize(text):
+    """
+    Distinct index terms of a text: lowercase alphanumeric words, minus stopwords.
+    """
+    return {t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS}
+
+
+def _iter_file(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    if path.endswith((".xml", ".xml.gz")):
+        with opener(path, "rb") as f:
+            yield from iter_pubmed_xml(f)
+    else:
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            yield from iter_medline_records(f)
+
+
+class LiteratureIndex:
+    """
+    Reader and writer for an index directory. Safe to share between threads; a
+    reader picks up segments added by another process on its next query.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")  # readers in other processes keep going during a load
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._generation = None
+        self._segments = {}  # segment id -> (mmap, uint32 memoryview)
+        self._deleted = set()
+
+    # --- reading ---------------------------------------------------------------
+
+    def _refresh(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        generation = row[0] if row else "0"
+        if generation == self._generation:
+            return
+        for mm, view in self._segments.values():
+            view.release()
+            mm.close()
+        self._segments = {}
+        for seg_id, path in self._conn.execute("SELECT id, path FROM segments"):
+            full = os.path.join(self.directory, path)
+            if os.path.getsize(full) == 0:
+                continue
+            with open(full, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._segments[seg_id] = (mm, memoryview(mm).cast("I"))
+        self._deleted = {r[0] for r in self._conn.execute("SELECT id FROM deleted")}
+        self._generation = generation
+
+    def _postings(self, term):
+        """
+        Sorted doc ids containing `term`, as a list of memoryview slices (one per segment, in id order).
+        """
+        rows = self._conn.execute("SELECT segment, offset, n FROM terms WHERE term = ? ORDER BY segment",
+                                  (term,)).fetchall()
+        return [self._segments[seg][1][offset:offset + n] for seg, offset, n in rows if seg in self._segments]
+
+    @staticmethod
+    def _contains(lists, doc_id):
+        for ids in lists:
+            i = bisect.bisect_left(ids, doc_id)
+            if i < len(ids) and ids[i] == doc_id:
+                return True
+        return False
+
+    def matching_ids(self, terms):
+        """
+        Doc ids (ascending) containing every term: walks the shortest posting list and
+        binary-searches the others.
+        """
+        with self._lock:
+            self._refresh()
+            postings = [self._postings(t) for t in set(terms)]
+            if not postings or any(not p for p in postings):
+                return []
+            postings.sort(key=lambda lists: sum(len(ids) for ids in lists))
+            shortest, rest = postings[0], postings[1:]
+            return [doc_id for ids in shortest for doc_id in ids
+                    if doc_id not in self._deleted and all(self._contains(p, doc_id) for p in rest)]
+
+    def count(self, text):
+        """
+        Number of documents containing every term of `text`.
+        """
+        return len(self.matching_ids(tokenize(text)))
+
+    def fetch(self, doc_ids):
+        """
+        Records for doc ids, newest publication year first.
+        """
+        if not doc_ids:
+            return []
+        with self._lock:
+            rows = []
+            for i in range(0, len(doc_ids), 500):
+                chunk = list(doc_ids[i:i + 500])
+                rows += self._conn.execute(
+                    f"SELECT pmid, title, journal, year, mesh, abstract FROM docs WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+        rows.sort(key=lambda r: r[3] or 0, reverse=True)
+        return [{"pmid": r[0], "title": r[1], "journal": r[2], "year": r[3], "mesh_terms": json.loads(r[4]),
+                 "abstract": r[5]} for r in rows]
+
+    def search(self, drug_name, therapeutic_area, limit=200):
+        """
+        Co-occurrence search: returns (count, drug_total, records) where `count` is the number
+        of documents mentioning both the drug and the disease, `drug_total` the number
+        mentioning the drug at all, and `records` up to `limit` of the matches, newest first.
+        Only the `limit` most recently loaded matches are considered for `records`.
+        """
+        drug_terms = tokenize(canonical_name(drug_name))
+        ids = self.matching_ids(drug_terms | tokenize(therapeutic_area))
+        drug_total = len(self.matching_ids(drug_terms)) if ids else 0
+        return len(ids), drug_total, self.fetch(ids[-limit:])
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            docs = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            terms = self._conn.execute("SELECT COUNT(DISTINCT term) FROM terms").fetchone()[0]
+            sources = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        return {"documents": docs - len(self._deleted), "terms": terms, "segments": len(self._segments),
+                "source_files": sources}
+
+    # --- writing ---------------------------------------------------------------
+
+    def _bump_generation(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(int(row[0] if row else 0) + 1),))
+
+    def _write_segment(self, postings):
+        """
+        Writes {term: [ascending doc ids]} as a new segment file and registers its terms.
+        """
+        # Never reuse an id: a merge writes its output before deleting the segments it replaces
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'next_segment'").fetchone()
+        seg_id = int(row[0]) if row else 1
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('next_segment', ?)", (str(seg_id + 1),))
+        path = f"seg-{seg_id:06d}.postings"
+        buf = array.array("I")
+        entries = []
+        for term in sorted(postings):
+            entries.append((term, seg_id, len(buf), len(postings[term])))
+            buf.extend(postings[term])
+        with open(os.path.join(self.directory, path), "wb") as f:
+            buf.tofile(f)
+        self._conn.execute("INSERT INTO segments VALUES (?, ?)", (seg_id, path))
+        self._conn.executemany("INSERT INTO terms VALUES (?, ?, ?, ?)", entries)
+
+    def add_files(self, paths, log=None):
+        """
+        Loads baseline/update files not loaded before into one new segment.
+        Returns the number of records added.
+        """
+        with self._lock:
+            self._collect_garbage()
+            paths = list(paths)
+            loaded = {r[0] for r in self._conn.execute("SELECT path FROM sources")}
+            todo = [p for p in dict.fromkeys(os.path.abspath(p) for p in paths) if p not in loaded]
+            if log and len(todo) < len(paths):
+                print(f"[literature_index] skipping {len(paths) - len(todo)} files already loaded or listed twice",
+                      file=log)
+            postings = {}
+            added = 0
+            for path in todo:
+                records = 0
+                for rec in _iter_file(path):
+                    old = self._conn.execute("SELECT id FROM docs WHERE pmid = ?", (rec["pmid"],)).fetchone()
+                    if old is not None:
+                        self._conn.execute("INSERT OR IGNORE INTO deleted VALUES (?)", old)
+                        self._conn.execute("UPDATE docs SET pmid = ? WHERE id = ?", (f"deleted:{old[0]}", old[0]))
+                    cur = self._conn.execute(
+                        "INSERT INTO docs (pmid, title, journal, year, mesh, abstract) VALUES (?, ?, ?, ?, ?, ?)",
+                        (rec["pmid"], rec["title"], rec["journal"], rec["year"], json.dumps(rec["mesh_terms"]),
+                         rec["abstract"]),
+                    )
+                    for term in tokenize(f"{rec['title']} {rec['abstract']}"):
+                        postings.setdefault(term, []).append(cur.lastrowid)
+                    records += 1
+                self._conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (path, records))
+                added += records
+                if log:
+                    print(f"[literature_index] {path}: {records} records", file=log)
+            if postings:
+                self._write_segment(postings)
+            self._bump_generation()
+            self._conn.commit()
+
+            if self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0] > MERGE_AFTER_SEGMENTS:
+                self.merge()
+        return added
+
+    def merge(self):
+        """
+        Folds every segment into one and drops replaced documents from the postings.
+        """
+        with self._lock:
+            self._refresh()
+            deleted = self._deleted
+            old = self._conn.execute("SELECT id, path FROM segments").fetchall()
+            postings = {}
+            for term, in self._conn.execute("SELECT DISTINCT term FROM terms").fetchall():
+                ids = [doc_id for ids in self._postings(term) for doc_id in ids if doc_id not in deleted]
+                if ids:
+                    postings[term] = ids
+            self._conn.execute("DELETE FROM terms")
+            self._conn.execute("DELETE FROM segments")
+            self._write_segment(postings)
+            self._conn.execute("DELETE FROM docs WHERE id IN (SELECT id FROM deleted)")
+            self._conn.execute("DELETE FROM deleted")
+            self._conn.executemany("INSERT OR IGNORE INTO garbage VALUES (?)", [(path,) for _, path in old])
+            self._bump_generation()
+            self._conn.commit()
+            self._refresh()
+            self._collect_garbage()
+
+    def _collect_garbage(self):
+        """
+        Removes segment files a merge replaced. A file another reader still has mapped
+        cannot be removed on Windows; it stays listed and is retried on the next load or merge.
+        """
+        removed = []
+        for path, in self._conn.execute("SELECT path FROM garbage").fetchall():
+            try:
+                os.remove(os.path.join(self.directory, path))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            removed.append((path,))
+        if removed:
+            self._conn.executemany("DELETE FROM garbage WHERE path = ?", removed)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            for mm, view in self._segments.values():
+                view.release()
+                mm.close()
+            self._segments = {}
+            self._generation = None
+            self._conn.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    The process-wide index in `literature_index_dir()`, or None if nothing has been loaded there.
+    """
+    global _index
+    directory = literature_index_dir()
+    with _index_lock:
+        if _index is not None and _index.directory != directory:
+            _index.close()
+            _index = None
+        if _index is None:
+            if not os.path.exists(os.path.join(directory, "index.sqlite3")):
+                return None
+            _index = LiteratureIndex(directory)
+        return _index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the local PubMed full-text index.")
+    parser.add_argument("--index", default=None, help="Index directory (default: BIOFORGE_LITERATURE_INDEX)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Load PubMed XML (.xml/.xml.gz) or MEDLINE text files")
+    add.add_argument("files", nargs="+")
+    commands.add_parser("merge", help="Fold all segments into one")
+    commands.add_parser("stats")
+    search = commands.add_parser("search", help="Co-occurrence count and newest matches for a drug and disease")
+    search.add_argument("drug")
+    search.add_argument("area")
+    search.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    index = LiteratureIndex(args.index or literature_index_dir())
+    if args.command == "add":
+        added = index.add_files(args.files, log=sys.stderr)
+        print(json.dumps(dict(index.stats(), added=added)))
+    elif args.command == "merge":
+        index.merge()
+        print(json.dumps(index.stats()))
+    elif args.command == "stats":
+        print(json.dumps(index.stats()))
+    else:
+        count, drug_total, records = index.search(args.drug, args.area, limit=args.limit)
+        print(json.dumps({"count": count, "drug_total": drug_total,
+                          "records": [{k: r[k] for k in ("pmid", "year", "journal", "title")} for r in records]}))
+
+
+if __name__ == "__main__":
+    main()
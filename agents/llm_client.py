@@ -0,0 +1,252 @@
+import time
+import hashlib
+import threading
+from collections import deque
+
+from agents.config import llm_cache_settings, llm_timeout
+from agents.cache import SingleFlight, open_cache
+from agents import telemetry, budget
+
+# Shared Gemini access for the decision agent and the swarm chat:
+# one configured model handle per (API key, model), a completion cache keyed by
+# prompt hash + model, per-call token/latency records, and a request timeout
+# (BIOFORGE_LLM_TIMEOUT, cut to the caller's latency budget).
+
+MODEL_NAME = 'gemini-1.5-flash-001'  # explicit versioned name to avoid alias issues
+
+
+def _gemini_factory(api_key, model_name):
+    import google.generativeai as genai
+    import google.ai.generativelanguage as glm
+    model = genai.GenerativeModel(model_name)
+    # The handle gets its own client for this key. `genai.configure` is process-wide, and a
+    # model without a client would call with whichever key was configured last.
+    model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return model
+
+
+_model_factory = _gemini_factory
+_models = {}
+_models_lock = threading.Lock()
+
+_completions = None
+_completions_lock = threading.Lock()
+_flights = SingleFlight()
+
+_calls = deque(maxlen=200)
+_totals = {"calls": 0, "cache_hits": 0, "errors": 0, "prompt_tokens": 0, "output_tokens": 0, "total_ms": 0.0}
+_stats_lock = threading.Lock()
+
+
+def set_model_factory(factory):
+    """
+    Swaps how model handles are built, e.g. `lambda key, name: FakeModel()` in tests.
+    The factory's result only needs `generate_content(prompt, **kwargs)` returning an
+    object with `.text` (and optionally `.usage_metadata`); kwargs include `request_options`
+    with the call's `timeout`. Clears cached handles and completions.
+    """
+    global _model_factory
+    _model_factory = factory or _gemini_factory
+    reset()
+
+
+def reset():
+    with _models_lock:
+        _models.clear()
+    _completion_cache().clear()
+    with _stats_lock:
+        _calls.clear()
+        for k in _totals:
+            _totals[k] = 0 if k != "total_ms" else 0.0
+
+
+def get_model(api_key, model_name=MODEL_NAME):
+    """
+    Returns the shared model handle for this key/model, creating it on first use.
+    """
+    key = (hashlib.sha256(api_key.encode()).hexdigest(), model_name)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = _model_factory(api_key, model_name)
+        return _models[key]
+
+
+def _completion_cache():
+    global _completions
+    with _completions_lock:
+        if _completions is None:
+            settings = llm_cache_settings()
+            _completions = open_cache("llm", ttl=settings["ttl"], max_entries=settings["max_entries"])
+            _flights.cache = _completions
+        return _completions
+
+
+def prompt_key(prompt, model_name=MODEL_NAME, generation_config=None):
+    payload = f"{model_name}\n{generation_config!r}\n{prompt}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    return prompt_tokens, output_tokens
+
+
+def _record(model_name, latency_ms, prompt_tokens=0, output_tokens=0, cache_hit=False, error=None, ttft_ms=None):
+    entry = {
+        "model": model_name,
+        "latency_ms": round(latency_ms, 1),
+        "ttft_ms": round(ttft_ms if ttft_ms is not None else latency_ms, 1),
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "cache_hit": cache_hit,
+        "error": error,
+        "at": time.time(),
+    }
+    telemetry.record_span(
+        "llm", latency_ms / 1000, status="error" if error else "ok",
+        cache="hit" if cache_hit else "miss", service="gemini", model=model_name,
+    )
+    if ttft_ms is not None:
+        telemetry.observe("bioforge_llm_ttft_seconds", ttft_ms / 1000, model=model_name)
+    if prompt_tokens or output_tokens:
+        telemetry.inc("bioforge_llm_tokens_total", prompt_tokens, model=model_name, kind="prompt")
+        telemetry.inc("bioforge_llm_tokens_total", output_tokens, model=model_name, kind="output")
+    with _stats_lock:
+        _calls.append(entry)
+        _totals["calls"] += 1
+        _totals["cache_hits"] += 1 if cache_hit else 0
+        _totals["errors"] += 1 if error else 0
+        _totals["prompt_tokens"] += prompt_tokens
+        _totals["output_tokens"] += output_tokens
+        _totals["total_ms"] += latency_ms
+    return entry
+
+
+def _request_options():
+    return {"timeout": budget.clamp(llm_timeout())}
+
+
+def llm_stats():
+    """
+    Aggregate counters plus the most recent call records (newest last).
+    `avg_ttft_ms` is the mean time-to-first-token over the recent uncached calls.
+    """
+    with _stats_lock:
+        recent = list(_calls)
+        totals = dict(_totals)
+    live = [c["ttft_ms"] for c in recent if not c["cache_hit"] and not c["error"]]
+    totals["avg_ttft_ms"] = round(sum(live) / len(live), 1) if live else 0.0
+    return {"totals": totals, "recent": recent}
+
+
+def generate(prompt, api_key, model_name=MODEL_NAME, generation_config=None, use_cache=True):
+    """
+    Returns the completion text for `prompt`, serving identical (prompt, model, config)
+    requests from the completion cache. Identical uncached requests arriving together
+    (across workers, with a shared cache backend) make one Gemini call between them.
+    Exceptions from the model propagate, as does `budget.DeadlineExceeded` when the
+    caller's latency budget is already used up.
+    """
+    key = prompt_key(prompt, model_name, generation_config)
+    started = time.perf_counter()
+
+    def cached():
+        hit = _completion_cache().get(key)
+        if hit is not None:
+            _record(model_name, (time.perf_counter() - started) * 1000, cache_hit=True)
+            return hit[0]
+        return None
+
+    def call():
+        model = get_model(api_key, model_name)
+        try:
+            kwargs = {"request_options": _request_options()}
+            if generation_config is not None:
+                kwargs["generation_config"] = generation_config
+            response = model.generate_content(prompt, **kwargs)
+            text = response.text
+        except Exception as e:
+            _record(model_name, (time.perf_counter() - started) * 1000, error=str(e))
+            raise
+        _record(model_name, (time.perf_counter() - started) * 1000, *_usage(response))
+        return text
+
+    if not use_cache:
+        return call()
+    text = cached()
+    if text is not None:
+        return text
+
+    def load():
+        # Another caller may have completed this prompt while we waited for the lock
+        text = cached()
+        if text is None:
+            text = call()
+            _completion_cache().set(key, text)
+        return text
+
+    return _flights.do(key, load)
+
+
+def forget(prompt, model_name=MODEL_NAME, generation_config=None):
+    """
+    Drops a cached completion, e.g. one the caller could not parse.
+    """
+    _completion_cache().delete(prompt_key(prompt, model_name, generation_config))
+
+
+def stream(prompt, api_key, model_name=MODEL_NAME, generation_config=None, use_cache=True):
+    """
+    Like `generate`, but yields text chunks as Gemini produces them. Time-to-first-token
+    is recorded with the call. A cached completion is yielded as a single chunk; a
+    fully streamed one is added to the cache once complete. With a shared cache
+    backend, a worker streaming the same prompt holds a lock on it, and other workers
+    wait and then get its cached completion.
+    """
+    key = prompt_key(prompt, model_name, generation_config)
+    started = time.perf_counter()
+    if not use_cache:
+        yield from _stream(prompt, api_key, model_name, generation_config, started)
+        return
+    cache = _completion_cache()
+    hit = cache.get(key)
+    if hit is None:
+        with cache.lock(key):
+            hit = cache.get(key)
+            if hit is None:
+                text = yield from _stream(prompt, api_key, model_name, generation_config, started)
+                cache.set(key, text)
+                return
+    _record(model_name, (time.perf_counter() - started) * 1000, cache_hit=True)
+    yield hit[0]
+
+
+def _stream(prompt, api_key, model_name, generation_config, started):
+    """
+    Yields Gemini's chunks for `prompt` and returns the whole text.
+    """
+    model = get_model(api_key, model_name)
+    parts = []
+    ttft_ms = None
+    usage = (0, 0)
+    try:
+        kwargs = {"stream": True, "request_options": _request_options()}
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+        for chunk in model.generate_content(prompt, **kwargs):
+            text = chunk.text
+            if not text:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            usage = _usage(chunk) if getattr(chunk, "usage_metadata", None) else usage
+            parts.append(text)
+            yield text
+    except Exception as e:
+        _record(model_name, (time.perf_counter() - started) * 1000, error=str(e), ttft_ms=ttft_ms)
+        raise
+
+    _record(model_name, (time.perf_counter() - started) * 1000, *usage, ttft_ms=ttft_ms)
+    return "".join(parts)
@@ -0,0 +1,103 @@
+import re
+import xml.etree.ElementTree as ET
+
+# Incremental PubMed record parsers. Both are generators over a stream, so
+# a payload of hundreds (or millions) of records is processed at constant memory.
+
+_YEAR = re.compile(r"(\d{4})")
+
+
+def _new_record():
+    return {"pmid": "", "title": "", "journal": "", "year": None, "mesh_terms": [], "abstract": ""}
+
+
+def _apply_field(record, tag, value):
+    if tag == "PMID":
+        record["pmid"] = value
+    elif tag == "TI":
+        record["title"] = value
+    elif tag == "AB":
+        record["abstract"] = value
+    elif tag == "TA":
+        record["journal"] = value
+    elif tag == "JT" and not record["journal"]:
+        record["journal"] = value
+    elif tag == "DP":
+        match = _YEAR.match(value)
+        record["year"] = int(match.group(1)) if match else None
+    elif tag == "MH":
+        # "Neoplasms/drug therapy/*metabolism" -> "Neoplasms"
+        record["mesh_terms"].append(value.split("/")[0].lstrip("*"))
+
+
+def iter_medline_records(lines):
+    """
+    Parses MEDLINE text format (efetch rettype=medline) line by line.
+    `lines` is any iterable of str lines, e.g. `response.iter_lines(decode_unicode=True)`.
+    Multi-line fields (titles, abstracts) are joined. Yields one dict per record with
+    pmid, title, journal, year, mesh_terms and abstract.
+    """
+    record = None
+    tag = value = None
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            # Blank line ends a record
+            if record is not None:
+                if tag:
+                    _apply_field(record, tag, value)
+                if record["pmid"]:
+                    yield record
+            record, tag, value = None, None, None
+            continue
+
+        if len(line) >= 6 and line[4:6] == "- " and line[:4].strip():
+            if record is None:
+                record = _new_record()
+            elif tag:
+                _apply_field(record, tag, value)
+            tag, value = line[:4].strip(), line[6:].strip()
+        elif tag and line.startswith("      "):
+            value += " " + line.strip()
+
+    if record is not None:
+        if tag:
+            _apply_field(record, tag, value)
+        if record["pmid"]:
+            yield record
+
+
+def iter_pubmed_xml(stream):
+    """
+    Parses PubMed XML (efetch retmode=xml, or a baseline .xml file object) with iterparse,
+    clearing each <PubmedArticle> once it has been yielded. Yields the same dicts as
+    `iter_medline_records`.
+    """
+    for _, elem in ET.iterparse(stream, events=("end",)):
+        if elem.tag != "PubmedArticle":
+            continue
+        citation = elem.find("MedlineCitation")
+        record = _new_record()
+        if citation is not None:
+            record["pmid"] = (citation.findtext("PMID") or "").strip()
+            article = citation.find("Article")
+            if article is not None:
+                title = article.find("ArticleTitle")
+                record["title"] = "".join(title.itertext()).strip() if title is not None else ""
+                record["abstract"] = " ".join(
+                    "".join(part.itertext()).strip() for part in article.findall("Abstract/AbstractText")
+                )
+                record["journal"] = (
+                    article.findtext("Journal/ISOAbbreviation") or article.findtext("Journal/Title") or ""
+                ).strip()
+                year = article.findtext("Journal/JournalIssue/PubDate/Year") or \
+                    article.findtext("Journal/JournalIssue/PubDate/MedlineDate") or ""
+                match = _YEAR.search(year)
+                record["year"] = int(match.group(1)) if match else None
+            record["mesh_terms"] = [
+                (d.text or "").strip() for d in citation.findall("MeshHeadingList/MeshHeading/DescriptorName")
+            ]
+        if record["pmid"]:
+            yield record
+        elem.clear()
@@ -0,0 +1,247 @@
+import os
+import time
+import logging
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from agents.literature_agent import analyze_literature, cached_literature
+from agents.patent_agent import analyze_patents
+from agents.clinical_trial_agent import evaluate_clinical_trials, cached_evaluation
+from agents.decision_agent import make_decision
+from agents import result_store, knowledge_graph
+from agents.config import worker_pool_settings, swarm_deadline
+from agents import telemetry, budget
+
+log = logging.getLogger(__name__)
+
+# Share of a swarm's latency budget each agent may use. The agents run in parallel;
+# whatever the slowest one leaves is the decision agent's (LLM narrative) budget.
+# With the default 40 s budget: literature 20 s, patents 10 s, clinical 10 s.
+AGENT_SHARES = {
+    "lit": 0.5,
+    "pat": 0.25,
+    "clin": 0.25,
+}
+
+# Most of a swarm's budget spent waiting for another worker already running the same
+# key; the rest is left to run the swarm here if that worker does not finish in time.
+LOCK_WAIT_SHARE = 0.5
+
+# Shared pool: a timed-out agent keeps its thread until the call returns,
+# so we don't want a `with ThreadPoolExecutor()` block waiting on it.
+# Its size caps concurrent agent calls (and so outbound connections) process-wide.
+_executor = ThreadPoolExecutor(max_workers=worker_pool_settings()["agent_workers"], thread_name_prefix="swarm")
+
+
+def _placeholder_result(key, note):
+    """
+    Stand-in for an agent with no answer at all, shaped like the real one. Its data
+    is marked `degraded` with `note` as the reason, so the decision is flagged partial.
+    """
+    if key == "lit":
+        return {
+            "agent_name": "Literature Mining Agent (Timed Out)",
+            "status": "Timeout",
+            "data": {
+                "relevance_score": 0.1,
+                "publication_count": 0,
+                "key_insights": [note],
+                "top_journals": ["Unavailable"],
+                "sentiment": "Neutral",
+                "degraded": True,
+                "degraded_reason": note
+            }
+        }
+    if key == "pat":
+        return {
+            "agent_name": "Patent Intelligence Agent (Timed Out)",
+            "status": "Timeout",
+            "data": {
+                "patent_risk": "Medium",
+                "primary_expiry": "Unknown",
+                "similar_patents_found": 0,
+                "analysis_context": note,
+                "litigation_history": "Unknown",
+                "degraded": True,
+                "degraded_reason": note
+            }
+        }
+    return {
+        "agent_name": "Clinical Trial Evaluation Agent (Timed Out)",
+        "status": "Timeout",
+        "data": {
+            "clinical_risk_score": 50,
+            "safety_profile_score": 50,
+            "max_phase_reached": "Unknown",
+            "common_adverse_events": [note],
+            "total_patients_studied": 0,
+            "degraded": True,
+            "degraded_reason": note
+        }
+    }
+
+
+def _fallback_result(key, drug_name, therapeutic_area, note):
+    """
+    Result for an agent that missed its budget or failed: whatever its cache already
+    holds for the inputs (see `cached_literature` / `cached_evaluation`), else a placeholder.
+    """
+    try:
+        if key == "lit":
+            cached = cached_literature(drug_name, therapeutic_area, note)
+        elif key == "clin":
+            cached = cached_evaluation(drug_name, note)
+        else:
+            cached = None
+    except Exception as e:
+        log.warning("Swarm fallback cache error (%s): %s", key, e)
+        cached = None
+    if cached is not None:
+        telemetry.inc("bioforge_agent_fallback_total", agent=key, source="cache")
+        return cached
+    telemetry.inc("bioforge_agent_fallback_total", agent=key, source="placeholder")
+    return _placeholder_result(key, note + " No cached result; this input was not assessed.")
+
+
+def agent_budgets(deadline=None, deadlines=None):
+    """
+    Seconds each agent may run: its AGENT_SHARES of `deadline` (default
+    BIOFORGE_SWARM_DEADLINE), overridden per agent by `deadlines`.
+    """
+    total = swarm_deadline() if deadline is None else deadline
+    limits = {key: share * total for key, share in AGENT_SHARES.items()}
+    if deadlines:
+        limits.update(deadlines)
+    return limits
+
+
+def run_agents(drug_name, therapeutic_area, on_agent_done=None, deadlines=None, deadline=None):
+    """
+    Runs the literature, patent and clinical agents in parallel, each within its
+    `agent_budgets(deadline, deadlines)` share. Outbound calls inside an agent get
+    timeouts that fit what is left of it, and slow ones are hedged (see `http_client`).
+    An agent that misses its budget or fails is replaced by its cached answer, if
+    any, or a placeholder; either way its data is marked `degraded`.
+    `on_agent_done(key, result)` is called from the calling thread as each agent
+    finishes (or times out), so it is safe to touch Streamlit placeholders from it.
+    Returns a dict keyed by "lit", "pat" and "clin".
+    """
+    limits = agent_budgets(deadline, deadlines)
+
+    started = time.monotonic()
+    calls = {
+        "lit": (analyze_literature, drug_name, therapeutic_area),
+        "pat": (analyze_patents, drug_name),
+        "clin": (evaluate_clinical_trials, drug_name, therapeutic_area),
+    }
+    futures = {
+        _executor.submit(telemetry.run_in_context(budget.within(started + limits[key], fn)), *args): key
+        for key, (fn, *args) in calls.items()
+    }
+
+    results = {}
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        # Expire anything past its own deadline
+        for fut in list(pending):
+            key = futures[fut]
+            if now - started >= limits[key]:
+                fut.cancel()
+                pending.discard(fut)
+                results[key] = _fallback_result(key, drug_name, therapeutic_area,
+                                                f"Agent did not answer within {limits[key]:g}s.")
+                telemetry.inc("bioforge_agent_deadline_missed_total", agent=key)
+                if on_agent_done:
+                    on_agent_done(key, results[key])
+        if not pending:
+            break
+
+        next_deadline = min(started + limits[futures[f]] for f in pending)
+        done, pending = wait(pending, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+        for fut in done:
+            key = futures[fut]
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                log.warning("Swarm Error (%s): %s", key, e)
+                results[key] = _fallback_result(key, drug_name, therapeutic_area, f"Agent failed ({e}).")
+            if on_agent_done:
+                on_agent_done(key, results[key])
+
+    return results
+
+
+def run_swarm(drug_name, therapeutic_area, api_key=None, on_agent_done=None, deadlines=None, on_narrative=None,
+              force_refresh=False, deadline=None):
+    """
+    Full swarm run: parallel agents, then the decision agent once the last input is in.
+    `on_narrative` is passed to make_decision to stream the executive summary.
+    Fresh runs are also folded into the shared knowledge graph.
+
+    `deadline` is the end-to-end latency budget in seconds (default
+    BIOFORGE_SWARM_DEADLINE), split between the agents as in `run_agents`; the LLM
+    narrative gets what they leave. If an agent misses its share the decision is
+    marked `partial` (see `make_decision`). Partial results, and LLM runs whose
+    narrative fell back to the heuristic, are not stored.
+
+    Finished runs are shared through `result_store` (across workers with a shared
+    cache backend); a warm key is served without running any agent unless
+    `force_refresh` is set. While one worker runs a key, others asking for it wait
+    (up to LOCK_WAIT_SHARE of the budget) and are then served its stored result. If
+    it is not done by then, an expired stored result is served marked `partial`, or
+    the swarm runs here anyway. The result has `from_cache` and `completed_at`
+    (epoch seconds) so the UI can show freshness.
+    """
+    with_llm = bool(api_key or os.getenv("GEMINI_API_KEY"))
+    total = swarm_deadline() if deadline is None else deadline
+
+    def cached(allow_stale=False):
+        hit = result_store.get_result(drug_name, therapeutic_area, with_llm, allow_stale=allow_stale)
+        if hit is None:
+            return None
+        results = hit[0]
+        results["from_cache"] = True
+        if allow_stale:
+            reason = "Another worker is still running this analysis; showing an expired stored result."
+            results["decision"].update(partial=True, degraded_inputs={"result": reason})
+        if on_agent_done:
+            for key in ("lit", "pat", "clin"):
+                on_agent_done(key, results[key])
+        return results
+
+    if not force_refresh:
+        results = cached()
+        if results is not None:
+            return results
+
+    with budget.limit(total), contextlib.ExitStack() as held:
+        try:
+            with budget.limit(total * LOCK_WAIT_SHARE):
+                held.enter_context(result_store.lock(drug_name, therapeutic_area, with_llm))
+        except budget.DeadlineExceeded as e:
+            log.warning("Swarm lock wait (%s / %s): %s", drug_name, therapeutic_area, e)
+            telemetry.inc("bioforge_swarm_lock_timeouts_total")
+            if not force_refresh:
+                results = cached() or cached(allow_stale=True)
+                if results is not None:
+                    return results
+
+        if not force_refresh:
+            results = cached()
+            if results is not None:
+                return results
+
+        results = run_agents(drug_name, therapeutic_area, on_agent_done=on_agent_done, deadlines=deadlines,
+                             deadline=total)
+        results["decision"] = make_decision(
+            results["lit"]["data"], results["pat"]["data"], results["clin"]["data"], api_key=api_key,
+            on_narrative=on_narrative, drug_name=drug_name, therapeutic_area=therapeutic_area
+        )
+        results["completed_at"] = time.time()
+        results["from_cache"] = False
+        knowledge_graph.record_swarm(drug_name, therapeutic_area, results)
+        decision = results["decision"]
+        if not decision["partial"] and (not with_llm or decision["narrative_source"] == "llm"):
+            result_store.put_result(drug_name, therapeutic_area, with_llm, results)
+    return results
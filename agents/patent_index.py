@@ -0,0 +1,286 @@
+"""
+Local patent and exclusivity index, bulk-loaded from the FDA Orange Book data files.
+
+    python -m agents.patent_index load ./orange_book --litigation litigation.csv
+    python -m agents.patent_index lookup Metformin Sildenafil
+
+`load` reads `products.txt`, `patent.txt` and `exclusivity.txt` (tilde-delimited,
+as published by the FDA) and rolls them up into one row per active ingredient,
+so a lookup is a single primary-key search of a SQLite B-tree. The optional
+litigation CSV has `ingredient` and `status` (None/Settled/Ongoing) columns.
+A refresh builds a new file and swaps it in atomically; open indexes pick it up
+on their next lookup.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+from agents.config import patent_index_path
+from agents.drug_names import drug_key
+
+LITIGATION_RANK = {"None": 0, "Settled": 1, "Ongoing": 2}
+
+_SCHEMA = (
+    "CREATE TABLE ingredients ("
+    " ingredient TEXT PRIMARY KEY, display_name TEXT NOT NULL, patent_count INTEGER NOT NULL,"
+    " substance_expiry TEXT, last_patent_expiry TEXT, exclusivity_expiry TEXT,"
+    " litigation TEXT NOT NULL, trade_names TEXT NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE names (name TEXT PRIMARY KEY, ingredient TEXT NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID",
+)
+
+
+def ingredient_key(name):
+    """
+    Index key for a drug, brand or ingredient name (see `agents.drug_names`).
+    """
+    return drug_key(name)
+
+
+def _parse_date(text):
+    """
+    Orange Book dates ("Mar 22, 2027") or ISO dates -> "YYYY-MM-DD", or None.
+    """
+    text = (text or "").strip()
+    for fmt in ("%b %d, %Y", "%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _read_tilde(path):
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        yield from csv.DictReader(f, delimiter="~")
+
+
+def _product_key(row):
+    return row.get("Appl_Type", "").strip(), row.get("Appl_No", "").strip(), row.get("Product_No", "").strip()
+
+
+def _later(current, candidate):
+    if candidate is None:
+        return current
+    return candidate if current is None or candidate > current else current
+
+
+def load_orange_book(source_dir, index_path=None, litigation_path=None):
+    """
+    Builds the index from an Orange Book directory and atomically replaces `index_path`.
+    Returns a summary dict (ingredients, names, patents, seconds).
+    """
+    started = time.perf_counter()
+    index_path = index_path or patent_index_path()
+
+    # (appl_type, appl_no, product_no) -> ingredient key
+    products = {}
+    summary = {}
+    for row in _read_tilde(os.path.join(source_dir, "products.txt")):
+        display = " ".join(row.get("Ingredient", "").split())
+        key = ingredient_key(display)
+        if not key:
+            continue
+        products[_product_key(row)] = key
+        entry = summary.setdefault(key, {
+            "display_name": display.title(), "patents": set(), "substance_expiry": None,
+            "last_patent_expiry": None, "exclusivity_expiry": None, "litigation": "None",
+            "trade_names": set(), "names": set(),
+        })
+        trade = " ".join(row.get("Trade_Name", "").split())
+        if trade:
+            entry["trade_names"].add(trade.title())
+            entry["names"].add(ingredient_key(trade))
+
+    patent_rows = 0
+    for row in _read_tilde(os.path.join(source_dir, "patent.txt")):
+        key = products.get(_product_key(row))
+        expiry = _parse_date(row.get("Patent_Expire_Date_Text"))
+        if key is None or expiry is None or row.get("Delist_Flag", "").strip().upper() == "Y":
+            continue
+        patent_rows += 1
+        entry = summary[key]
+        entry["patents"].add(row.get("Patent_No", "").strip())
+        entry["last_patent_expiry"] = _later(entry["last_patent_expiry"], expiry)
+        if row.get("Drug_Substance_Flag", "").strip().upper() == "Y":
+            entry["substance_expiry"] = _later(entry["substance_expiry"], expiry)
+
+    exclusivity_path = os.path.join(source_dir, "exclusivity.txt")
+    if os.path.exists(exclusivity_path):
+        for row in _read_tilde(exclusivity_path):
+            key = products.get(_product_key(row))
+            if key is not None:
+                summary[key]["exclusivity_expiry"] = _later(
+                    summary[key]["exclusivity_expiry"], _parse_date(row.get("Exclusivity_Date")))
+
+    if litigation_path:
+        with open(litigation_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                entry = summary.get(ingredient_key(row.get("ingredient") or row.get("drug") or ""))
+                status = (row.get("status") or "").strip().title()
+                if entry is not None and LITIGATION_RANK.get(status, -1) > LITIGATION_RANK[entry["litigation"]]:
+                    entry["litigation"] = status
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    if os.path.dirname(index_path):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.executemany(
+            "INSERT INTO ingredients VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((key, e["display_name"], len(e["patents"]), e["substance_expiry"], e["last_patent_expiry"],
+              e["exclusivity_expiry"], e["litigation"], json.dumps(sorted(e["trade_names"])))
+             for key, e in summary.items()),
+        )
+        # Ingredient names win over brand names; a brand shared by several ingredients keeps the first
+        conn.executemany("INSERT INTO names VALUES (?, ?)", ((key, key) for key in summary))
+        conn.executemany(
+            "INSERT OR IGNORE INTO names VALUES (?, ?)",
+            ((name, key) for key, e in summary.items() for name in e["names"]),
+        )
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("loaded_at", datetime.now().isoformat(timespec="seconds")),
+            ("source", os.path.abspath(source_dir)),
+        ])
+        conn.commit()
+        names = conn.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+
+    return {
+        "ingredients": len(summary),
+        "names": names,
+        "patents": patent_rows,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+class PatentIndex:
+    """
+    Read-only view of a built index. Safe to share between threads; reopens
+    itself when the file is replaced by a refresh.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._mtime = None
+        self.loaded_at = None
+
+    def _connection(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if self._conn is None or mtime != self._mtime:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._mtime = mtime
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'loaded_at'").fetchone()
+            self.loaded_at = row[0] if row else None
+        return self._conn
+
+    def lookup(self, name):
+        """
+        Returns the ingredient's patent/exclusivity record as a dict, or None if not listed.
+        """
+        return self.lookup_many([name]).get(name)
+
+    def lookup_many(self, names, chunk_size=500):
+        """
+        Resolves many names in a few queries. Returns {name: record} for the ones found.
+        """
+        keys = {}
+        for name in names:
+            keys.setdefault(ingredient_key(name), []).append(name)
+        keys.pop("", None)
+
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            key_list = list(keys)
+            for i in range(0, len(key_list), chunk_size):
+                chunk = key_list[i:i + chunk_size]
+                rows = conn.execute(
+                    "SELECT n.name, i.* FROM names n JOIN ingredients i ON i.ingredient = n.ingredient"
+                    f" WHERE n.name IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for row in rows:
+                    record = {
+                        "ingredient": row[2],
+                        "patent_count": row[3],
+                        "substance_expiry": row[4],
+                        "last_patent_expiry": row[5],
+                        "exclusivity_expiry": row[6],
+                        "litigation": row[7],
+                        "trade_names": json.loads(row[8]),
+                    }
+                    for name in keys[row[0]]:
+                        found[name] = record
+        return found
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    The process-wide index at `patent_index_path()`, or None if it has not been built.
+    """
+    global _index
+    path = patent_index_path()
+    with _index_lock:
+        if _index is not None and _index.path != path:
+            _index.close()
+            _index = None
+        if _index is None:
+            if not os.path.exists(path):
+                return None
+            _index = PatentIndex(path)
+        return _index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the local Orange Book patent index.")
+    parser.add_argument("--index", default=None, help="Index file (default: BIOFORGE_PATENT_INDEX or the cache dir)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("load", help="Bulk-load products.txt, patent.txt and exclusivity.txt")
+    load.add_argument("source_dir")
+    load.add_argument("--litigation", default=None, help="CSV with ingredient,status columns")
+    lookup = commands.add_parser("lookup", help="Print the index records for drug names")
+    lookup.add_argument("names", nargs="+")
+    args = parser.parse_args(argv)
+
+    path = args.index or patent_index_path()
+    if args.command == "load":
+        summary = load_orange_book(args.source_dir, path, litigation_path=args.litigation)
+        print(f"[patent_index] {summary['ingredients']} ingredients, {summary['names']} names, "
+              f"{summary['patents']} patent rows loaded into {path} in {summary['seconds']}s", file=sys.stderr)
+        return
+
+    index = PatentIndex(path)
+    records = index.lookup_many(args.names)
+    for name in args.names:
+        print(json.dumps({"name": name, "record": records.get(name)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import copy
+import time
+import threading
+
+from agents import literature_agent, patent_agent, clinical_trial_agent, decision_agent
+from agents.config import result_store_settings
+from agents.cache import open_cache, normalize_key
+from agents.drug_names import drug_key
+from agents import patent_index
+
+# Store of whole swarm results, shared by every Streamlit session in the process,
+# and by every worker process when the cache backend is shared (see `open_cache`).
+
+AGENT_VERSIONS = (
+    ("literature", literature_agent.AGENT_VERSION),
+    ("patent", patent_agent.AGENT_VERSION),
+    ("clinical", clinical_trial_agent.AGENT_VERSION),
+    ("decision", decision_agent.AGENT_VERSION),
+)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _results():
+    global _store
+    with _store_lock:
+        if _store is None:
+            settings = result_store_settings()
+            _store = open_cache("results", ttl=settings["ttl"], max_entries=settings["max_entries"],
+                                max_bytes=settings["max_bytes"])
+        return _store
+
+
+def result_key(drug_name, therapeutic_area, with_llm):
+    versions = ",".join(f"{name}={version}" for name, version in AGENT_VERSIONS)
+    # Building or refreshing the patent index changes the key, so runs stored without one
+    # (patent risk not assessed) or against older data are not served afterwards
+    index = patent_index.get_index()
+    patents = index.loaded_at if index is not None else "none"
+    return f"{drug_key(drug_name)}|{normalize_key(therapeutic_area)}|llm={bool(with_llm)}|{versions}|patents={patents}"
+
+
+def get_result(drug_name, therapeutic_area, with_llm, allow_stale=False):
+    """
+    Returns (results, age_seconds) for a warm key, or None. With `allow_stale`, an
+    expired result the cache still holds counts too.
+    The results are a copy, so callers may keep them in session state.
+    """
+    hit = _results().get(result_key(drug_name, therapeutic_area, with_llm), allow_stale=allow_stale)
+    if hit is None:
+        return None
+    return copy.deepcopy(hit[0]), hit[1]
+
+
+def put_result(drug_name, therapeutic_area, with_llm, results):
+    """
+    Stores a finished swarm run. Runs with timed-out or simulated agents, or (for an
+    LLM run) a decision that fell back to the heuristic narrative, are not stored,
+    so a transient outage is never served back as a fresh answer. A patent agent
+    without an index (`NOT_ASSESSED`) is a stable answer and does not block storing.
+    """
+    agent_results = [results[k] for k in ("lit", "pat", "clin") if k in results]
+    if any(r.get("status") not in ("Success", patent_agent.NOT_ASSESSED) for r in agent_results):
+        return False
+    if with_llm and results.get("decision", {}).get("narrative_source") != "llm":
+        return False
+    stored = dict(results, completed_at=results.get("completed_at", time.time()))
+    _results().set(result_key(drug_name, therapeutic_area, with_llm), copy.deepcopy(stored))
+    return True
+
+
+def lock(drug_name, therapeutic_area, with_llm):
+    """
+    Held while a fresh run for this key is computed, so a worker arriving meanwhile
+    waits and then reads the stored result instead of running the swarm again.
+    """
+    return _results().lock(result_key(drug_name, therapeutic_area, with_llm))
+
+
+def invalidate(drug_name, therapeutic_area, with_llm):
+    _results().delete(result_key(drug_name, therapeutic_area, with_llm))
+
+
+def clear():
+    _results().clear()
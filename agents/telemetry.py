@@ -0,0 +1,227 @@
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+# Spans and Prometheus-style metrics for agent runs and their outbound calls.
+# Every span feeds two metrics:
+#   bioforge_span_total{span, status, cache, ...}   counter
+#   bioforge_span_seconds{span, ...}                histogram
+# and is kept in a short in-memory ring buffer for the diagnostics panel.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_SPANS = 2000
+
+_lock = threading.Lock()
+_counters = defaultdict(float)                 # (name, labels) -> value
+_histograms = {}                               # (name, labels) -> [bucket counts..., sum, count]
+_recent = deque(maxlen=RECENT_SPANS)
+
+_trace_id = contextvars.ContextVar("bioforge_trace_id", default=None)
+_parent = contextvars.ContextVar("bioforge_parent_span", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def inc(name, amount=1.0, **labels):
+    with _lock:
+        _counters[(name, _label_key(labels))] += amount
+
+
+def observe(name, value, **labels):
+    key = (name, _label_key(labels))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+class Span:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.status = "ok"
+        self.cache = None
+        self.id = uuid.uuid4().hex[:16]
+
+    def set(self, status=None, cache=None, **labels):
+        """
+        Annotate the span: status ("ok", "error", "fallback", "simulated", "timeout", ...),
+        cache ("hit"/"miss"), or extra labels.
+        """
+        if status is not None:
+            self.status = status
+        if cache is not None:
+            self.cache = cache
+        self.labels.update(labels)
+
+
+def _finish(name, labels, status, cache, elapsed, span_id, parent):
+    inc("bioforge_span_total", span=name, status=status, cache=cache, **labels)
+    observe("bioforge_span_seconds", elapsed, span=name, **labels)
+    with _lock:
+        _recent.append({
+            "trace_id": _trace_id.get(), "span_id": span_id, "parent_id": parent,
+            "span": name, "labels": dict(labels), "status": status, "cache": cache,
+            "duration_ms": round(elapsed * 1000, 2), "ended_at": time.time(),
+        })
+
+
+def record_span(name, seconds, status="ok", cache=None, **labels):
+    """
+    Records an already-timed span, for code (like generators) that can't sit inside `span()`.
+    """
+    _finish(name, labels, status, cache, seconds, uuid.uuid4().hex[:16], _parent.get())
+
+
+@contextmanager
+def span(name, **labels):
+    """
+    Times a block as a span. Spans opened in the same context share a trace id;
+    use `run_in_context` to carry it into worker threads.
+    """
+    s = Span(name, labels)
+    trace_token = None
+    if _trace_id.get() is None:
+        trace_token = _trace_id.set(uuid.uuid4().hex[:16])
+    parent = _parent.get()
+    parent_token = _parent.set(s.id)
+    started = time.perf_counter()
+    try:
+        yield s
+    except BaseException:
+        s.status = "error"
+        raise
+    finally:
+        _parent.reset(parent_token)
+        _finish(name, s.labels, s.status, s.cache, time.perf_counter() - started, s.id, parent)
+        if trace_token is not None:
+            _trace_id.reset(trace_token)
+
+
+def run_in_context(fn):
+    """
+    Wraps `fn` so it runs with the caller's trace context, e.g.
+    `executor.submit(run_in_context(fn), *args)`.
+    """
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs)
+
+
+def recent_spans(limit=200):
+    with _lock:
+        return list(_recent)[-limit:]
+
+
+def span_summary():
+    """
+    Per span name (plus the `agent`/`service` label): count, error/fallback count,
+    cache hits, and p50/p95/max latency over the recent ring buffer.
+    """
+    groups = defaultdict(list)
+    for rec in recent_spans(RECENT_SPANS):
+        label = rec["labels"].get("agent") or rec["labels"].get("service") or ""
+        groups[(rec["span"], label)].append(rec)
+
+    rows = []
+    for (name, label), recs in sorted(groups.items()):
+        durations = sorted(r["duration_ms"] for r in recs)
+        rows.append({
+            "span": name,
+            "target": label,
+            "count": len(recs),
+            "not_ok": sum(1 for r in recs if r["status"] != "ok"),
+            "cache_hits": sum(1 for r in recs if r["cache"] == "hit"),
+            "p50_ms": durations[len(durations) // 2],
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max_ms": durations[-1],
+        })
+    return rows
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels:
+        v = v.replace("\\", "\\\\").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render_prometheus():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    lines = []
+    for name in sorted({n for n, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for name in sorted({n for n, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (n, labels), h in sorted(histograms.items()):
+            if n != name:
+                continue
+            for bound, count in zip(BUCKETS, h):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {h[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {h[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _recent.clear()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """
+    Serves /metrics for a Prometheus scraper from a daemon thread (once per process).
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = _serve_metrics(port, host)
+        return _server
+
+
+def _serve_metrics(port, host):
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="bioforge-metrics").start()
+    return server
@@ -1,25 +1,20 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 import time
 
 # Import Agents
-from agents.literature_agent import analyze_literature
-from agents.patent_agent import analyze_patents
-from agents.clinical_trial_agent import evaluate_clinical_trials
-from agents.decision_agent import make_decision
+from agents import jobs
+from agents import llm_client
+from agents import http_client, telemetry
+from agents import drug_names, evidence_matrix, patent_agent
+from agents.config import metrics_port, swarm_deadline
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
+if metrics_port():
+    telemetry.start_metrics_server(metrics_port())
 
-# -----------------------------------------------------------------------------
-# 1. Page Config & Styling
-# -----------------------------------------------------------------------------
-from streamlit_agraph import agraph, Node, Edge, Config
 
 # -----------------------------------------------------------------------------
 # 1. Page Config & Styling
@@ -98,13 +93,22 @@ with st.sidebar:
     st.markdown("### Agentic Drug Repurposing")
     st.divider()
     
-    therapeutic_area = st.selectbox(
-        "Target Therapeutic Area",
-        ["Oncology - Solid Tumors", "Neurodegenerative Diseases", "Rare Genetic Disorders", "Cardiovascular", "Infectious Diseases"]
-    )
+    therapeutic_area = st.selectbox("Target Therapeutic Area", evidence_matrix.THERAPEUTIC_AREAS)
     
     drug_name = st.text_input("Candidate Drug Name", value="Metformin")
+    resolved = drug_names.canonical_name(drug_name)
+    suggestions = [s for s in drug_names.complete(drug_name, limit=5) if s != resolved]
+    if drug_name.strip() and resolved.lower() != drug_name.strip().lower():
+        st.caption(f"Resolved to ingredient **{resolved}**")
+    if suggestions:
+        st.caption("Suggestions: " + ", ".join(suggestions))
     
+    matrix = evidence_matrix.get_matrix()
+    if matrix is not None:
+        with st.expander("🧮 Library screen"):
+            st.caption(f"Top candidates for {therapeutic_area} from the precomputed evidence matrix")
+            st.dataframe(matrix.top_drugs(therapeutic_area, 10), hide_index=True, use_container_width=True)
+
     # API Key Input (Optional override)
     with st.expander("⚙️ Advanced Settings"):
         gemini_key = st.text_input("Gemini API Key (Optional)", type="password", help="Leave empty to use the system key from .env")
@@ -113,8 +117,24 @@ with st.sidebar:
     st.markdown("---")
     st.info("💡 **Tip**: Try 'Metformin' for Oncology or 'Sildenafil' for Cardiovascular.")
     
+    force_refresh = st.checkbox("Force refresh", value=False, help="Ignore results cached from earlier runs and re-run every agent")
+    time_budget = st.slider("Time budget (s)", 5, 120, int(swarm_deadline()),
+                            help="End-to-end deadline for the run. Agents that miss their share are reported from cache or left out, and the result is marked partial.")
     run_btn = st.button("🚀 IGNITE AGENT SWARM")
 
+    # Built only on request and not on every 0.4 s poll while a run is in progress
+    if st.toggle("📈 Diagnostics"):
+        if st.session_state.get("job_id"):
+            st.caption("Paused while a run is in progress.")
+        else:
+            spans = telemetry.span_summary()
+            if spans:
+                st.dataframe(spans, hide_index=True, use_container_width=True)
+            else:
+                st.caption("No spans recorded yet.")
+            st.json({"http": http_client.timing_stats(), "llm": llm_client.llm_stats()["totals"]}, expanded=False)
+            st.code(telemetry.render_prometheus(), language="text")
+
 # Initialize Session State
 if "analysis_complete" not in st.session_state:
     st.session_state.analysis_complete = False
@@ -122,59 +142,88 @@ if "analysis_results" not in st.session_state:
     st.session_state.analysis_results = {}
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
 
 # -----------------------------------------------------------------------------
 # 3. Main Analysis Flow
 # -----------------------------------------------------------------------------
 if run_btn:
-    # Reset state on new run
+    # Reset state on new run; the swarm itself runs on a background worker
     st.session_state.chat_history = [] 
+    st.session_state.analysis_complete = False
+    st.session_state.job_id = jobs.submit(drug_name, therapeutic_area, api_key=gemini_key, force_refresh=force_refresh,
+                                          deadline=time_budget)
+
+active_job = jobs.get_job(st.session_state.job_id) if st.session_state.job_id else None
+
+if active_job is not None and jobs.is_finished(active_job):
+    st.session_state.job_id = None
+    if active_job["state"] == "done":
+        swarm = active_job["result"]
+        # Store in Session State
+        st.session_state.analysis_results = {
+            "lit": swarm["lit"],
+            "pat": swarm["pat"],
+            "clin": swarm["clin"],
+            "decision": swarm["decision"],
+            "drug": active_job["drug"],
+            "area": active_job["area"],
+            "from_cache": swarm["from_cache"],
+            "completed_at": swarm["completed_at"]
+        }
+        st.session_state.analysis_complete = True
+    else:
+        st.session_state.job_error = active_job["error"]
+    st.rerun() # Rerun to refresh the layout for Tabs
+
+if active_job is not None:
+    st.markdown(f"## 🔍 Analyzing **{'Hidden Candidate' if not active_job['drug'] else active_job['drug']}** for **{active_job['area']}**")
     
-    st.markdown(f"## 🔍 Analyzing **{'Hidden Candidate' if not drug_name else drug_name}** for **{therapeutic_area}**")
-    
-    # Grid for real-time agent feedback
+    # Grid for real-time agent feedback, filled from the job's progress on every poll
     col1, col2, col3 = st.columns(3)
-    
-    lit_box = col1.empty()
-    pat_box = col2.empty()
-    clin_box = col3.empty()
-    
-    # Stage 1: Literature
-    with lit_box.container():
-        st.markdown("<div class='agent-box'><h4>📚 Literature Agent</h4><p>Scanning PubMed via BioPython...</p></div>", unsafe_allow_html=True)
-    lit_results = analyze_literature(drug_name, therapeutic_area)
-    with lit_box.container():
-        st.markdown(f"<div class='agent-box'><h4>✅ Literature Agent</h4><p>Found <b>{lit_results['data']['publication_count']}</b> papers.</p></div>", unsafe_allow_html=True)
-    
-    # Stage 2: Patent
-    with pat_box.container():
-        st.markdown("<div class='agent-box'><h4>⚖️ Patent Agent</h4><p>Checking legal risks...</p></div>", unsafe_allow_html=True)
-    pat_results = analyze_patents(drug_name)
-    risk_color = "#ff4b4b" if pat_results['data']['patent_risk'] == "High" else "#21c354"
-    with pat_box.container():
-        st.markdown(f"<div class='agent-box' style='border-left: 5px solid {risk_color};'><h4>✅ Patent Agent</h4><p>Risk: <b style='color:{risk_color}'>{pat_results['data']['patent_risk']}</b></p></div>", unsafe_allow_html=True)
-
-    # Stage 3: Clinical
-    with clin_box.container():
-        st.markdown("<div class='agent-box'><h4>🏥 Clinical Agent</h4><p>Querying OpenFDA...</p></div>", unsafe_allow_html=True)
-    clin_results = evaluate_clinical_trials(drug_name, therapeutic_area)
-    with clin_box.container():
-        st.markdown(f"<div class='agent-box'><h4>✅ Clinical Agent</h4><p>Safety Score: <b>{clin_results['data']['safety_profile_score']}/100</b></p></div>", unsafe_allow_html=True)
-
-    # Decision (Pass API Key)
-    decision = make_decision(lit_results['data'], pat_results['data'], clin_results['data'], api_key=gemini_key)
-    
-    # Store in Session State
-    st.session_state.analysis_results = {
-        "lit": lit_results,
-        "pat": pat_results,
-        "clin": clin_results,
-        "decision": decision,
-        "drug": drug_name,
-        "area": therapeutic_area
-    }
-    st.session_state.analysis_complete = True
-    st.rerun() # Rerun to refresh the layout for Tabs
+    agents_done = active_job["agents"]
+
+    def agent_box_html(key, result):
+        if result is None:
+            running = {
+                "lit": "<h4>📚 Literature Agent</h4><p>Scanning PubMed via BioPython...</p>",
+                "pat": "<h4>⚖️ Patent Agent</h4><p>Checking legal risks...</p>",
+                "clin": "<h4>🏥 Clinical Agent</h4><p>Querying OpenFDA...</p>",
+            }
+            return f"<div class='agent-box'>{running[key]}</div>"
+        data = result['data']
+        icon = "⏱️" if result['status'] == "Timeout" else "⚠️" if data.get('degraded') else "✅"
+        took = f"<br><small>{result['runtime_ms'] / 1000:.2f}s</small>" if 'runtime_ms' in result else ""
+        if key == "lit":
+            cached = f" <small>(cached, {data['cache_age_seconds'] // 60} min old)</small>" if data.get('cached') else ""
+            return f"<div class='agent-box'><h4>{icon} Literature Agent</h4><p>Found <b>{data['publication_count']}</b> papers.{cached}{took}</p></div>"
+        if key == "pat":
+            if result['status'] == patent_agent.NOT_ASSESSED:
+                return f"<div class='agent-box'><h4>➖ Patent Agent</h4><p>Risk: <b>not assessed</b> (no patent index){took}</p></div>"
+            risk_color = "#ff4b4b" if data['patent_risk'] == "High" else "#21c354"
+            return f"<div class='agent-box' style='border-left: 5px solid {risk_color};'><h4>{icon} Patent Agent</h4><p>Risk: <b style='color:{risk_color}'>{data['patent_risk']}</b>{took}</p></div>"
+        return f"<div class='agent-box'><h4>{icon} Clinical Agent</h4><p>Safety Score: <b>{data['safety_profile_score']}/100</b>{took}</p></div>"
+
+    col1.markdown(agent_box_html("lit", agents_done.get("lit")), unsafe_allow_html=True)
+    col2.markdown(agent_box_html("pat", agents_done.get("pat")), unsafe_allow_html=True)
+    col3.markdown(agent_box_html("clin", agents_done.get("clin")), unsafe_allow_html=True)
+
+    # Executive summary streams in here while the decision agent is writing it
+    narrative = active_job["narrative"]
+    if narrative["summary"]:
+        st.markdown("### 🧠 Decision Agent")
+        st.markdown(f"*{narrative['summary']}*")
+        for r in narrative["rationale"]:
+            st.write(f"- {r}")
+
+    # Poll: the job keeps running in the background even if this session reruns
+    time.sleep(0.4)
+    st.rerun()
+
+if st.session_state.get("job_error"):
+    st.error(f"Agent swarm failed: {st.session_state.job_error}")
+    st.session_state.job_error = None
 
 # -----------------------------------------------------------------------------
 # 4. Display Results (Tabs)
@@ -183,6 +232,12 @@ if st.session_state.analysis_complete:
     res = st.session_state.analysis_results
     
     st.markdown(f"## 🧬 Analysis Result: **{res['drug']}**")
+    age_min = int((time.time() - res['completed_at']) // 60)
+    freshness = "just now" if age_min < 1 else f"{age_min} min ago"
+    st.caption(f"{'♻️ Served from shared cache' if res['from_cache'] else '⚡ Fresh run'} · computed {freshness}. Tick *Force refresh* to re-run.")
+    if res['decision'].get('partial'):
+        st.warning("⚠️ **Partial result**: some agents missed the time budget or their source was unreachable.\n\n"
+                   + "\n".join(f"- **{name.title()}**: {reason}" for name, reason in res['decision']['degraded_inputs'].items()))
     
     tab1, tab2, tab3 = st.tabs(["📊 Executive Dashboard", "🕸️ Knowledge Graph", "💬 Swarm Chat"])
     
@@ -192,6 +247,7 @@ if st.session_state.analysis_complete:
         
         with c_left:
             st.subheader("Feasibility Score")
+            import plotly.graph_objects as go  # loaded on first results view, not at startup
             fig_gauge = go.Figure(go.Indicator(
                 mode = "gauge+number",
                 value = res['decision']['final_confidence_score'],
@@ -242,31 +298,59 @@ if st.session_state.analysis_complete:
             for r in res['decision']['rationale']:
                 st.write(f"- {r}")
 
+            clin_data = res['clin']['data']
+            if clin_data.get('adverse_events'):
+                with st.expander("🏥 Adverse-event profile (FAERS)"):
+                    st.caption(f"{clin_data['total_patients_studied']:,} reports, "
+                               f"{clin_data['serious_ratio']:.0%} serious, {clin_data['deaths_reported']:,} deaths")
+                    st.dataframe(clin_data['adverse_events'], hide_index=True, use_container_width=True)
+                    if clin_data.get('top_indications'):
+                        st.dataframe(clin_data['top_indications'], hide_index=True, use_container_width=True)
+
+            llm_totals = llm_client.llm_stats()["totals"]
+            if llm_totals["calls"]:
+                st.caption(f"Gemini time-to-first-token: {llm_totals['avg_ttft_ms']:.0f} ms (avg over recent calls)")
+
     # --- TAB 2: KNOWLEDGE GRAPH ---
     with tab2:
         st.subheader("Interactive 3D Knowledge Network")
-        
-        # Build Graph
+        from streamlit_agraph import agraph, Node, Edge, Config
+        from agents import knowledge_graph
+
+        graph = knowledge_graph.get_graph()
+        g_hops, g_max = st.columns(2)
+        hops = g_hops.slider("Hops from drug", 1, 3, 2)
+        max_nodes = g_max.slider("Max nodes", 20, 300, 100, step=20)
+
+        # Only a bounded neighbourhood of the drug is rendered, however large the graph gets
+        graph_nodes, graph_edges = graph.neighborhood(
+            knowledge_graph.node_id(knowledge_graph.DRUG, res['drug']), hops=hops, max_nodes=max_nodes
+        )
+        if not graph_nodes:
+            # Result was served from cache before the graph existed; fold it in now
+            knowledge_graph.record_swarm(res['drug'], res['area'], res)
+            graph_nodes, graph_edges = graph.neighborhood(
+                knowledge_graph.node_id(knowledge_graph.DRUG, res['drug']), hops=hops, max_nodes=max_nodes
+            )
+
+        node_style = {
+            knowledge_graph.DRUG: (25, "#00e0ff"),
+            knowledge_graph.DISEASE: (20, "#ff00e0"),
+            knowledge_graph.PAPER: (10, "#f1f1f1"),
+            knowledge_graph.JOURNAL: (12, "#eca400"),
+            knowledge_graph.ADVERSE_EVENT: (12, "#ff4b4b"),
+        }
         nodes = []
-        edges = []
-        
-        # Central Node
-        nodes.append(Node(id="DRUG", label=res['drug'], size=25, color="#00e0ff"))
-        nodes.append(Node(id="DISEASE", label=res['area'], size=20, color="#ff00e0"))
-        
-        edges.append(Edge(source="DRUG", target="DISEASE", label="Treats?"))
-        
-        # Literature Nodes
-        nodes.append(Node(id="LIT", label=f"Papers ({res['lit']['data']['publication_count']})", size=15, color="#f1f1f1"))
-        edges.append(Edge(source="DRUG", target="LIT", label="Mentions"))
-        
-        # Patent Node
-        nodes.append(Node(id="PAT", label="Patent Risk", size=15, color="#ff4b4b" if res['pat']['data']['patent_risk'] =="High" else "#21c354"))
-        edges.append(Edge(source="DRUG", target="PAT", label="Legal Status"))
-        
-        # Clinical Node
-        nodes.append(Node(id="CLIN", label=f"Safety ({res['clin']['data']['safety_profile_score']})", size=15, color="#eca400"))
-        edges.append(Edge(source="DRUG", target="CLIN", label="Profile"))
+        for node, attrs in graph_nodes:
+            size, color = node_style.get(attrs.get("type"), (10, "#888888"))
+            if attrs.get("type") == knowledge_graph.DRUG and attrs.get("patent_risk"):
+                color = "#ff4b4b" if attrs["patent_risk"] == "High" else color
+            nodes.append(Node(id=node, label=attrs.get("label", node)[:40], title=attrs.get("label", node),
+                              size=size, color=color))
+        edges = [Edge(source=u, target=v, label=attrs.get("relation", "")) for u, v, attrs in graph_edges]
+
+        stats = graph.stats()
+        st.caption(f"Showing {len(nodes)} of {stats['nodes']} nodes ({stats['edges']} edges across all analyses)")
         
         config = Config(width=700, height=500, directed=True, nodeHighlightBehavior=True, highlightColor="#F7A7A6", collapsible=False)
         
@@ -293,12 +377,8 @@ if st.session_state.analysis_complete:
             effective_key = gemini_key if gemini_key else system_key
 
 
-            if effective_key:
-                try:
-                    import google.generativeai as genai
-                    genai.configure(api_key=effective_key)
-                    model = genai.GenerativeModel('gemini-1.5-flash-001')
-                    
+            with st.chat_message("assistant"):
+                if effective_key:
                     # specific context for the bot
                     context_prompt = f"""
                     You are the BioForge AI Swarm Orchestrator. You have just analyzed a drug.
@@ -310,23 +390,23 @@ if st.session_state.analysis_complete:
                     - Literature: Found {res['lit']['data']['publication_count']} papers. Insight: {res['lit']['data']['key_insights'][0]}
                     - Patent Risk: {res['pat']['data']['patent_risk']}. Context: {res['pat']['data']['analysis_context']}
                     - Clinical Safety: Score {res['clin']['data']['safety_profile_score']}/100. Note: {res['clin']['data'].get('source', 'Mock data')}
+                    - Most reported adverse events: {', '.join(res['clin']['data'].get('common_adverse_events', []))}
                     
                     User Question: "{prompt}"
                     
                     Answer concisely as the AI Orchestrator. Be professional but helpful.
                     """
                     
-                    response_obj = model.generate_content(context_prompt)
-                    response = response_obj.text
-                    
-                except Exception as e:
-                    response = f"I am having trouble connecting to my cognitive brain (Gemini). Error: {e}"
-            else:
-                # Fallback to dumb logic if no key
-                response = "I am running in offline mode. Please add a Gemini Key to chat intelligently."
-            
-            with st.chat_message("assistant"):
-                st.markdown(response)
+                    # Render tokens as they arrive instead of waiting for the full reply
+                    try:
+                        response = st.write_stream(llm_client.stream(context_prompt, effective_key))
+                    except Exception as e:
+                        response = f"I am having trouble connecting to my cognitive brain (Gemini). Error: {e}"
+                        st.markdown(response)
+                else:
+                    # Fallback to dumb logic if no key
+                    response = "I am running in offline mode. Please add a Gemini Key to chat intelligently."
+                    st.markdown(response)
             st.session_state.chat_history.append({"role": "assistant", "content": response})
 
 else:
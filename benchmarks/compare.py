@@ -0,0 +1,87 @@
+"""
+Compares two benchmark result files and flags regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.2
+
+Latency metrics (`*_ms`) regress when they grow by more than the threshold;
+throughput metrics (`*_per_second`, `*_per_minute`) when they shrink by more
+than it. Exits with status 1 if anything regressed.
+"""
+import sys
+import json
+import argparse
+
+HIGHER_IS_BETTER = ("_per_second", "_per_minute")
+
+
+def _row_key(row):
+    return row["benchmark"], json.dumps(row["params"], sort_keys=True)
+
+
+def _flatten(metrics, prefix=""):
+    out = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            out.update(_flatten(value, f"{prefix}{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix + name] = value
+    return out
+
+
+def compare(baseline, candidate, threshold=0.2):
+    """
+    Returns a list of {benchmark, params, metric, baseline, candidate, change, regressed}
+    for every timing/throughput metric present in both reports.
+    """
+    before = {_row_key(r): _flatten(r["metrics"]) for r in baseline["results"]}
+    rows = []
+    for row in candidate["results"]:
+        old = before.get(_row_key(row))
+        if old is None:
+            continue
+        for metric, value in _flatten(row["metrics"]).items():
+            higher_better = metric.endswith(HIGHER_IS_BETTER)
+            if not (higher_better or metric.endswith("_ms")) or not old.get(metric):
+                continue
+            change = (value - old[metric]) / old[metric]
+            rows.append({
+                "benchmark": row["benchmark"],
+                "params": row["params"],
+                "metric": metric,
+                "baseline": old[metric],
+                "candidate": value,
+                "change": round(change, 4),
+                "regressed": change < -threshold if higher_better else change > threshold,
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change that counts as a regression")
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    rows = compare(baseline, candidate, args.threshold)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for r in rows:
+            flag = "REGRESSED" if r["regressed"] else ""
+            params = ",".join(f"{k}={v}" for k, v in r["params"].items())
+            print(f"{r['benchmark']:<12} {params:<60} {r['metric']:<22} "
+                  f"{r['baseline']:>12g} -> {r['candidate']:<12g} {r['change']:+.1%} {flag}")
+    regressions = sum(r["regressed"] for r in rows)
+    print(f"[bench] {len(rows)} metrics compared, {regressions} regressed", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,551 @@
+"""
+Offline benchmarks for the agent pipeline, against local Entrez/OpenFDA/Gemini stubs.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --latency 0.05 --error-rate 0.02 --quick
+
+Measures single-call latency (cold and warm cache) of each agent, concurrent
+throughput, batch throughput with and without bulk literature, decision
+scoring with and without the (fake) LLM, hedged requests and latency budgets,
+and load/query speed of the local patent and literature indexes.
+Results are written as JSON; compare two runs with
+`python -m benchmarks.compare old.json new.json`.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import (Faults, EntrezStub, OpenFDAStub, install_fake_gemini, write_orange_book,
+                              write_medline_baseline, write_faers_export, RedisStub)
+
+SCHEMA_VERSION = 1
+
+DRUGS = ["Metformin", "Aspirin", "Sildenafil", "Thalidomide", "Rapamycin", "Ibuprofen", "Statin",
+         "Propranolol", "Lithium", "Minocycline", "Itraconazole", "Disulfiram", "Valproate",
+         "Hydroxychloroquine", "Doxycycline", "Ketoconazole", "Losartan", "Nitroglycerin",
+         "Celecoxib", "Mebendazole"]
+AREAS = ["Oncology - Solid Tumors", "Neurodegenerative Diseases", "Rare Genetic Disorders",
+         "Cardiovascular", "Infectious Diseases"]
+
+
+def _pairs(n):
+    return [(DRUGS[i % len(DRUGS)], AREAS[(i // len(DRUGS)) % len(AREAS)]) for i in range(n)]
+
+
+def _summary(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Harness:
+    """
+    Owns the stub servers and points the agents at them. Environment is set
+    before any agent cache, rate limiter or session is created.
+    """
+
+    def __init__(self, faults, llm_faults, workdir):
+        self.entrez = EntrezStub(faults).start()
+        self.openfda = OpenFDAStub(faults, unknown_drugs=["Statin"]).start()
+        os.environ.update({
+            "NCBI_EUTILS_URL": self.entrez.eutils_url,
+            "OPENFDA_URL": self.openfda.url,
+            "BIOFORGE_CACHE_DIR": workdir,
+            "BIOFORGE_PATENT_INDEX": os.path.join(workdir, "patents.sqlite3"),
+            "BIOFORGE_SIMULATED_LATENCY": "0",
+            "BIOFORGE_NCBI_RPS": "10000",
+            "BIOFORGE_OPENFDA_RPS": "10000",
+            "BIOFORGE_HTTP_BACKOFF": "0.01",
+        })
+        os.environ.pop("NCBI_API_KEY", None)
+        self.gemini = install_fake_gemini(llm_faults)
+        from agents.patent_index import load_orange_book
+        write_orange_book(os.path.join(workdir, "orange_book"), DRUGS)
+        load_orange_book(os.path.join(workdir, "orange_book"))
+
+    def reset(self):
+        """
+        Cold start: empties every agent cache, LLM completions and HTTP/telemetry counters.
+        """
+        from agents import literature_agent, clinical_trial_agent, llm_client, result_store, http_client, telemetry
+        literature_agent._pubmed_cache().clear()
+        clinical_trial_agent._openfda_cache().clear()
+        result_store.clear()
+        llm_client.reset()
+        http_client.reset_stats()
+        telemetry.reset()
+        self.reset_counts()
+
+    def reset_counts(self):
+        self.entrez.reset_hits()
+        self.openfda.reset_hits()
+        self.gemini.calls = 0
+
+    def upstream_calls(self):
+        return {"entrez": sum(self.entrez.hits.values()), "openfda": sum(self.openfda.hits.values()),
+                "gemini": self.gemini.calls}
+
+    def close(self):
+        self.entrez.close()
+        self.openfda.close()
+        from agents import llm_client
+        llm_client.set_model_factory(None)
+
+
+def bench_single_run(h, repeat):
+    """
+    Per-agent latency, cold (empty caches) and warm (same inputs again).
+    """
+    from agents.literature_agent import analyze_literature
+    from agents.clinical_trial_agent import evaluate_clinical_trials
+    from agents.patent_agent import analyze_patents
+
+    agents = {
+        "analyze_literature": lambda d, a: analyze_literature(d, a),
+        "evaluate_clinical_trials": lambda d, a: evaluate_clinical_trials(d, a),
+        "analyze_patents": lambda d, a: analyze_patents(d),
+    }
+    rows = []
+    for name, call in agents.items():
+        cold, warm, statuses = [], [], {}
+        for drug, area in _pairs(repeat):
+            h.reset()
+            ms, result = _timed(call, drug, area)
+            cold.append(ms)
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+            warm.append(_timed(call, drug, area)[0])
+        rows.append({"benchmark": "single_run", "params": {"agent": name, "cache": "cold"},
+                     "metrics": dict(_summary(cold), statuses=statuses)})
+        rows.append({"benchmark": "single_run", "params": {"agent": name, "cache": "warm"},
+                     "metrics": _summary(warm)})
+    return rows
+
+
+def bench_concurrency(h, pairs, levels):
+    """
+    Literature + clinical calls for distinct pairs pushed through N threads: calls/s,
+    per-call latency, and upstream requests, cold then warm.
+    """
+    from agents.literature_agent import analyze_literature
+    from agents.clinical_trial_agent import evaluate_clinical_trials
+
+    def work(pair):
+        ms_lit = _timed(analyze_literature, *pair)[0]
+        ms_clin = _timed(evaluate_clinical_trials, *pair)[0]
+        return ms_lit, ms_clin
+
+    rows = []
+    for level in levels:
+        h.reset()
+        for cache in ("cold", "warm"):
+            h.reset_counts()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                samples = list(pool.map(work, pairs))
+            elapsed = time.perf_counter() - started
+            rows.append({
+                "benchmark": "concurrency",
+                "params": {"workers": level, "pairs": len(pairs), "cache": cache},
+                "metrics": {
+                    "pairs_per_second": round(len(pairs) / elapsed, 2),
+                    "wall_ms": round(elapsed * 1000, 1),
+                    "literature": _summary([s[0] for s in samples]),
+                    "clinical": _summary([s[1] for s in samples]),
+                    "upstream_calls": h.upstream_calls(),
+                },
+            })
+    return rows
+
+
+def bench_batch(h, n_pairs, workers, workdir):
+    """
+    `agents.batch.run_batch` over a generated CSV, with and without bulk literature.
+    """
+    from agents.batch import run_batch
+
+    src = os.path.join(workdir, "pairs.csv")
+    with open(src, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["drug", "therapeutic_area"])
+        writer.writerows(_pairs(n_pairs))
+
+    rows = []
+    for bulk in (True, False):
+        h.reset()
+        out = os.path.join(workdir, f"batch-{'bulk' if bulk else 'per-pair'}.jsonl")
+        if os.path.exists(out):
+            os.remove(out)
+        with open(os.devnull, "w") as quiet:
+            started = time.perf_counter()
+            summary = run_batch(src, out, workers=workers, bulk_literature=bulk, progress_every=0, log=quiet)
+            elapsed = time.perf_counter() - started
+        rows.append({
+            "benchmark": "batch",
+            "params": {"pairs": n_pairs, "workers": workers, "bulk_literature": bulk},
+            "metrics": {
+                "pairs_per_minute": round(summary["scored"] / elapsed * 60, 1),
+                "wall_ms": round(elapsed * 1000, 1),
+                "scored": summary["scored"],
+                "failed": summary["failed"],
+                "upstream_calls": h.upstream_calls(),
+            },
+        })
+    return rows
+
+
+def bench_patent_index(workdir, ingredients, repeat):
+    """
+    Bulk load of a synthetic Orange Book with `ingredients` entries, then single and
+    batched lookups against it (the patent agent's per-drug cost on a whole library).
+    """
+    from agents.patent_index import PatentIndex, load_orange_book
+
+    source = os.path.join(workdir, "orange_book_large")
+    names = write_orange_book(source, DRUGS, extra_ingredients=ingredients)
+    path = os.path.join(workdir, "patents_large.sqlite3")
+    summary = load_orange_book(source, path)
+    index = PatentIndex(path)
+    try:
+        probe = [names[(i * 7919) % len(names)] for i in range(repeat * 50)]
+        single = [_timed(index.lookup, name)[0] for name in probe]
+        ms = _timed(index.lookup_many, names)[0]
+    finally:
+        index.close()
+    return [
+        {"benchmark": "patent_index", "params": {"mode": "load", "ingredients": len(names)},
+         "metrics": {"wall_ms": round(summary["seconds"] * 1000, 1), "patents": summary["patents"]}},
+        {"benchmark": "patent_index", "params": {"mode": "lookup", "ingredients": len(names)},
+         "metrics": _summary(single)},
+        {"benchmark": "patent_index", "params": {"mode": "lookup_many", "ingredients": len(names)},
+         "metrics": {"wall_ms": round(ms, 3), "lookups_per_second": round(len(names) / (ms / 1000), 1)}},
+    ]
+
+
+def bench_literature_index(workdir, records, repeat):
+    """
+    Loads a synthetic MEDLINE baseline into the local literature index (two files, the
+    second added incrementally), then times co-occurrence searches with top-k fetch.
+    """
+    from agents.literature_index import LiteratureIndex
+
+    half = records // 2
+    files = [write_medline_baseline(os.path.join(workdir, f"baseline-{i}.txt"), DRUGS, AREAS, half, i * half + 1)
+             for i in range(2)]
+    index = LiteratureIndex(os.path.join(workdir, "literature_index_bench"))
+    try:
+        load_ms = [_timed(index.add_files, [path])[0] for path in files]
+        samples = [_timed(index.search, drug, area)[0] for drug, area in _pairs(repeat * 5)]
+    finally:
+        index.close()
+    return [
+        {"benchmark": "literature_index", "params": {"mode": "load", "records": records},
+         "metrics": {"wall_ms": round(sum(load_ms), 1), "incremental_ms": round(load_ms[1], 1)}},
+        {"benchmark": "literature_index", "params": {"mode": "search", "records": records},
+         "metrics": _summary(samples)},
+    ]
+
+
+def bench_adverse_event_store(workdir, reports, repeat):
+    """
+    Loads a synthetic FAERS export into the local adverse-event store (two files, the
+    second added incrementally), then times drug profile and reaction lookups.
+    """
+    from agents.adverse_event_store import load_exports, AdverseEventStore
+
+    half = reports // 2
+    files = [write_faers_export(os.path.join(workdir, f"drug-event-{i + 1:04d}-of-0002.json.zip"), DRUGS, half,
+                                i * half + 1) for i in range(2)]
+    directory = os.path.join(workdir, "adverse_events_bench")
+    load_ms = [_timed(load_exports, [path], directory)[0] for path in files]
+    store = AdverseEventStore(directory)
+    store.stats()  # map the build outside the timed lookups
+    profiles = [_timed(store.profile, DRUGS[i % len(DRUGS)])[0] for i in range(repeat * 5)]
+    reactions = [_timed(store.drugs_with_reaction, "Nausea")[0] for _ in range(repeat * 5)]
+    return [
+        {"benchmark": "adverse_event_store", "params": {"mode": "load", "reports": reports},
+         "metrics": {"wall_ms": round(sum(load_ms), 1), "incremental_ms": round(load_ms[1], 1)}},
+        {"benchmark": "adverse_event_store", "params": {"mode": "profile", "reports": reports},
+         "metrics": _summary(profiles)},
+        {"benchmark": "adverse_event_store", "params": {"mode": "reaction", "reports": reports},
+         "metrics": _summary(reactions)},
+    ]
+
+
+def bench_evidence_matrix(h, workdir, repeat):
+    """
+    Builds the drug x area evidence matrix from the index left by `bench_literature_index`
+    (OpenFDA totals from the stub), then times top-N queries in both directions.
+    """
+    from agents.evidence_matrix import build_matrix, EvidenceMatrix
+
+    h.reset()
+    previous = os.environ.get("BIOFORGE_LITERATURE_INDEX")
+    os.environ["BIOFORGE_LITERATURE_INDEX"] = os.path.join(workdir, "literature_index_bench")
+    try:
+        directory = os.path.join(workdir, "evidence_matrix_bench")
+        build_ms, summary = _timed(build_matrix, DRUGS, AREAS, directory)
+    finally:
+        if previous is None:
+            os.environ.pop("BIOFORGE_LITERATURE_INDEX", None)
+        else:
+            os.environ["BIOFORGE_LITERATURE_INDEX"] = previous
+    matrix = EvidenceMatrix(directory)
+    matrix.stats()  # load outside the timed queries
+    by_area = [_timed(matrix.top_drugs, AREAS[i % len(AREAS)], 20)[0] for i in range(repeat * 5)]
+    by_drug = [_timed(matrix.top_areas, DRUGS[i % len(DRUGS)], 5)[0] for i in range(repeat * 5)]
+    return [
+        {"benchmark": "evidence_matrix", "params": {"mode": "build", "pairs": len(DRUGS) * len(AREAS)},
+         "metrics": {"wall_ms": round(build_ms, 1), "pairs_with_evidence": summary["pairs_with_evidence"],
+                     "upstream_calls": h.upstream_calls()}},
+        {"benchmark": "evidence_matrix", "params": {"mode": "top_drugs"}, "metrics": _summary(by_area)},
+        {"benchmark": "evidence_matrix", "params": {"mode": "top_areas"}, "metrics": _summary(by_drug)},
+    ]
+
+
+_SHARED_CACHE_WORKER = """
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from agents.literature_agent import search_pubmed_cached, pubmed_query
+from agents.clinical_trial_agent import adverse_event_total
+
+def run(pair):
+    search_pubmed_cached(pubmed_query(*pair))
+    adverse_event_total(pair[0])
+
+with ThreadPoolExecutor(max_workers=4) as pool:
+    list(pool.map(run, [tuple(arg.split("|")) for arg in sys.argv[1:]]))
+"""
+
+
+def bench_shared_cache(h, workdir, workers, n_pairs):
+    """
+    `workers` separate processes (each with its own cache dir, as on separate nodes)
+    look up the same pairs at once: process-local caches vs. the shared Redis backend
+    (against RedisStub). Upstream calls show what cross-worker single-flight saves.
+    Skipped when the optional `redis` client is not installed.
+    """
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        return []
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pairs = [f"{drug}|{area}" for drug, area in _pairs(n_pairs)]
+    rows = []
+    with RedisStub() as redis_stub:
+        for backend in ("memory", "redis"):
+            h.reset_counts()
+            started = time.perf_counter()
+            procs = [subprocess.Popen(
+                [sys.executable, "-c", _SHARED_CACHE_WORKER, *pairs], cwd=root,
+                env=dict(os.environ, BIOFORGE_CACHE_BACKEND=backend, BIOFORGE_REDIS_URL=redis_stub.url,
+                         BIOFORGE_CACHE_DIR=os.path.join(workdir, f"worker-{backend}-{i}")),
+            ) for i in range(workers)]
+            failed = sum(p.wait() != 0 for p in procs)
+            rows.append({"benchmark": "shared_cache", "params": {"backend": backend, "workers": workers,
+                                                                 "pairs": n_pairs},
+                         "metrics": {"wall_ms": round((time.perf_counter() - started) * 1000, 1),
+                                     "failed_workers": failed, "upstream_calls": h.upstream_calls()}})
+    return rows
+
+
+def bench_deadlines(h, n_calls, repeat):
+    """
+    Tail latency of OpenFDA calls when 3% of them stall for 0.5 s, with and without
+    hedged requests; then full swarm runs under a 2 s latency budget while PubMed
+    takes 3 s per call, cold (agent replaced by a placeholder) and with the pair's
+    PubMed result cached but expired (served as a degraded input).
+    """
+    from agents import http_client, literature_agent
+    from agents.orchestrator import run_swarm
+
+    rows = []
+    saved = h.entrez.faults, h.openfda.faults  # the harness stubs share one Faults
+    try:
+        h.openfda.faults = Faults(tail_rate=0.03, tail_latency=0.5)
+        url = f"{h.openfda.url}/drug/event.json"
+        for quantile in ("0", "0.95"):
+            h.reset()
+            os.environ["BIOFORGE_HTTP_HEDGE_QUANTILE"] = quantile
+            samples = sorted(_timed(http_client.get, url, params={"search": f'x:"{DRUGS[i % len(DRUGS)]}"'})[0]
+                             for i in range(n_calls))
+            stats = http_client.timing_stats().get(h.openfda.url.split("//")[1], {})
+            rows.append({"benchmark": "deadlines", "params": {"mode": "hedged" if quantile != "0" else "plain",
+                                                              "calls": n_calls, "tail_rate": 0.03},
+                         "metrics": dict(_summary(samples), p99_ms=round(samples[int(len(samples) * 0.99)], 3),
+                                         hedges=stats.get("hedges", 0),
+                                         upstream_calls=h.upstream_calls()["openfda"])})
+        os.environ.pop("BIOFORGE_HTTP_HEDGE_QUANTILE")
+
+        h.openfda.faults = saved[1]
+        h.entrez.faults = Faults(latency=3.0)
+        for cache in ("cold", "stale"):
+            wall, partial = [], 0
+            for drug, area in _pairs(repeat):
+                h.reset()
+                if cache == "stale":
+                    query = literature_agent.pubmed_query(drug, area)
+                    literature_agent._pubmed_cache().set(
+                        "esearch:" + literature_agent.normalize_key(query),
+                        {"count": 12, "ids": [], "titles": [], "papers": [], "journals": [], "mesh_terms": []},
+                        ttl=-1,
+                    )
+                ms, result = _timed(run_swarm, drug, area, api_key="bench", deadline=2.0)
+                wall.append(ms)
+                partial += result["decision"]["partial"]
+            rows.append({"benchmark": "deadlines", "params": {"mode": "swarm", "deadline_s": 2.0,
+                                                              "pubmed_latency_s": 3.0, "cache": cache},
+                         "metrics": dict(_summary(wall), partial_results=partial,
+                                         literature_status=result["lit"]["status"])})
+    finally:
+        os.environ.pop("BIOFORGE_HTTP_HEDGE_QUANTILE", None)
+        h.entrez.faults, h.openfda.faults = saved
+    return rows
+
+
+def bench_decision(h, repeat, rows_vectorized):
+    """
+    make_decision heuristic-only vs. with the fake LLM (cold and cached completion),
+    portfolio narratives per candidate vs. batched, and vectorized `score_candidates` throughput.
+    """
+    import numpy as np
+    import pandas as pd
+    from agents.decision_agent import make_decision, score_candidates
+
+    lit = {"relevance_score": 0.62, "key_insights": ["Found study: 'x'"]}
+    pat = {"patent_risk": "Medium"}
+    clin = {"clinical_risk_score": 25}
+
+    rows = []
+    h.reset()
+    samples = [_timed(make_decision, lit, pat, clin, use_llm=False)[0] for _ in range(repeat)]
+    rows.append({"benchmark": "decision", "params": {"mode": "heuristic"}, "metrics": _summary(samples)})
+
+    cold, warm = [], []
+    for i in range(repeat):
+        h.reset()
+        variant = dict(lit, relevance_score=round(0.3 + i / (repeat * 2), 3))
+        cold.append(_timed(make_decision, variant, pat, clin, api_key="bench")[0])
+        warm.append(_timed(make_decision, variant, pat, clin, api_key="bench")[0])
+    rows.append({"benchmark": "decision", "params": {"mode": "llm", "cache": "cold"}, "metrics": _summary(cold)})
+    rows.append({"benchmark": "decision", "params": {"mode": "llm", "cache": "warm"}, "metrics": _summary(warm)})
+
+    # Narratives for a portfolio: one request per candidate vs. packed requests
+    from agents.decision_agent import generate_narrative, summarize_candidates
+    portfolio = [{"id": str(i), "drug_name": DRUGS[i % len(DRUGS)], "therapeutic_area": AREAS[i % len(AREAS)],
+                  "lit_score": 40 + i % 60, "pat_risk": "Medium", "clin_risk": 25, "confidence": 40 + i % 60,
+                  "recommendation": "AMBER", "key_insights": []} for i in range(repeat * 5)]
+    for mode in ("llm_per_candidate", "llm_batched"):
+        h.reset()
+        started = time.perf_counter()
+        if mode == "llm_batched":
+            summarize_candidates(portfolio, "bench")
+        else:
+            for c in portfolio:
+                generate_narrative(c, "bench")
+        ms = (time.perf_counter() - started) * 1000
+        rows.append({"benchmark": "decision", "params": {"mode": mode, "candidates": len(portfolio)},
+                     "metrics": {"wall_ms": round(ms, 1), "llm_calls": h.gemini.calls,
+                                 "calls_per_candidate": round(h.gemini.calls / len(portfolio), 3)}})
+
+    rng = np.random.default_rng(0)
+    candidates = pd.DataFrame({
+        "relevance_score": rng.uniform(0.1, 0.98, rows_vectorized),
+        "patent_risk": rng.choice(["Low", "Medium", "High"], rows_vectorized),
+        "clinical_risk_score": rng.integers(0, 60, rows_vectorized),
+    })
+    ms = _timed(score_candidates, candidates)[0]
+    rows.append({"benchmark": "decision", "params": {"mode": "vectorized", "rows": rows_vectorized},
+                 "metrics": {"wall_ms": round(ms, 3), "rows_per_second": round(rows_vectorized / (ms / 1000), 1)}})
+    return rows
+
+
+def run(args):
+    faults = Faults(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    llm_faults = Faults(latency=args.llm_latency, error_rate=args.error_rate, seed=args.seed)
+    quick = args.quick
+
+    with tempfile.TemporaryDirectory(prefix="bioforge-bench-") as workdir:
+        h = Harness(faults, llm_faults, workdir)
+        try:
+            results = []
+            results += bench_single_run(h, repeat=5 if quick else args.repeat)
+            results += bench_concurrency(h, _pairs(20 if quick else 100), [1, 4] if quick else args.concurrency)
+            results += bench_batch(h, 40 if quick else args.batch_pairs, args.workers, workdir)
+            results += bench_shared_cache(h, workdir, 4, 10 if quick else 50)
+            results += bench_deadlines(h, 100 if quick else 400, 3 if quick else 5)
+            results += bench_decision(h, 5 if quick else args.repeat, 10_000 if quick else 100_000)
+            results += bench_patent_index(workdir, 10_000 if quick else 100_000, 5 if quick else args.repeat)
+            results += bench_literature_index(workdir, 20_000 if quick else 200_000, 5 if quick else args.repeat)
+            results += bench_evidence_matrix(h, workdir, 5 if quick else args.repeat)
+            results += bench_adverse_event_store(workdir, 20_000 if quick else 200_000, 5 if quick else args.repeat)
+        finally:
+            h.close()
+
+    from agents.result_store import AGENT_VERSIONS
+    return {
+        "schema": SCHEMA_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "agent_versions": dict(AGENT_VERSIONS),
+        "stubs": {"http": faults.as_dict(), "llm": llm_faults.as_dict(), "quick": quick},
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipeline against offline stubs.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results ('-' for stdout)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every stub HTTP response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Up to this many extra seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub calls that fail (HTTP 503 / LLM error)")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds the fake Gemini takes per completion")
+    parser.add_argument("--repeat", type=int, default=20, help="Samples per single-run / decision benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Worker counts to compare")
+    parser.add_argument("--batch-pairs", type=int, default=200, help="Pairs in the batch benchmark")
+    parser.add_argument("--workers", type=int, default=8, help="Workers for the batch benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="Small sample sizes, for a smoke run")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"[bench] {len(report['results'])} results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
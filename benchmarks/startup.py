@@ -0,0 +1,123 @@
+"""
+Cold-start benchmark: import time of the app's entry points, each in a fresh interpreter.
+
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --top 15          # also list the slowest imports
+
+Each target runs in its own `python -X importtime` subprocess (median of `--repeat`
+runs), so nothing is shared with earlier imports. `heavy_loaded` lists which of the
+heavy libraries a target pulled in; on the landing page only the ones Streamlit
+itself imports (numpy, plotly) should appear.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+
+from benchmarks.run import SCHEMA_VERSION, _git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("numpy", "pandas", "plotly", "streamlit_agraph", "google.generativeai")
+
+_LANDING_PAGE = f"""
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({os.path.join(ROOT, "app.py")!r}, default_timeout=60).run()
+"""
+
+TARGETS = {
+    "agents": "import agents.jobs",                  # what app.py imports up front
+    "batch": "import agents.batch",
+    "decision_vectorized": "import agents.decision_agent as d; d.score_arrays([0.5], ['Low'], [10])",
+    "gemini_sdk": "import google.generativeai",      # paid only when the LLM is first used
+    "app_landing_page": _LANDING_PAGE,               # full first render, no analysis yet
+}
+
+
+def _probe(code):
+    # Reports which heavy modules ended up loaded, on the last line of stdout
+    return code + f"\nimport sys, json\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+
+
+def _parse_importtime(stderr):
+    """
+    Returns (total_ms, [(module, self_ms, cumulative_ms)]) from `-X importtime` output.
+    Total is the sum of top-level (unindented) cumulative times.
+    """
+    total_us, rows = 0, []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative_us)
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return total_us / 1000, rows
+
+
+def measure(code, repeat=3):
+    walls, imports, heavy, rows = [], [], [], []
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               BIOFORGE_METRICS_PORT="", PYTHONWARNINGS="ignore")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _probe(code)], cwd=ROOT, env=env,
+                              capture_output=True, text=True, timeout=300)
+        walls.append((time.perf_counter() - started) * 1000)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "target failed")
+        total, rows = _parse_importtime(proc.stderr)
+        imports.append(total)
+        heavy = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "wall_ms": round(statistics.median(walls), 1),
+        "import_ms": round(statistics.median(imports), 1),
+        "heavy_loaded": heavy,
+        "slowest_imports": [{"module": m, "self_ms": round(s, 2), "cumulative_ms": round(c, 2)}
+                            for m, s, c in sorted(rows, key=lambda r: -r[1])[:10]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the app's entry points.")
+    parser.add_argument("--output", default="-", help="Where to write the JSON results ('-' for stdout)")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per target (median is reported)")
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=list(TARGETS))
+    parser.add_argument("--top", type=int, default=0, help="Print the N slowest imports (self time) per target")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.targets:
+        try:
+            metrics = measure(TARGETS[name], args.repeat)
+        except Exception as e:
+            print(f"[startup] {name}: skipped ({e})", file=sys.stderr)
+            continue
+        results.append({"benchmark": "startup", "params": {"target": name}, "metrics": metrics})
+        print(f"[startup] {name:<20} import {metrics['import_ms']:>8.1f} ms   wall {metrics['wall_ms']:>8.1f} ms   "
+              f"heavy: {', '.join(metrics['heavy_loaded']) or '-'}", file=sys.stderr)
+        for row in metrics["slowest_imports"][:args.top]:
+            print(f"             {row['self_ms']:>8.2f} ms  {row['module']}", file=sys.stderr)
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
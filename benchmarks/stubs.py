@@ -0,0 +1,561 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Offline stand-ins for NCBI Entrez, the OpenFDA event endpoint and Gemini.
+# Answers are deterministic per query (hash-seeded), so two benchmark runs see
+# the same corpus; latency and failures are injected on top.
+
+_PHRASE = re.compile(r'"([^"]+)"\[Title/Abstract\]')
+JOURNALS = ["Nature", "Lancet", "BMJ", "Cell", "JAMA", "NEJM", "Blood", "Cancer Res"]
+REACTIONS = ["Nausea", "Headache", "Diarrhoea", "Dizziness", "Fatigue", "Rash", "Vomiting", "Lactic acidosis",
+             "Hypoglycaemia", "Drug ineffective", "Myalgia", "Hypotension"]
+INDICATIONS = ["Type 2 diabetes mellitus", "Hypertension", "Pain", "Depression", "Infection", "Product used for unknown indication"]
+MESH = ["Humans", "Female", "Male", "Adult", "Neoplasms", "Treatment Outcome", "Drug Repositioning", "Mice"]
+
+
+def _stable_int(*parts):
+    digest = hashlib.sha256("|".join(p.lower() for p in parts).encode()).hexdigest()
+    return int(digest[:12], 16)
+
+
+class Faults:
+    """
+    Latency and error injection shared by the stubs: every call sleeps
+    `latency` seconds plus up to `jitter` (plus `tail_latency` for a `tail_rate`
+    fraction of calls), and fails with HTTP 503 (or an exception, for Gemini)
+    with probability `error_rate`.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, tail_rate=0.0, tail_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, limit=None):
+        """
+        Sleeps for this call's latency, or only `limit` seconds if that is shorter;
+        returns False when cut short.
+        """
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+            if self.tail_rate and self._rng.random() < self.tail_rate:
+                extra += self.tail_latency
+        total = self.latency + extra
+        if limit is not None and limit < total:
+            time.sleep(max(0.0, limit))
+            return False
+        if total:
+            time.sleep(total)
+        return True
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def as_dict(self):
+        return {"latency": self.latency, "jitter": self.jitter, "error_rate": self.error_rate,
+                "tail_rate": self.tail_rate, "tail_latency": self.tail_latency}
+
+
+class _StubServer:
+    """
+    Threaded local HTTP server on an ephemeral port. Subclasses implement `route`.
+    `hits` counts requests per path suffix.
+    """
+
+    def __init__(self, faults=None):
+        self.faults = faults or Faults()
+        self.hits = {}
+        self._hits_lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body, content_type):
+                payload = body.encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client timed out (or took a hedged answer) and hung up
+
+            def _handle(self, query):
+                path = urlsplit(self.path).path
+                stub._count(path.rsplit("/", 1)[-1])
+                stub.faults.delay()
+                if stub.faults.should_fail():
+                    return self._send(503, "Service Unavailable", "text/plain")
+                self._send(*stub.route(path, {k: v[-1] for k, v in query.items()}))
+
+            def do_GET(self):
+                self._handle(parse_qs(urlsplit(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self._handle(parse_qs(self.rfile.read(length).decode("utf-8")))
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _count(self, name):
+        with self._hits_lock:
+            self.hits[name] = self.hits.get(name, 0) + 1
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_hits(self):
+        with self._hits_lock:
+            self.hits.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EntrezStub(_StubServer):
+    """
+    esearch (plain, usehistory=y and rettype=count) and efetch (rettype=medline, by id list or
+    WebEnv/query_key page) over a synthetic corpus: each (drug, area) pair has a
+    fixed number of matching papers between 0 and `max_hits`.
+    `url` + "/entrez/eutils" is what NCBI_EUTILS_URL should point at.
+    """
+
+    _ESEARCH_HEAD = (
+        '<?xml version="1.0" encoding="UTF-8" ?>\n'
+        '<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+        '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n'
+    )
+
+    def __init__(self, faults=None, max_hits=60):
+        super().__init__(faults)
+        self.max_hits = max_hits
+        self._history = {}   # WebEnv -> records
+        self._by_id = {}     # pmid -> record, for efetch by id
+        self._lock = threading.Lock()
+
+    @property
+    def eutils_url(self):
+        return self.url + "/entrez/eutils"
+
+    def pair_hits(self, drug, area):
+        return _stable_int(drug, area) % (self.max_hits + 1)
+
+    def _pairs(self, term):
+        phrases = _PHRASE.findall(term)
+        # Terms are "(drug OR ...) AND (area OR ...)"; split the phrases at the AND
+        head = term.split(" AND ", 1)[0]
+        drugs = [p for p in phrases if f'"{p}"' in head]
+        areas = [p for p in phrases if p not in drugs]
+        return [(d, a) for d in drugs for a in areas]
+
+    def _records(self, pairs):
+        for drug, area in pairs:
+            seed = _stable_int(drug, area)
+            for i in range(self.pair_hits(drug, area)):
+                n = seed + i
+                yield {
+                    "pmid": str(10_000_000 + n % 89_999_999),
+                    "title": f"{drug} in {area}: cohort study {i + 1}",
+                    "abstract": f"We evaluated {drug} for {area} outcomes.",
+                    "journal": JOURNALS[n % len(JOURNALS)],
+                    "year": 2015 + n % 10,
+                    "mesh": [MESH[n % len(MESH)], MESH[(n // 7) % len(MESH)]],
+                }
+
+    @staticmethod
+    def _medline(records):
+        out = []
+        for rec in records:
+            lines = [f"PMID- {rec['pmid']}", f"TI  - {rec['title']}", f"AB  - {rec['abstract']}",
+                     f"TA  - {rec['journal']}", f"DP  - {rec['year']} Jan"]
+            lines += [f"MH  - {m}" for m in rec["mesh"]]
+            out.append("\n".join(lines))
+        return "\n" + "\n\n".join(out) + "\n\n"
+
+    def route(self, path, q):
+        if path.endswith("esearch.fcgi"):
+            pairs = self._pairs(q.get("term", ""))
+            records = list(self._records(pairs))
+            if q.get("rettype") == "count":
+                return 200, self._ESEARCH_HEAD + f"<eSearchResult><Count>{len(records)}</Count></eSearchResult>", "text/xml"
+            history = ""
+            if q.get("usehistory") == "y":
+                with self._lock:
+                    webenv = f"MCID_{len(self._history) + 1}"
+                    self._history[webenv] = records
+                history = f"<QueryKey>1</QueryKey><WebEnv>{webenv}</WebEnv>"
+            retmax = int(q.get("retmax", 20))
+            ids = "".join(f"<Id>{r['pmid']}</Id>" for r in records[:retmax])
+            with self._lock:
+                self._by_id.update((rec["pmid"], rec) for rec in records[:retmax])
+            body = (
+                self._ESEARCH_HEAD +
+                f"<eSearchResult><Count>{len(records)}</Count><RetMax>{min(retmax, len(records))}</RetMax>"
+                f"<RetStart>0</RetStart>{history}<IdList>{ids}</IdList>"
+                "<TranslationSet/><QueryTranslation/></eSearchResult>"
+            )
+            return 200, body, "text/xml"
+
+        if path.endswith("efetch.fcgi"):
+            with self._lock:
+                if q.get("WebEnv"):
+                    records = self._history.get(q["WebEnv"], [])
+                    start = int(q.get("retstart", 0))
+                    records = records[start:start + int(q.get("retmax", 20))]
+                else:
+                    records = [self._by_id[i] for i in q.get("id", "").split(",") if i in self._by_id]
+            return 200, self._medline(records), "text/plain"
+
+        return 404, "Unknown endpoint", "text/plain"
+
+
+class OpenFDAStub(_StubServer):
+    """
+    /drug/event.json with a deterministic report total per drug (0 to `max_total`).
+    Drugs in `unknown_drugs` get OpenFDA's 404 "no matches" answer.
+    """
+
+    _DRUG = re.compile(r'medicinalproduct:"([^"]+)"')
+
+    def __init__(self, faults=None, max_total=400_000, unknown_drugs=()):
+        super().__init__(faults)
+        self.max_total = max_total
+        self.unknown_drugs = {d.lower() for d in unknown_drugs}
+
+    def total_for(self, drug):
+        return _stable_int(drug) % (self.max_total + 1)
+
+    def route(self, path, q):
+        if not path.endswith("/drug/event.json"):
+            return 404, json.dumps({"error": {"code": "NOT_FOUND"}}), "application/json"
+        match = self._DRUG.search(q.get("search", ""))
+        drug = match.group(1) if match else ""
+        if not drug or drug.lower() in self.unknown_drugs:
+            return 404, json.dumps({"error": {"code": "NOT_FOUND", "message": "No matches found!"}}), "application/json"
+        body = {"meta": {"results": {"skip": 0, "limit": 1, "total": self.total_for(drug)}}, "results": [{}]}
+        return 200, json.dumps(body), "application/json"
+
+
+class RedisStub:
+    """
+    In-memory stand-in for a Redis server (RESP2 over TCP, ephemeral port) with just the
+    commands the shared cache backend uses: GET, SET (EX/PX/NX), DEL, SCAN, EVAL (only the
+    cache's lock extend/release scripts, told apart by what they call), plus PING, SELECT,
+    CLIENT and FLUSHDB. `hits` counts commands by name.
+    """
+
+    def __init__(self):
+        import socketserver
+
+        self.hits = {}
+        self._data = {}  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    command = stub._read_command(self.rfile)
+                    if command is None:
+                        return
+                    self.wfile.write(stub._execute(command))
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0?protocol=2"  # RESP2 only: newer clients default to RESP3
+
+    @staticmethod
+    def _read_command(rfile):
+        line = rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # inline command
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(rfile.readline()[1:])
+            args.append(rfile.read(size + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def _execute(self, args):
+        import fnmatch
+
+        name = args[0].decode().upper()
+        now = time.time()
+        with self._lock:
+            self.hits[name] = self.hits.get(name, 0) + 1
+            if name == "PING":
+                return b"+PONG\r\n"
+            if name in ("SELECT", "CLIENT"):
+                return b"+OK\r\n"
+            if name == "FLUSHDB":
+                self._data.clear()
+                return b"+OK\r\n"
+            if name == "GET":
+                entry = self._live(args[1], now)
+                return self._bulk(entry[0] if entry else None)
+            if name == "SET":
+                key, value, options = args[1], args[2], [a.decode().upper() for a in args[3:]]
+                expires = None
+                for i, option in enumerate(options):
+                    if option in ("EX", "PX"):
+                        expires = now + float(options[i + 1]) / (1 if option == "EX" else 1000)
+                if "NX" in options and self._live(key, now) is not None:
+                    return b"$-1\r\n"
+                self._data[key] = (value, expires)
+                return b"+OK\r\n"
+            if name == "DEL":
+                removed = sum(self._data.pop(k, None) is not None for k in args[1:])
+                return b":%d\r\n" % removed
+            if name == "SCAN":
+                options = [a.decode() for a in args[2:]]
+                pattern = options[options.index("MATCH") + 1] if "MATCH" in options else "*"
+                keys = [k for k in list(self._data) if self._live(k, now) and fnmatch.fnmatchcase(k.decode(), pattern)]
+                return b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys) + b"".join(self._bulk(k) for k in keys)
+            if name == "EVAL":
+                script, key, token = args[1], args[3], args[4]
+                entry = self._live(key, now)
+                if entry is None or entry[0] != token:
+                    return b":0\r\n"
+                if b"pexpire" in script:
+                    self._data[key] = (entry[0], now + float(args[5]) / 1000)
+                else:
+                    del self._data[key]
+                return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_hits(self):
+        with self._lock:
+            self.hits.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class _Response:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeGeminiModel:
+    """
+    Stands in for `genai.GenerativeModel`: answers the decision agent's narrative
+    prompt (single or batched candidates) with JSON matching its response schema
+    after `faults.latency` (+ jitter), streaming it in `chunks` pieces spread over
+    the same time when `stream=True`. A call slower than its `request_options`
+    timeout raises TimeoutError once the timeout has passed.
+    """
+
+    _CANDIDATE = re.compile(r"Candidate id=(\S+):[\s\S]*?Recommendation: ([\w-]+)")
+
+    def __init__(self, faults=None, chunks=8):
+        self.faults = faults or Faults()
+        self.chunks = chunks
+        self.calls = 0
+
+    @staticmethod
+    def _narrative(verdict):
+        return {
+            "summary": f"The evidence supports a {verdict} decision. Risks are within the expected range.",
+            "rationale": ["Business: addressable market is material.",
+                          "Legal: patent position is manageable.",
+                          "Clinical: safety signal is acceptable."],
+        }
+
+    def _answer(self, prompt):
+        batch = self._CANDIDATE.findall(prompt)
+        if batch:
+            return json.dumps({"candidates": [dict(self._narrative(verdict), id=cid) for cid, verdict in batch]})
+        match = re.search(r"justifying the (\w[\w ]*?)\.", prompt)
+        return json.dumps(self._narrative(match.group(1) if match else "recommendation"))
+
+    def generate_content(self, prompt, stream=False, generation_config=None, request_options=None):
+        self.calls += 1
+        if self.faults.should_fail():
+            raise RuntimeError("503 injected Gemini failure")
+        text = self._answer(prompt)
+        usage = _Usage(len(prompt) // 4, len(text) // 4)
+        timeout = (request_options or {}).get("timeout")
+        if not stream:
+            if not self.faults.delay(limit=timeout):
+                raise TimeoutError("504 Deadline Exceeded")
+            return _Response(text, usage)
+        return self._stream(text, usage, timeout)
+
+    def _stream(self, text, usage, timeout=None):
+        step = max(1, len(text) // self.chunks)
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        pause = self.faults.latency / max(1, len(pieces))
+        started = time.monotonic()
+        for i, piece in enumerate(pieces):
+            time.sleep(pause)
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError("504 Deadline Exceeded")
+            yield _Response(piece, usage if i == len(pieces) - 1 else None)
+
+
+def install_fake_gemini(faults=None, chunks=8):
+    """
+    Routes every `llm_client` call to one shared FakeGeminiModel and returns it.
+    Undo with `llm_client.set_model_factory(None)`.
+    """
+    from agents import llm_client
+    model = FakeGeminiModel(faults, chunks)
+    llm_client.set_model_factory(lambda api_key, model_name: model)
+    return model
+
+
+def write_medline_baseline(path, drugs, areas, records, first_pmid=1):
+    """
+    Writes `records` synthetic MEDLINE-format citations to `path`, each mentioning one
+    drug and one area (hash-picked per PMID), for loading into the local literature index.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for pmid in range(first_pmid, first_pmid + records):
+            seed = _stable_int(str(pmid))
+            drug, area = drugs[seed % len(drugs)], areas[(seed // 7) % len(areas)]
+            f.write(f"PMID- {pmid}\nTI  - {drug} outcomes in {area}: cohort {pmid}\n"
+                    f"AB  - We report {drug} exposure and\n      {MESH[seed % len(MESH)].lower()} endpoints.\n"
+                    f"TA  - {JOURNALS[seed % len(JOURNALS)]}\nDP  - {1990 + seed % 35} Jan\n"
+                    f"MH  - {MESH[seed % len(MESH)]}\n\n")
+    return path
+
+
+def write_faers_export(path, drugs, reports, first_id=1):
+    """
+    Writes an OpenFDA drug/event bulk export (`.json.zip` like the published files, or plain
+    `.json`) with `reports` synthetic FAERS reports, each with one or two suspect drugs, a
+    concomitant drug and one to three reactions (all hash-picked per report id).
+    """
+    import zipfile
+
+    results = []
+    for rid in range(first_id, first_id + reports):
+        seed = _stable_int(str(rid))
+        suspects = {drugs[seed % len(drugs)]}
+        if seed % 4 == 0:
+            suspects.add(drugs[(seed // 11) % len(drugs)])
+        entries = [{"medicinalproduct": d.upper(), "drugcharacterization": "1",
+                    "drugindication": INDICATIONS[(seed // 3) % len(INDICATIONS)].upper()} for d in sorted(suspects)]
+        entries.append({"medicinalproduct": drugs[(seed // 13) % len(drugs)].upper(), "drugcharacterization": "2"})
+        results.append({
+            "safetyreportid": str(rid),
+            "serious": "1" if seed % 3 == 0 else "2",
+            "seriousnessdeath": "1" if seed % 50 == 0 else None,
+            "seriousnesshospitalization": "1" if seed % 6 == 0 else None,
+            "patient": {
+                "drug": entries,
+                "reaction": [{"reactionmeddrapt": REACTIONS[(seed // (5 + k)) % len(REACTIONS)]} for k in range(1 + seed % 3)],
+            },
+        })
+    body = json.dumps({"meta": {"results": {"skip": 0, "limit": reports, "total": reports}}, "results": results})
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr(os.path.basename(path)[:-len(".zip")], body)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
+    return path
+
+
+def write_orange_book(directory, drugs, extra_ingredients=0, today_year=2026):
+    """
+    Writes a synthetic Orange Book (`products.txt`, `patent.txt`, `exclusivity.txt`) to
+    `directory`: one product per drug in `drugs` plus `extra_ingredients` made-up ones,
+    each with a deterministic set of patents expiring around `today_year`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    names = list(drugs) + [f"Compound-{i:06d}" for i in range(extra_ingredients)]
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+    def when(seed):
+        return f"{months[seed % 12]} {1 + seed % 28:02d}, {today_year - 6 + seed % 14}"
+
+    with open(os.path.join(directory, "products.txt"), "w", encoding="utf-8") as products, \
+            open(os.path.join(directory, "patent.txt"), "w", encoding="utf-8") as patents, \
+            open(os.path.join(directory, "exclusivity.txt"), "w", encoding="utf-8") as exclusivity:
+        products.write("Ingredient~DF;Route~Trade_Name~Applicant~Strength~Appl_Type~Appl_No~Product_No~"
+                       "TE_Code~Approval_Date~RLD~RS~Type~Applicant_Full_Name\n")
+        patents.write("Appl_Type~Appl_No~Product_No~Patent_No~Patent_Expire_Date_Text~Drug_Substance_Flag~"
+                      "Drug_Product_Flag~Patent_Use_Code~Delist_Flag~Submission_Date\n")
+        exclusivity.write("Appl_Type~Appl_No~Product_No~Exclusivity_Code~Exclusivity_Date\n")
+        for i, name in enumerate(names):
+            seed = _stable_int(name)
+            appl = f"{100000 + i:06d}"
+            salt = " HYDROCHLORIDE" if seed % 2 else ""
+            products.write(f"{name.upper()}{salt}~TABLET;ORAL~{name.upper()}-BRAND~ACME~10MG~N~{appl}~001~"
+                           f"AB~Jan 1, 2000~Yes~Yes~RX~ACME PHARMA\n")
+            for p in range(seed % 5):
+                substance = "Y" if p == 0 and seed % 3 == 0 else ""
+                patents.write(f"N~{appl}~001~{seed % 10_000_000 + p}~{when(seed + p)}~{substance}~Y~U-{p}~~\n")
+            if seed % 4 == 0:
+                exclusivity.write(f"N~{appl}~001~ODE~{when(seed // 7)}\n")
+    return names
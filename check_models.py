@@ -1,5 +1,5 @@
-import google.generativeai as genai
 import os
+import sys
 
 from dotenv import load_dotenv
 
@@ -8,8 +8,12 @@ api_key = os.getenv("GEMINI_API_KEY")
 
 if not api_key:
     print("Error: GEMINI_API_KEY not found in environment variables.")
-else:
-    genai.configure(api_key=api_key)
+    sys.exit(1)
+
+# Imported after the key check: the SDK takes most of this script's startup time
+import google.generativeai as genai
+
+genai.configure(api_key=api_key)
 
 print("Checking available models...")
 try: